@@ -1,6 +1,10 @@
 # agent/agent_factory.py
+import asyncio
 import logging
 import sys
+import threading
+import time
+from dataclasses import dataclass
 from typing import Any
 import uuid
 import json 
@@ -8,17 +12,24 @@ import json
 # LangChain Imports
 from langchain.agents import AgentExecutor, create_react_agent
 from langchain.prompts import PromptTemplate
-from langchain_community.vectorstores import SupabaseVectorStore
+from langchain_core.agents import AgentFinish, AgentStep
 from langchain_core.documents import Document
 from langchain_core.callbacks import BaseCallbackHandler
-from langchain_core.tools import Tool, render_text_description
+from langchain_core.tools import Tool
 from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from langchain_neo4j import GraphCypherQAChain, Neo4jGraph
 
 # Local Imports
 from config.settings import settings
-from tools.custom_tools import get_custom_tools
-from supabase.client import Client, create_client
+from tools.clients import get_async_supabase, get_supabase
+from tools.deadline import DeadlineExceeded, remaining, runs_to_completion, tool_timeout
+from agent.context import compress_context, format_documents
+from agent.fact_index import lookup_facts
+from agent.graph_async import AsyncGraphClient, aanswer_graph_question, get_async_graph
+from agent.runtime_config import get_runtime_config
+from agent.single_flight import embedding_flights, graph_search_flights, normalize_query, vector_search_flights
+from monitoring.metrics import AGENT_BUDGET_STOPS, AGENT_ITERATIONS, LLM_TOKENS, TOOL_TIMEOUTS, record_stage, stage_timer
+from supabase.client import Client
 
 # --- Logging Configuration ---
 logging.basicConfig(level=logging.INFO, stream=sys.stdout)
@@ -54,87 +65,440 @@ class ToolCallbackHandler(BaseCallbackHandler):
                 }
             )
 
-def create_agent_executor(memory, conversation_id: str):
-    """Builds and returns the complete AI agent executor."""
-    logger.info("🚀 Creating new agent executor instance...")
+class LatencyCallbackHandler(BaseCallbackHandler):
+    """
+    Records how long each LLM call and tool call takes, plus ReAct iterations per run.
+
+    Pass it through the `callbacks` entry of the invoke config (not the executor constructor)
+    so it is inherited by the nested LLM, chain and tool runs.
+    """
+    def __init__(self):
+        self._started: dict[uuid.UUID, tuple[str, float]] = {}
+        self.iterations = 0
+
+    def _start(self, run_id: uuid.UUID, stage: str) -> None:
+        self._started[run_id] = (stage, time.perf_counter())
+
+    def _end(self, run_id: uuid.UUID, failed: bool = False) -> None:
+        started = self._started.pop(run_id, None)
+        if started:
+            stage, start = started
+            record_stage(stage, time.perf_counter() - start, failed)
+
+    @staticmethod
+    def _llm_stage(tags: list[str] | None) -> str:
+        # The graph chain's LLMs (and the router's fast path) are tagged so they show up separately.
+        for tag in tags or []:
+            if tag in ("cypher_generation", "graph_qa", "fast_path"):
+                return f"llm.{tag}"
+        return "llm.agent"
+
+    def on_llm_start(self, serialized, prompts, *, run_id, tags=None, **kwargs: Any) -> Any:
+        self._start(run_id, self._llm_stage(tags))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, tags=None, **kwargs: Any) -> Any:
+        self._start(run_id, self._llm_stage(tags))
+
+    def on_llm_end(self, response, *, run_id, **kwargs: Any) -> Any:
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs: Any) -> Any:
+        self._end(run_id, failed=True)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs: Any) -> Any:
+        name = (serialized or {}).get("name") or kwargs.get("name") or "unknown"
+        self._start(run_id, f"tool.{name}")
+
+    def on_tool_end(self, output, *, run_id, **kwargs: Any) -> Any:
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs: Any) -> Any:
+        self._end(run_id, failed=True)
+
+    def on_agent_action(self, action, **kwargs: Any) -> Any:
+        self.iterations += 1
+
+    def on_agent_finish(self, finish, **kwargs: Any) -> Any:
+        AGENT_ITERATIONS.observe(self.iterations)
+
+class TokenUsageCallbackHandler(BaseCallbackHandler):
+    """
+    Adds up prompt and completion tokens across every LLM call of one agent run, including the
+    graph chain's Cypher generation and QA calls.
+
+    Like LatencyCallbackHandler, pass it through the invoke config so nested runs inherit it.
+    Sync tools run in executor threads, so the running totals are guarded by a lock.
+    """
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._stages: dict[uuid.UUID, str] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def on_llm_start(self, serialized, prompts, *, run_id, tags=None, **kwargs: Any) -> Any:
+        self._stages[run_id] = LatencyCallbackHandler._llm_stage(tags)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, tags=None, **kwargs: Any) -> Any:
+        self._stages[run_id] = LatencyCallbackHandler._llm_stage(tags)
+
+    @staticmethod
+    def _usage(response) -> tuple[int, int]:
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    prompt_tokens += usage.get("input_tokens", 0)
+                    completion_tokens += usage.get("output_tokens", 0)
+        if not (prompt_tokens or completion_tokens):
+            # Older integrations only report usage in llm_output.
+            usage = (response.llm_output or {}).get("token_usage") or (response.llm_output or {}).get("usage_metadata") or {}
+            prompt_tokens = usage.get("prompt_tokens", usage.get("input_tokens", 0)) or 0
+            completion_tokens = usage.get("completion_tokens", usage.get("output_tokens", 0)) or 0
+        return prompt_tokens, completion_tokens
+
+    def on_llm_end(self, response, *, run_id, **kwargs: Any) -> Any:
+        stage = self._stages.pop(run_id, "llm.agent")
+        prompt_tokens, completion_tokens = self._usage(response)
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+        LLM_TOKENS.inc(prompt_tokens, stage=stage, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, stage=stage, kind="completion")
+
+    def on_llm_error(self, error, *, run_id, **kwargs: Any) -> Any:
+        self._stages.pop(run_id, None)
+
+# What LangChain's "force" early stopping puts in the output when max_execution_time cuts a run off.
+STOPPED_OUTPUT = "Agent stopped due to iteration limit or time limit."
+TOOL_TIMEOUT_OBSERVATION = (
+    "The {tool} tool did not respond in time. Answer with what you already know, or apologise "
+    "and offer to follow up, instead of calling it again."
+)
+
+class BudgetedAgentExecutor(AgentExecutor):
+    """
+    AgentExecutor that also stops once the run has used up its token budget.
+
+    The wall-clock budget is the standard `max_execution_time`. Both limits are checked between
+    ReAct iterations; `stop_reason` records which limit (if any) ended the run early.
+    Each tool call is also bounded by its own timeout (see tools/deadline.py); a call that
+    exceeds it is abandoned and the agent is told so, letting it answer with what it has.
+    Side-effecting tools are exempt and always run to completion.
+    """
+    token_usage: TokenUsageCallbackHandler | None = None
+    token_budget: int | None = None
+    # The runtime config's per-tool timeout overrides, fixed for the run like its tools.
+    tool_timeouts: dict = {}
+    stop_reason: str | None = None
+
+    def _should_continue(self, iterations: int, time_elapsed: float) -> bool:
+        if self.token_usage is not None and self.token_budget and self.token_usage.total_tokens >= self.token_budget:
+            self.stop_reason = "token_budget"
+        elif self.max_execution_time is not None and time_elapsed >= self.max_execution_time:
+            self.stop_reason = "time_budget"
+        elif self.max_iterations is not None and iterations >= self.max_iterations:
+            self.stop_reason = "max_iterations"
+        else:
+            return True
+        AGENT_BUDGET_STOPS.inc(reason=self.stop_reason)
+        return False
+
+    async def _aperform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None) -> AgentStep:
+        if runs_to_completion(agent_action.tool, self.tool_timeouts):
+            # Shielded, so even the turn's deadline can't cancel a booking or handover halfway;
+            # if the turn is cancelled, the tool still finishes in the background.
+            return await asyncio.shield(
+                super()._aperform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+            )
+        try:
+            timeout = tool_timeout(agent_action.tool, self.tool_timeouts)
+            return await asyncio.wait_for(
+                super()._aperform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager),
+                timeout
+            )
+        except (asyncio.TimeoutError, DeadlineExceeded):
+            TOOL_TIMEOUTS.inc(tool=agent_action.tool)
+            logger.warning(f"Tool '{agent_action.tool}' timed out; continuing without its result.")
+            return AgentStep(action=agent_action, observation=TOOL_TIMEOUT_OBSERVATION.format(tool=agent_action.tool))
+
+    def _graceful(self, output: AgentFinish) -> AgentFinish:
+        # Replace LangChain's "Agent stopped due to iteration limit" text, which would
+        # otherwise be shown to the user and saved to their history.
+        if self.stop_reason is None and output.return_values.get("output") == STOPPED_OUTPUT:
+            # The async loop was cut off mid-iteration by max_execution_time.
+            self.stop_reason = "time_budget"
+            AGENT_BUDGET_STOPS.inc(reason=self.stop_reason)
+        if self.stop_reason is None:
+            return output
+        return AgentFinish({"output": settings.AGENT_BUDGET_EXCEEDED_MESSAGE}, output.log)
+
+    def _return(self, output, intermediate_steps, run_manager=None) -> dict[str, Any]:
+        return super()._return(self._graceful(output), intermediate_steps, run_manager)
+
+    async def _areturn(self, output, intermediate_steps, run_manager=None) -> dict[str, Any]:
+        return await super()._areturn(self._graceful(output), intermediate_steps, run_manager)
+
+class TimedNeo4jGraph(Neo4jGraph):
+    """Neo4jGraph that records the time spent executing Cypher queries."""
+    def query(self, query: str, params: dict = {}, *args, **kwargs) -> list[dict[str, Any]]:
+        with stage_timer("neo4j_query"):
+            return super().query(query, params, *args, **kwargs)
+
+@dataclass
+class SharedResources:
+    """Clients that are expensive to build and safe to share across requests (see runtime_config for the reloadable parts)."""
+    llm: ChatGoogleGenerativeAI
+    graph: Neo4jGraph
+    graph_chain: GraphCypherQAChain
+    supabase: Client
+    embeddings: GoogleGenerativeAIEmbeddings
+    # Runs the graph tool's Cypher natively async; None falls back to the chain on a thread.
+    async_graph: AsyncGraphClient | None = None
+
+_shared_resources: SharedResources | None = None
+_shared_resources_lock = threading.Lock()
+
+def _build_shared_resources() -> SharedResources:
+    logger.info("🔌 Connecting shared agent clients...")
     llm = ChatGoogleGenerativeAI(
         model=settings.GENERATIVE_MODEL,
         temperature=settings.AGENT_TEMPERATURE,
-        convert_system_message_to_human=True
+        convert_system_message_to_human=True,
+        timeout=settings.LLM_REQUEST_TIMEOUT_SECONDS
     )
 
-    # --- Tool Setup ---
-    graph = Neo4jGraph(
+    graph = TimedNeo4jGraph(
         url=settings.NEO4J_URI,
         username=settings.NEO4J_USERNAME,
-        password=settings.NEO4J_PASSWORD
+        password=settings.NEO4J_PASSWORD,
+        timeout=settings.NEO4J_QUERY_TIMEOUT_SECONDS
     )
     graph.refresh_schema()
 
+    # Separate, tagged LLM instances so latency metrics can tell Cypher generation from graph QA.
     graph_chain = GraphCypherQAChain.from_llm(
-        llm,
+        cypher_llm=ChatGoogleGenerativeAI(
+            model=settings.GENERATIVE_MODEL, temperature=settings.AGENT_TEMPERATURE, tags=["cypher_generation"],
+            timeout=settings.LLM_REQUEST_TIMEOUT_SECONDS
+        ),
+        qa_llm=ChatGoogleGenerativeAI(
+            model=settings.GENERATIVE_MODEL, temperature=settings.AGENT_TEMPERATURE, tags=["graph_qa"],
+            timeout=settings.LLM_REQUEST_TIMEOUT_SECONDS
+        ),
         graph=graph,
+        top_k=settings.GRAPH_QA_TOP_K,
         verbose=True,
         allow_dangerous_requests=True
     )
+
+    return SharedResources(
+        llm=llm,
+        graph=graph,
+        graph_chain=graph_chain,
+        supabase=get_supabase(),
+        embeddings=GoogleGenerativeAIEmbeddings(model=settings.EMBEDDING_MODEL),
+        async_graph=get_async_graph() if settings.NEO4J_ASYNC_ENABLED else None
+    )
+
+def get_shared_resources() -> SharedResources:
+    """Returns the process-wide agent clients, connecting them on first use."""
+    global _shared_resources
+    if _shared_resources is None:
+        with _shared_resources_lock:
+            if _shared_resources is None:
+                _shared_resources = _build_shared_resources()
+    return _shared_resources
+
+def _compress(query: str, query_embedding: list[float], rows: list[dict], k: int) -> list[Document]:
+    return compress_context(
+        query, query_embedding, rows, k,
+        token_budget=settings.RETRIEVAL_CONTEXT_TOKEN_BUDGET,
+        diversity_lambda=settings.RETRIEVAL_MMR_LAMBDA
+    )
+
+def embed_query(query: str) -> list[float]:
+    embeddings = get_shared_resources().embeddings
+    with stage_timer("embedding"):
+        return embedding_flights.do(
+            (settings.EMBEDDING_MODEL, normalize_query(query)), lambda: embeddings.embed_query(query)
+        )
+
+async def aembed_query(query: str) -> list[float]:
+    embeddings = get_shared_resources().embeddings
+    with stage_timer("embedding"):
+        return await embedding_flights.ado(
+            (settings.EMBEDDING_MODEL, normalize_query(query)), lambda: embeddings.aembed_query(query)
+        )
+
+# Identical retrieval calls that are already in flight (e.g. many users asking the same thing
+# after a campaign) are shared rather than repeated. Keys include the knowledge-base version
+# so a re-ingestion never serves answers computed against the old data.
+
+def search_documents(query: str, k: int = settings.RETRIEVAL_TOP_K) -> list[Document]:
+    """
+    Performs a similarity search on the Supabase vector store.
+
+    Over-fetches RETRIEVAL_FETCH_K candidates, then deduplicates them, picks `k` with MMR and
+    keeps only the query-relevant sentences (see agent/context.py). With LOCAL_VECTOR_INDEX set,
+    the candidates come from the in-process index (agent/vector_index.py) instead of the RPC.
+    """
+    logger.info(f"--- ACTION: Performing vector search for query: '{query}' ---")
+    supabase = get_shared_resources().supabase
+
+    def search() -> list[Document]:
+        query_embedding = embed_query(query)
+        if settings.LOCAL_VECTOR_INDEX != "off":
+            # numpy is only imported when the local index is enabled.
+            from agent.vector_index import get_vector_index
+            with stage_timer("local_vector_search"):
+                rows = get_vector_index().search(query_embedding, max(k, settings.RETRIEVAL_FETCH_K))
+        else:
+            with stage_timer("supabase_rpc"):
+                rows = supabase.rpc(settings.DB_VECTOR_QUERY_NAME, {
+                    'query_embedding': query_embedding,
+                    'match_count': max(k, settings.RETRIEVAL_FETCH_K),
+                    'filter': {}
+                }).execute().data
+        with stage_timer("context_compression"):
+            return _compress(query, query_embedding, rows, k)
+
+    key = (get_runtime_config().knowledge_base_version, normalize_query(query), k)
+    return vector_search_flights.do(key, search)
+
+async def asearch_documents(query: str, k: int = settings.RETRIEVAL_TOP_K) -> list[Document]:
+    logger.info(f"--- ACTION: Performing vector search for query: '{query}' ---")
+
+    async def search() -> list[Document]:
+        query_embedding = await aembed_query(query)
+        if settings.LOCAL_VECTOR_INDEX != "off":
+            from agent.vector_index import get_vector_index
+            with stage_timer("local_vector_search"):
+                # A scan over a large corpus is CPU-bound; keep it off the event loop.
+                rows = await asyncio.to_thread(
+                    get_vector_index().search, query_embedding, max(k, settings.RETRIEVAL_FETCH_K)
+                )
+        else:
+            async_supabase = await get_async_supabase()
+            with stage_timer("supabase_rpc"):
+                rows = (await async_supabase.rpc(settings.DB_VECTOR_QUERY_NAME, {
+                    'query_embedding': query_embedding,
+                    'match_count': max(k, settings.RETRIEVAL_FETCH_K),
+                    'filter': {}
+                }).execute()).data
+        with stage_timer("context_compression"):
+            return _compress(query, query_embedding, rows, k)
+
+    key = (get_runtime_config().knowledge_base_version, normalize_query(query), k)
+    return await vector_search_flights.ado(key, search)
+
+def run_vector_search(query: str) -> str:
+    return format_documents(search_documents(query))
+
+async def arun_vector_search(query: str) -> str:
+    return format_documents(await asearch_documents(query))
+
+# Time kept back from the request deadline so a stopped run can still save its reply.
+DEADLINE_SAFETY_MARGIN_SECONDS = 1.0
+
+def _run_time_budget() -> float | None:
+    budget = settings.AGENT_TURN_TIME_BUDGET_SECONDS or None
+    left = remaining()
+    if left is None:
+        return budget
+    left = max(0.1, left - DEADLINE_SAFETY_MARGIN_SECONDS)
+    return left if budget is None else min(budget, left)
+
+def create_agent_executor(memory, conversation_id: str, token_budget: int | None = None):
+    """
+    Builds and returns the complete AI agent executor.
+
+    `token_budget` caps the tokens this run may consume (defaults to AGENT_TURN_TOKEN_BUDGET).
+    The run's time budget is AGENT_TURN_TIME_BUDGET_SECONDS, cut short to finish before the
+    current request deadline. The executor's `token_usage` handler must be passed in the
+    invoke config callbacks.
+    """
+    logger.info("🚀 Creating new agent executor instance...")
+    resources = get_shared_resources()
+    llm = resources.llm
+    # One snapshot for the whole run, so a hot reload can't change the prompt or tools mid-turn.
+    runtime_config = get_runtime_config()
+
+    # --- Tool Setup ---
+    kb_version = runtime_config.knowledge_base_version
+
+    # Only the chain's answer goes back to the agent; the echoed query and the raw Cypher
+    # results would just grow the scratchpad.
+    def run_graph_search(query: str, callbacks=None) -> str:
+        """Runs the Cypher QA chain, forwarding the tool's callbacks so its LLM calls are counted."""
+        return graph_search_flights.do(
+            (kb_version, normalize_query(query)),
+            lambda: resources.graph_chain.invoke(query, config={"callbacks": callbacks})["result"]
+        )
+
+    async def arun_graph_search(query: str, callbacks=None) -> str:
+        async def answer() -> str:
+            if resources.async_graph is not None:
+                return await aanswer_graph_question(resources.graph_chain, resources.async_graph, query, callbacks)
+            return (await resources.graph_chain.ainvoke(query, config={"callbacks": callbacks}))["result"]
+        return await graph_search_flights.ado((kb_version, normalize_query(query)), answer)
+
     graph_tool = Tool(
         name="Knowledge_Graph_Search",
-        func=graph_chain.invoke,
+        func=run_graph_search,
+        coroutine=arun_graph_search,
         description="Use for specific questions about rules, policies, costs, and fees."
     )
 
-    supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
-    embeddings = GoogleGenerativeAIEmbeddings(model=settings.EMBEDDING_MODEL)
-    
-    def run_vector_search(query: str, k: int = 4) -> list[Document]:
-        """Performs a similarity search on the Supabase vector store."""
-        logger.info(f"--- ACTION: Performing vector search for query: '{query}' ---")
-        query_embedding = embeddings.embed_query(query)
-        
-        response = supabase.rpc(settings.DB_VECTOR_QUERY_NAME, {
-            'query_embedding': query_embedding,
-            'match_count': k,
-            'filter': {}
-        }).execute()
-
-        match_result = [
-            Document(
-                page_content=doc["content"],
-                metadata=doc["metadata"],
-            )
-            for doc in response.data
-        ]
-        return match_result
+    # Precomputed graph facts answer the common "fee for X" / "rules for Y" questions without
+    # an LLM call; the Cypher chain stays available for everything else.
+    fact_tool = Tool(
+        name="Fact_Lookup",
+        func=lookup_facts,
+        description=(
+            "Try this first for the fees, rules, requirements or conditions of one specific named thing. "
+            "Input: just the name (e.g. 'Party'), optionally followed by ' | ' and one of "
+            f"{', '.join(settings.FACT_TABLE_RELATIONSHIPS)} (e.g. 'Party | HAS_FEE'). "
+            "If it finds nothing, use Knowledge_Graph_Search."
+        )
+    )
 
     vector_tool = Tool(
         name="General_Information_Search",
         func=run_vector_search,
+        coroutine=arun_vector_search,
         description="Use for general, conceptual, or 'how-to' questions."
     )
     
-    custom_tools = get_custom_tools()
-    all_tools = [graph_tool, vector_tool] + custom_tools
-    logger.info(f"🛠️  Loaded tools: {[tool.name for tool in all_tools]}")
+    custom_tools = list(runtime_config.custom_tools)
+    retrieval_tools = [fact_tool, graph_tool, vector_tool] if settings.FACT_LOOKUP_ENABLED else [graph_tool, vector_tool]
+    all_tools = retrieval_tools + custom_tools
+    logger.info(f"🛠️  Loaded tools (runtime config v{runtime_config.version}): {[tool.name for tool in all_tools]}")
 
     # --- Prompt Setup ---
-    with open("agent/persona.prompt", "r") as f:
-        persona_template = f.read()
-
-    prompt = PromptTemplate.from_template(persona_template)
+    prompt = PromptTemplate.from_template(runtime_config.persona_template)
 
     # --- Agent and Executor Construction ---
     agent_runnable = create_react_agent(llm, all_tools, prompt)
     
     tool_callback = ToolCallbackHandler()
     
-    agent_executor = AgentExecutor(
+    agent_executor = BudgetedAgentExecutor(
         agent=agent_runnable,
         tools=all_tools,
         memory=memory,
         verbose=True,
         handle_parsing_errors="I made a formatting error. I will correct it and try again.",
         max_iterations=settings.AGENT_MAX_ITERATIONS,
-        callbacks=[tool_callback]
+        max_execution_time=_run_time_budget(),
+        callbacks=[tool_callback],
+        token_usage=TokenUsageCallbackHandler(),
+        token_budget=token_budget if token_budget is not None else settings.AGENT_TURN_TOKEN_BUDGET,
+        tool_timeouts=runtime_config.tool_timeouts
     )
     
     logger.info(f"📦 Returning AgentExecutor instance and callback: {type(agent_executor)}")
@@ -0,0 +1,131 @@
+# agent/context.py
+"""
+Post-processing of retrieved chunks before they reach a prompt: drops duplicated chunk overlap,
+picks a diverse subset with MMR, and keeps only the sentences most relevant to the query
+within a token budget.
+"""
+import math
+import re
+
+from langchain_core.documents import Document
+
+from utils.helpers import cosine, count_tokens, load_encoding, parse_embedding
+
+# Shorter shared runs are likely coincidence, not splitter overlap.
+MIN_OVERLAP_CHARS = 40
+MAX_OVERLAP_CHARS = 400
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is it me my of on or our so that the "
+    "their there this to was we what when where which who why will with you your".split()
+)
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _overlap_length(previous: str, current: str) -> int:
+    """Length of the longest suffix of `previous` that is also a prefix of `current`."""
+    for length in range(min(len(previous), len(current), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(current[:length]):
+            return length
+    return 0
+
+
+def deduplicate(rows: list[dict]) -> list[dict]:
+    """Drops chunks contained in another kept chunk and trims text repeated from a neighbouring chunk's overlap."""
+    kept: list[dict] = []
+    for row in rows:
+        content = row["content"].strip()
+        if any(content in other["content"] for other in kept):
+            continue
+        for other in kept:
+            overlap = _overlap_length(other["content"], content)
+            if overlap:
+                content = content[overlap:].lstrip()
+            # The overlap can also run the other way if the later chunk ranked higher.
+            reverse = _overlap_length(content, other["content"])
+            if reverse:
+                content = content[:-reverse].rstrip()
+        if content:
+            kept.append({**row, "content": content})
+    return kept
+
+
+def mmr_select(query_embedding: list[float], rows: list[dict], k: int, diversity_lambda: float) -> list[dict]:
+    """Maximal marginal relevance over the rows' embeddings; keeps the original order if they have none."""
+    embeddings = [parse_embedding(row.get("embedding")) for row in rows]
+    if not rows or any(embedding is None for embedding in embeddings):
+        return rows[:k]
+
+    relevance = [cosine(query_embedding, embedding) for embedding in embeddings]
+    selected: list[int] = []
+    remaining = list(range(len(rows)))
+    while remaining and len(selected) < k:
+        def score(i: int) -> float:
+            redundancy = max((cosine(embeddings[i], embeddings[j]) for j in selected), default=0.0)
+            return diversity_lambda * relevance[i] - (1 - diversity_lambda) * redundancy
+        best = max(remaining, key=score)
+        selected.append(best)
+        remaining.remove(best)
+    return [rows[i] for i in selected]
+
+
+def _terms(text: str) -> set[str]:
+    return {word for word in _WORD.findall(text.lower()) if word not in STOPWORDS}
+
+
+def extract_relevant(query: str, rows: list[dict], token_budget: int) -> list[dict]:
+    """
+    Keeps the sentences that share the most terms with the query, across all rows, until the
+    token budget is spent. Kept sentences stay in their original order within each row.
+    """
+    query_terms = _terms(query)
+    candidates = []
+    for row_index, row in enumerate(rows):
+        for position, sentence in enumerate(s.strip() for s in _SENTENCE_BOUNDARY.split(row["content"])):
+            if not sentence:
+                continue
+            terms = _terms(sentence)
+            overlap = len(query_terms & terms)
+            # Favour dense matches and, on ties, the better-ranked row and earlier sentences.
+            candidates.append((overlap / math.sqrt(len(terms) or 1), -row_index, -position, row_index, position, sentence))
+
+    chosen: dict[int, list[tuple[int, str]]] = {}
+    spent = 0
+    for score, _, _, row_index, position, sentence in sorted(candidates, reverse=True):
+        if score == 0 and chosen:
+            break
+        tokens = count_tokens(sentence)
+        if spent + tokens > token_budget:
+            if chosen:
+                continue
+            # Always return something, even if the single best sentence is over budget.
+            sentence = load_encoding().decode(load_encoding().encode(sentence)[:token_budget])
+            tokens = token_budget
+        chosen.setdefault(row_index, []).append((position, sentence))
+        spent += tokens
+
+    return [
+        {**rows[row_index], "content": " ".join(sentence for _, sentence in sorted(chosen[row_index]))}
+        for row_index in sorted(chosen)
+    ]
+
+
+def compress_context(query: str, query_embedding: list[float], rows: list[dict], k: int,
+                     token_budget: int, diversity_lambda: float) -> list[Document]:
+    """Runs the full pipeline over `match_documents` rows and returns compact Documents."""
+    rows = deduplicate(rows)
+    rows = mmr_select(query_embedding, rows, k, diversity_lambda)
+    if token_budget > 0:
+        rows = extract_relevant(query, rows, token_budget)
+    return [Document(page_content=row["content"], metadata=row.get("metadata") or {}) for row in rows]
+
+
+def format_documents(documents: list[Document]) -> str:
+    """Renders Documents compactly for a prompt or scratchpad, labelled by source."""
+    if not documents:
+        return "No relevant information found."
+    return "\n\n".join(
+        f"[{(document.metadata or {}).get('source', 'knowledge base')}] {document.page_content}"
+        for document in documents
+    )
@@ -0,0 +1,126 @@
+# agent/fact_index.py
+import difflib
+import logging
+import re
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+
+from config.settings import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 1000
+
+
+@dataclass(frozen=True)
+class Fact:
+    """One materialized graph relationship, e.g. (Party)-[:HAS_FEE]->(R250 per child)."""
+    entity: str
+    relationship: str
+    target: str
+    entity_label: str | None = None
+    target_label: str | None = None
+
+    def sentence(self) -> str:
+        return f"{self.entity} {self.relationship.lower().replace('_', ' ')} {self.target}"
+
+
+def _normalize(name: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", name.lower())).strip()
+
+
+class FactIndex:
+    """
+    In-memory entity -> facts lookup over the `graph_facts` table written at ingestion.
+
+    Each fact is indexed under both its entity and its target, so "Party" finds both what a
+    party has and which rules apply to it. Names are matched exactly, then by containment, then
+    fuzzily with difflib.
+    """
+
+    def __init__(self, facts: list[Fact], match_cutoff: float):
+        self.match_cutoff = match_cutoff
+        self._by_name: dict[str, list[Fact]] = defaultdict(list)
+        for fact in facts:
+            self._by_name[_normalize(fact.entity)].append(fact)
+            if _normalize(fact.target) != _normalize(fact.entity):
+                self._by_name[_normalize(fact.target)].append(fact)
+        self._names = list(self._by_name)
+        self.size = len(facts)
+
+    @classmethod
+    def load(cls, supabase, match_cutoff: float) -> "FactIndex":
+        rows, start = [], 0
+        while True:
+            page = supabase.table(settings.DB_GRAPH_FACTS_TABLE).select(
+                "entity, entity_label, relationship, target, target_label"
+            ).order("id").range(start, start + PAGE_SIZE - 1).execute().data
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                break
+            start += PAGE_SIZE
+        facts = [Fact(**row) for row in rows]
+        logger.info(f"📚 Loaded {len(facts)} graph facts into the fact index.")
+        return cls(facts, match_cutoff)
+
+    def match_names(self, name: str, limit: int = 3) -> list[str]:
+        key = _normalize(name)
+        if not key:
+            return []
+        if key in self._by_name:
+            return [key]
+        contained = [n for n in self._names if key in n.split() or (len(key) > 3 and key in n)]
+        if contained:
+            return sorted(contained, key=len)[:limit]
+        return difflib.get_close_matches(key, self._names, n=limit, cutoff=self.match_cutoff)
+
+    def lookup(self, name: str, relationship: str | None = None, limit: int = 25) -> list[Fact]:
+        facts: list[Fact] = []
+        for matched in self.match_names(name):
+            for fact in self._by_name[matched]:
+                if relationship and fact.relationship != relationship.upper():
+                    continue
+                if fact not in facts:
+                    facts.append(fact)
+        return facts[:limit]
+
+
+_fact_index: FactIndex | None = None
+_fact_index_lock = threading.Lock()
+
+
+def get_fact_index() -> FactIndex:
+    """Returns the process-wide fact index, loading it from Supabase on first use."""
+    global _fact_index
+    if _fact_index is None:
+        with _fact_index_lock:
+            if _fact_index is None:
+                from tools.clients import get_supabase
+                _fact_index = FactIndex.load(get_supabase(), settings.FACT_MATCH_CUTOFF)
+    return _fact_index
+
+
+def load_fact_index() -> FactIndex:
+    """Loads the fact table again (e.g. after re-ingestion) into a new index, without serving it yet."""
+    from tools.clients import get_supabase
+    return FactIndex.load(get_supabase(), settings.FACT_MATCH_CUTOFF)
+
+
+def use_fact_index(index: FactIndex) -> None:
+    """Swaps a fully loaded index in; lookups see either the old index or the new one."""
+    global _fact_index
+    _fact_index = index
+
+
+def lookup_facts(query: str) -> str:
+    """
+    Tool entry point. Accepts an entity name, optionally followed by "|" and a relationship
+    type (e.g. "Party | HAS_FEE").
+    """
+    name, _, relationship = query.partition("|")
+    facts = get_fact_index().lookup(name.strip().strip("'\""), relationship.strip() or None)
+    if not facts:
+        return f"No stored facts found for '{name.strip()}'. Use Knowledge_Graph_Search instead."
+    return "\n".join(f"- {fact.sentence()}" for fact in facts)
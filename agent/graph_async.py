@@ -0,0 +1,116 @@
+# agent/graph_async.py
+"""
+Async Neo4j access for the Knowledge_Graph_Search tool.
+
+`GraphCypherQAChain` only has a synchronous implementation, so `ainvoke` runs the whole chain,
+including the Cypher query, on a worker thread. `aanswer_graph_question` runs the same steps
+natively instead: the chain's Cypher-generation and QA runnables are awaited, and the generated
+query goes through the neo4j async driver. Concurrent graph questions then cost sockets from a
+bounded pool, not threads.
+
+Generated Cypher runs in read transactions: with a `neo4j://` (routing) URI they are served by
+read replicas or followers, and on any server a query that tries to write is rejected. With
+NEO4J_READ_ROUTING off it runs as a plain auto-commit query with the session's default routing,
+which the driver never retries.
+"""
+import logging
+
+from neo4j import AsyncDriver, AsyncGraphDatabase, Query, unit_of_work
+
+from config.settings import settings
+from monitoring.metrics import stage_timer
+from tools.deadline import bounded_timeout
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class AsyncGraphClient:
+    """A pooled neo4j async driver that runs each query in its own transaction with a timeout."""
+
+    def __init__(self, uri: str, username: str, password: str, database: str | None,
+                 pool_size: int, acquisition_timeout: float, query_timeout: float, read_routing: bool):
+        self.database = database
+        self.query_timeout = query_timeout
+        self.read_routing = read_routing
+        self.driver: AsyncDriver = AsyncGraphDatabase.driver(
+            uri,
+            auth=(username, password),
+            max_connection_pool_size=pool_size,
+            connection_acquisition_timeout=acquisition_timeout
+        )
+
+    async def verify_connectivity(self) -> None:
+        await self.driver.verify_connectivity()
+
+    async def query(self, cypher: str, params: dict | None = None) -> list[dict]:
+        """
+        Runs `cypher` in a read transaction (an auto-commit query with NEO4J_READ_ROUTING off),
+        timed out at NEO4J_QUERY_TIMEOUT_SECONDS or the request deadline, whichever comes first.
+        """
+        timeout = bounded_timeout(self.query_timeout or None)
+
+        @unit_of_work(timeout=timeout)
+        async def work(tx) -> list[dict]:
+            result = await tx.run(cypher, params or {})
+            return await result.data()
+
+        with stage_timer("neo4j_query"):
+            async with self.driver.session(database=self.database) as session:
+                if self.read_routing:
+                    return await session.execute_read(work)
+                result = await session.run(Query(cypher, timeout=timeout), params or {})
+                return await result.data()
+
+    async def close(self) -> None:
+        await self.driver.close()
+
+
+_async_graph: AsyncGraphClient | None = None
+
+
+def get_async_graph() -> AsyncGraphClient:
+    """Returns the process-wide async graph client. Creating it opens no connections."""
+    global _async_graph
+    if _async_graph is None:
+        _async_graph = AsyncGraphClient(
+            settings.NEO4J_URI,
+            settings.NEO4J_USERNAME,
+            settings.NEO4J_PASSWORD,
+            database=settings.NEO4J_DATABASE,
+            pool_size=settings.NEO4J_ASYNC_POOL_SIZE,
+            acquisition_timeout=settings.NEO4J_ACQUISITION_TIMEOUT_SECONDS,
+            query_timeout=settings.NEO4J_QUERY_TIMEOUT_SECONDS,
+            read_routing=settings.NEO4J_READ_ROUTING
+        )
+    return _async_graph
+
+
+async def aclose_async_graph() -> None:
+    """Closes the async graph client's pool. Call on application shutdown."""
+    global _async_graph
+    if _async_graph is not None:
+        await _async_graph.close()
+        _async_graph = None
+        logger.info("Async Neo4j driver closed.")
+
+
+async def aanswer_graph_question(chain, client: AsyncGraphClient, question: str, callbacks=None) -> str:
+    """
+    The steps of `GraphCypherQAChain._call`, awaited: generate Cypher from the question and the
+    chain's graph schema, run it through `client`, and answer from the top `chain.top_k` rows.
+    """
+    from langchain_neo4j.chains.graph_qa.cypher import extract_cypher
+
+    config = {"callbacks": callbacks}
+    generated = await chain.cypher_generation_chain.ainvoke(
+        {"question": question, "schema": chain.graph_schema}, config=config
+    )
+    cypher = extract_cypher(generated)
+    if chain.cypher_query_corrector:
+        cypher = chain.cypher_query_corrector(cypher)
+    logger.info(f"Generated Cypher: {cypher}")
+
+    context = (await client.query(cypher))[:chain.top_k] if cypher else []
+    answer = await chain.qa_chain.ainvoke({"question": question, "context": context}, config=config)
+    return answer if isinstance(answer, str) else getattr(answer, "content", str(answer))
@@ -0,0 +1,178 @@
+# agent/router.py
+import asyncio
+import json
+import logging
+import re
+import threading
+from dataclasses import dataclass
+
+from langchain_core.messages import BaseMessage
+from langchain_core.prompts import PromptTemplate
+
+from config.settings import settings
+from monitoring.metrics import ROUTER_DECISIONS
+from agent.agent_factory import aembed_query, asearch_documents, get_shared_resources
+from agent.context import format_documents
+from utils.helpers import cosine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Intents answered from a template, without any LLM call.
+TEMPLATE_INTENTS = ("greeting", "thanks", "goodbye")
+KNOWLEDGE = "knowledge"
+AGENT = "agent"
+
+# Reply the knowledge prompt uses when retrieval didn't answer the question.
+NO_ANSWER = "NO_ANSWER"
+
+# Anything that might need a tool (booking, calendar, handover) always goes to the full agent.
+AGENT_KEYWORDS = re.compile(
+    r"\b(book|booking|meeting|call|appointment|reschedul\w*|cancel\w*|schedule|slot|available|availability|"
+    r"human|person|someone|team member|speak to|talk to|email|budget|confirm\w*)\b|@"
+)
+SMALL_TALK_RULES = {
+    "greeting": re.compile(r"^(hi+|hello|hey+|howzit|hiya|good (morning|afternoon|evening))( there)?$"),
+    "thanks": re.compile(r"^(thanks|thank you|thank you so much|thanks a lot|cheers|much appreciated)$"),
+    "goodbye": re.compile(r"^(bye|goodbye|bye bye|see you|talk later|have a (good|great) day)$"),
+}
+
+
+@dataclass
+class RouteDecision:
+    intent: str
+    method: str
+    score: float | None = None
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[^\w\s@']", "", text.lower()).strip()
+
+
+def _last_ai_message(history: list[dict]) -> dict | None:
+    for message in reversed(history):
+        if message.get("type") == "ai":
+            return message.get("data", {})
+    return None
+
+
+class IntentRouter:
+    """
+    Cheap routing in front of the ReAct agent.
+
+    Rules catch the obvious cases first; everything else is matched by embedding similarity
+    against the exemplars in `agent/intents.json`. Anything ambiguous, any booking/handover
+    wording, and any reply to a question the bot just asked (the middle of a workflow) goes to
+    the full agent.
+    """
+
+    def __init__(self, intents_path: str, threshold: float, margin: float):
+        with open(intents_path, "r") as f:
+            config = json.load(f)
+        self.templates: dict[str, str] = config["templates"]
+        self.exemplars: dict[str, list[str]] = config["exemplars"]
+        self.threshold = threshold
+        self.margin = margin
+        self._exemplar_vectors: list[tuple[str, list[float]]] | None = None
+        self._lock = threading.Lock()
+
+    def load_exemplars(self) -> list[tuple[str, list[float]]]:
+        """Embeds the exemplars once (blocking); called during warm-up or on first use."""
+        if self._exemplar_vectors is None:
+            with self._lock:
+                if self._exemplar_vectors is None:
+                    labelled = [(intent, text) for intent, texts in self.exemplars.items() for text in texts]
+                    vectors = get_shared_resources().embeddings.embed_documents([text for _, text in labelled])
+                    self._exemplar_vectors = [(intent, vector) for (intent, _), vector in zip(labelled, vectors)]
+        return self._exemplar_vectors
+
+    def _decide(self, intent: str, method: str, score: float | None = None) -> RouteDecision:
+        ROUTER_DECISIONS.inc(intent=intent, method=method)
+        return RouteDecision(intent, method, score)
+
+    async def aroute(self, query: str, history: list[dict]) -> RouteDecision:
+        text = _normalize(query)
+        if not text or AGENT_KEYWORDS.search(text):
+            return self._decide(AGENT, "rule")
+
+        last_ai = _last_ai_message(history)
+        if last_ai and (last_ai.get("tool_calls") or str(last_ai.get("content", "")).rstrip().endswith("?")):
+            # The user is answering the bot, e.g. "Yes" or "A lot" in the middle of a workflow.
+            return self._decide(AGENT, "mid_flow")
+
+        for intent, pattern in SMALL_TALK_RULES.items():
+            if pattern.match(text):
+                return self._decide(intent, "rule")
+
+        exemplar_vectors = self._exemplar_vectors or await asyncio.to_thread(self.load_exemplars)
+        query_vector = await aembed_query(query)
+        best: dict[str, float] = {}
+        for intent, vector in exemplar_vectors:
+            best[intent] = max(best.get(intent, -1.0), cosine(query_vector, vector))
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)
+        (top_intent, top_score), runner_up = ranked[0], ranked[1][1] if len(ranked) > 1 else -1.0
+        if top_score < self.threshold or top_score - runner_up < self.margin:
+            return self._decide(AGENT, "low_confidence", top_score)
+        return self._decide(top_intent, "embedding", top_score)
+
+
+_router: IntentRouter | None = None
+_knowledge_prompt: PromptTemplate | None = None
+
+
+def _build_router() -> IntentRouter:
+    return IntentRouter(
+        "agent/intents.json",
+        threshold=settings.INTENT_ROUTER_THRESHOLD,
+        margin=settings.INTENT_ROUTER_MARGIN
+    )
+
+
+def get_intent_router() -> IntentRouter:
+    global _router
+    if _router is None:
+        _router = _build_router()
+    return _router
+
+
+def reload_intent_router() -> IntentRouter:
+    """Re-reads agent/intents.json and embeds its exemplars (blocking), then swaps the new router in."""
+    global _router, _knowledge_prompt
+    router = _build_router()
+    router.load_exemplars()
+    _router = router
+    _knowledge_prompt = None
+    return router
+
+
+def _format_history(messages: list[BaseMessage]) -> str:
+    return "\n".join(f"{message.type}: {message.content}" for message in messages[-6:])
+
+
+async def answer_knowledge_question(query: str, history: list[BaseMessage], current_time: str,
+                                    callbacks: list | None = None) -> str | None:
+    """
+    One retrieval and one LLM call instead of a ReAct loop. Returns None when the retrieved
+    knowledge doesn't answer the question, so the caller can fall back to the full agent.
+    """
+    global _knowledge_prompt
+    if _knowledge_prompt is None:
+        with open("agent/knowledge_answer.prompt", "r") as f:
+            _knowledge_prompt = PromptTemplate.from_template(f.read())
+
+    documents = await asearch_documents(query)
+    if not documents:
+        return None
+    prompt = _knowledge_prompt.format(
+        context=format_documents(documents),
+        history=_format_history(history),
+        input=query,
+        current_time=current_time
+    )
+    response = await get_shared_resources().llm.ainvoke(
+        prompt, config={"callbacks": callbacks or [], "tags": ["fast_path"]}
+    )
+    answer = str(response.content).strip()
+    if not answer or NO_ANSWER in answer:
+        return None
+    return answer
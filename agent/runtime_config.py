@@ -0,0 +1,188 @@
+# agent/runtime_config.py
+import asyncio
+import importlib
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+from dotenv import dotenv_values
+
+from config.settings import ENVIRONMENT_KEYS, settings
+from tools.deadline import parse_tool_timeouts
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PERSONA_PATH = "agent/persona.prompt"
+# Files whose changes trigger a reload when the watcher is enabled.
+WATCHED_PATHS = (PERSONA_PATH, "tools/custom_tools.py", "tools/action_schemas.py", "agent/intents.json", ".env")
+
+
+@dataclass(frozen=True)
+class RuntimeConfig:
+    """
+    Everything about the agent that can change without a restart: the persona prompt, the
+    custom tools, the per-tool timeouts and the knowledge-base version.
+
+    A turn reads the current config once and uses that snapshot throughout, so a reload never
+    changes the prompt or tools under a turn that is already running.
+    """
+    version: int
+    persona_template: str
+    custom_tools: tuple
+    knowledge_base_version: str
+    # Per-tool timeout overrides; 0 means the tool always runs to completion (see tools/deadline.py).
+    tool_timeouts: dict = field(default_factory=dict)
+    loaded_at: float = field(default_factory=time.time)
+
+    def describe(self) -> dict:
+        return {
+            "version": self.version,
+            "knowledge_base_version": self.knowledge_base_version,
+            "tools": [tool.name for tool in self.custom_tools],
+            "tool_timeouts": self.tool_timeouts,
+            "loaded_at": self.loaded_at,
+        }
+
+
+def _current_env(key: str, default: str) -> str:
+    # load_dotenv() copied .env into os.environ at startup, so os.environ only says which value
+    # wins if the variable was really set in the environment. Otherwise re-read .env, so the
+    # value can be changed (e.g. the version bumped after an ingestion run) without a restart.
+    if key in ENVIRONMENT_KEYS:
+        return os.environ[key]
+    return dotenv_values().get(key) or default
+
+
+def _current_knowledge_base_version() -> str:
+    return _current_env("KNOWLEDGE_BASE_VERSION", settings.KNOWLEDGE_BASE_VERSION)
+
+
+def _load(version: int, reload_tools: bool, knowledge_base_version: str | None) -> RuntimeConfig:
+    import tools.action_schemas
+    import tools.custom_tools
+    if reload_tools:
+        # Only the tool definitions are re-executed; the Supabase, Calendar and HTTP clients they
+        # use live in tools.clients and tools.google_calendar and stay warm.
+        importlib.reload(tools.action_schemas)
+        importlib.reload(tools.custom_tools)
+
+    with open(PERSONA_PATH, "r") as f:
+        persona_template = f.read()
+    custom_tools = tuple(tools.custom_tools.get_custom_tools())
+    side_effect_tools = [tool.name for tool in custom_tools if (tool.metadata or {}).get("side_effects")]
+    return RuntimeConfig(
+        version=version,
+        persona_template=persona_template,
+        custom_tools=custom_tools,
+        knowledge_base_version=knowledge_base_version or _current_knowledge_base_version(),
+        tool_timeouts=parse_tool_timeouts(_current_env("TOOL_TIMEOUTS", settings.TOOL_TIMEOUTS), side_effect_tools)
+    )
+
+
+_config: RuntimeConfig | None = None
+_config_lock = threading.Lock()
+
+
+def get_runtime_config() -> RuntimeConfig:
+    """Returns the current config snapshot, loading the first one on first use."""
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                _swap(_load(1, reload_tools=False, knowledge_base_version=None))
+    return _config
+
+
+def _swap(config: RuntimeConfig) -> None:
+    global _config
+    # A single reference assignment: turns see either the old snapshot or the new one.
+    _config = config
+
+
+def reload_runtime_config(knowledge_base_version: str | None = None) -> RuntimeConfig:
+    """
+    Builds a new config from the files on disk and swaps it in. If anything fails to load
+    (e.g. a syntax error in custom_tools.py), the current config stays in place and the error
+    is raised.
+    """
+    with _config_lock:
+        previous = _config
+        config = _load((previous.version if previous else 0) + 1, reload_tools=True,
+                       knowledge_base_version=knowledge_base_version)
+        kb_changed = previous is not None and previous.knowledge_base_version != config.knowledge_base_version
+
+        # The new router and indexes are fully loaded before they replace the old ones, so turns
+        # never hit a cold one. The indexes are swapped together with the config, so retrieval
+        # keyed on the new knowledge-base version never searches an index of the old one.
+        if settings.INTENT_ROUTER_ENABLED:
+            from agent.router import reload_intent_router
+            reload_intent_router()
+        fact_index = vector_index = None
+        if settings.FACT_LOOKUP_ENABLED and kb_changed:
+            # Facts are materialized per ingestion run, so a new knowledge base needs fresh ones.
+            from agent.fact_index import load_fact_index
+            fact_index = load_fact_index()
+        if settings.LOCAL_VECTOR_INDEX != "off" and kb_changed:
+            from agent.vector_index import load_vector_index
+            vector_index = load_vector_index()
+
+        if fact_index is not None:
+            from agent.fact_index import use_fact_index
+            use_fact_index(fact_index)
+        if vector_index is not None:
+            from agent.vector_index import use_vector_index
+            use_vector_index(vector_index)
+        _swap(config)
+
+    logger.info(f"🔄 Runtime config v{config.version} loaded (knowledge base {config.knowledge_base_version}, "
+                f"tools {[tool.name for tool in config.custom_tools]}).")
+    return config
+
+
+def _mtimes() -> dict[str, float]:
+    mtimes = {}
+    for path in WATCHED_PATHS:
+        try:
+            mtimes[path] = os.stat(path).st_mtime
+        except FileNotFoundError:
+            mtimes[path] = 0.0
+    return mtimes
+
+
+class RuntimeConfigWatcher:
+    """Polls the watched files' modification times and reloads the runtime config when one changes."""
+
+    def __init__(self, poll_seconds: float):
+        self.poll_seconds = poll_seconds
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"👀 Watching {', '.join(WATCHED_PATHS)} for runtime config changes.")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        seen = _mtimes()
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            current = _mtimes()
+            if current == seen:
+                continue
+            changed = [path for path in current if current[path] != seen[path]]
+            seen = current
+            logger.info(f"Runtime config files changed: {changed}")
+            try:
+                # Re-importing the tools module can be slow; keep it off the event loop.
+                await asyncio.to_thread(reload_runtime_config)
+            except Exception as e:
+                logger.error(f"Runtime config reload failed; keeping the current version: {e}", exc_info=True)
+
+
+runtime_config_watcher = RuntimeConfigWatcher(poll_seconds=settings.RUNTIME_CONFIG_POLL_SECONDS)
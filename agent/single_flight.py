@@ -0,0 +1,76 @@
+# agent/single_flight.py
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Hashable
+
+from monitoring.metrics import COALESCED_CALLS
+
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive form of a tool input, used in coalescing keys."""
+    return " ".join(str(text).lower().split())
+
+
+@dataclass
+class _SyncCall:
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Any = None
+    error: BaseException | None = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while a call for a key is in flight, further callers
+    with the same key wait for its result instead of starting their own. Nothing is cached once
+    the call completes.
+
+    `ado` is for coroutines on the event loop and `do` for blocking calls made from worker threads
+    (e.g. sync tools run in the executor); the two don't share in-flight calls.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._tasks: dict[Hashable, asyncio.Future] = {}
+        self._sync_calls: dict[Hashable, _SyncCall] = {}
+        self._lock = threading.Lock()
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda finished: self._tasks.pop(key, None) if self._tasks.get(key) is finished else None)
+        else:
+            COALESCED_CALLS.inc(call=self.name)
+        # Shielded, so one caller being cancelled doesn't cancel the call for everyone else.
+        return await asyncio.shield(task)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._sync_calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._sync_calls[key] = _SyncCall()
+        if not leader:
+            COALESCED_CALLS.inc(call=self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._sync_calls[key]
+            call.done.set()
+
+
+graph_search_flights = SingleFlight("graph_search")
+vector_search_flights = SingleFlight("vector_search")
+embedding_flights = SingleFlight("embedding")
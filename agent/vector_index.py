@@ -0,0 +1,207 @@
+# agent/vector_index.py
+"""
+In-process vector index over the `documents` table, for serving retrieval from memory instead
+of the `match_documents` RPC (LOCAL_VECTOR_INDEX).
+
+Three representations trade memory for accuracy:
+  - "float":  float32 vectors and exact cosine search (4 bytes per dimension).
+  - "int8":   per-vector scalar quantization (1 byte per dimension plus one scale); the float
+              query is scored against the codes directly.
+  - "binary": sign bits (1 bit per dimension) searched by Hamming distance, then the best
+              `k * rescore_factor` candidates are rescored with their int8 codes. Keeps both,
+              so about 1.125 bytes per dimension, but touches the int8 codes only for candidates.
+
+Vectors are normalized before they are stored, so a dot product is the cosine similarity.
+"""
+import logging
+import threading
+
+import numpy as np
+
+from config.settings import settings
+from utils.helpers import parse_embedding
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 1000
+REPRESENTATIONS = ("float", "int8", "binary")
+# Rows scored per step, so a search never converts the whole int8 matrix to float at once.
+SCORE_BLOCK_ROWS = 8192
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def quantize_int8(vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector scalar quantization: codes in [-127, 127] and one float32 scale per vector."""
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def binarize(vectors: np.ndarray) -> np.ndarray:
+    """Sign bits, packed eight dimensions per byte."""
+    return np.packbits(vectors > 0, axis=-1)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indexes of the `k` highest scores, best first."""
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class VectorIndex:
+    """
+    Rows of the `documents` table with their embeddings in one of REPRESENTATIONS. `search`
+    returns rows shaped like `match_documents` results (with `embedding` and `similarity`), so
+    context compression treats both paths the same.
+    """
+
+    def __init__(self, representation: str = "float", rescore_factor: int = 10):
+        if representation not in REPRESENTATIONS:
+            raise ValueError(f"Unknown vector representation '{representation}'; expected one of {REPRESENTATIONS}.")
+        self.representation = representation
+        self.rescore_factor = rescore_factor
+        self.rows: list[dict] = []
+        # Encoded pages are collected here and concatenated once, instead of on every add.
+        self._parts: dict[str, list[np.ndarray]] = {"vectors": [], "codes": [], "scales": [], "bits": []}
+        self._vectors = self._codes = self._scales = self._bits = None
+
+    def add(self, vectors, rows: list[dict]) -> None:
+        """Encodes one page of vectors; only the chosen representation is kept, so float pages can be freed."""
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        if self.representation == "float":
+            self._parts["vectors"].append(vectors)
+        else:
+            codes, scales = quantize_int8(vectors)
+            self._parts["codes"].append(codes)
+            self._parts["scales"].append(scales)
+            if self.representation == "binary":
+                self._parts["bits"].append(binarize(vectors))
+        self.rows.extend({key: value for key, value in row.items() if key != "embedding"} for row in rows)
+
+    def _compact(self) -> None:
+        for name, parts in self._parts.items():
+            if parts:
+                current = getattr(self, f"_{name}")
+                setattr(self, f"_{name}", np.concatenate(([current] if current is not None else []) + parts))
+                parts.clear()
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the vector representation (row text and metadata not included)."""
+        self._compact()
+        return sum(array.nbytes for array in (self._vectors, self._codes, self._scales, self._bits) if array is not None)
+
+    def to_float(self) -> np.ndarray:
+        """The stored (normalized) vectors as float32, dequantized for the int8 and binary representations."""
+        self._compact()
+        if self._vectors is not None:
+            return self._vectors
+        if self._codes is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self._codes.astype(np.float32) * self._scales[:, None]
+
+    def _int8_scores(self, query: np.ndarray, indexes: np.ndarray | None = None) -> np.ndarray:
+        if indexes is not None:
+            return (self._codes[indexes].astype(np.float32) @ query) * self._scales[indexes]
+        scores = np.empty(len(self._codes), dtype=np.float32)
+        for start in range(0, len(self._codes), SCORE_BLOCK_ROWS):
+            block = slice(start, start + SCORE_BLOCK_ROWS)
+            scores[block] = (self._codes[block].astype(np.float32) @ query) * self._scales[block]
+        return scores
+
+    def _hamming_candidates(self, query: np.ndarray, count: int) -> np.ndarray:
+        query_bits = binarize(query)
+        distances = np.empty(len(self._bits), dtype=np.int32)
+        for start in range(0, len(self._bits), SCORE_BLOCK_ROWS):
+            block = slice(start, start + SCORE_BLOCK_ROWS)
+            distances[block] = _POPCOUNT[self._bits[block] ^ query_bits].sum(axis=1)
+        return _top_k(-distances, count)
+
+    def _embedding(self, index: int) -> list[float]:
+        if self._vectors is not None:
+            return self._vectors[index].tolist()
+        return (self._codes[index].astype(np.float32) * self._scales[index]).tolist()
+
+    def search_indexes(self, query_embedding, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """The indexes and cosine scores of the `k` best rows, best first."""
+        self._compact()
+        if not self.rows or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+        k = min(k, len(self.rows))
+
+        if self.representation == "float":
+            scores = self._vectors @ query
+            best = _top_k(scores, k)
+            return best, scores[best]
+        if self.representation == "int8":
+            scores = self._int8_scores(query)
+            best = _top_k(scores, k)
+            return best, scores[best]
+
+        candidates = self._hamming_candidates(query, min(len(self.rows), k * self.rescore_factor))
+        scores = self._int8_scores(query, candidates)
+        best = _top_k(scores, k)
+        return candidates[best], scores[best]
+
+    def search(self, query_embedding, k: int) -> list[dict]:
+        indexes, scores = self.search_indexes(query_embedding, k)
+        return [
+            {**self.rows[index], "embedding": self._embedding(index), "similarity": float(score)}
+            for index, score in zip(indexes.tolist(), scores.tolist())
+        ]
+
+    @classmethod
+    def load(cls, supabase, representation: str, rescore_factor: int) -> "VectorIndex":
+        # Pages are ordered by id; without an ORDER BY, separate range requests may overlap or skip rows.
+        index, start = cls(representation, rescore_factor), 0
+        while True:
+            page = supabase.table(settings.DB_VECTOR_TABLE).select(
+                "id, content, metadata, embedding"
+            ).order("id").range(start, start + PAGE_SIZE - 1).execute().data
+            rows = [row for row in page if row.get("embedding") is not None]
+            if rows:
+                index.add([parse_embedding(row["embedding"]) for row in rows], rows)
+            if len(page) < PAGE_SIZE:
+                break
+            start += PAGE_SIZE
+        logger.info(f"🧮 Loaded {len(index.rows)} document vectors into the local {representation} index "
+                    f"({index.nbytes / (1024 * 1024):.1f} MiB).")
+        return index
+
+
+_vector_index: VectorIndex | None = None
+_vector_index_lock = threading.Lock()
+
+
+def get_vector_index() -> VectorIndex:
+    """Returns the process-wide vector index, loading it from Supabase on first use."""
+    global _vector_index
+    if _vector_index is None:
+        with _vector_index_lock:
+            if _vector_index is None:
+                from tools.clients import get_supabase
+                _vector_index = VectorIndex.load(get_supabase(), settings.LOCAL_VECTOR_INDEX, settings.LOCAL_VECTOR_RESCORE_FACTOR)
+    return _vector_index
+
+
+def load_vector_index() -> VectorIndex:
+    """Loads the documents again (e.g. after re-ingestion) into a new index, without serving it yet."""
+    from tools.clients import get_supabase
+    return VectorIndex.load(get_supabase(), settings.LOCAL_VECTOR_INDEX, settings.LOCAL_VECTOR_RESCORE_FACTOR)
+
+
+def use_vector_index(index: VectorIndex) -> None:
+    """Swaps a fully loaded index in; searches see either the old index or the new one."""
+    global _vector_index
+    _vector_index = index
@@ -0,0 +1,148 @@
+# api/calendar_sync.py
+import asyncio
+import logging
+
+import httpx
+
+from config.settings import settings
+from tools.clients import get_async_supabase
+from tools.google_calendar import acreate_calendar_event
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class CalendarSyncWorker:
+    """
+    Background worker that creates Google Calendar events for confirmed meetings.
+
+    Jobs are keyed by meeting id, so enqueueing the same meeting twice is a no-op while it is
+    pending. The Calendar event id is derived from the meeting id, which makes the insert itself
+    idempotent across retries, restarts and multiple server processes.
+    """
+
+    def __init__(self, concurrency: int, max_attempts: int, retry_base_delay: float):
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._pending: set[str] = set()
+        self._tasks: list[asyncio.Task] = []
+
+    def enqueue(self, meeting_id: str) -> bool:
+        """Schedules a calendar sync for a meeting. Returns False if one is already pending."""
+        if meeting_id in self._pending:
+            return False
+        self._pending.add(meeting_id)
+        self._queue.put_nowait(meeting_id)
+        return True
+
+    async def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+        await self._recover_in_flight_jobs()
+        logger.info(f"📅 Calendar sync worker started with {self.concurrency} task(s).")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _recover_in_flight_jobs(self) -> None:
+        """Re-enqueues meetings left in 'confirming' by a previous process."""
+        try:
+            supabase = await get_async_supabase()
+            response = await supabase.table("meetings").select("id").eq("status", "confirming").execute()
+            for row in response.data or []:
+                self.enqueue(str(row["id"]))
+        except Exception as e:
+            logger.error(f"Could not recover pending calendar sync jobs: {e}", exc_info=True)
+
+    async def _run(self) -> None:
+        while True:
+            meeting_id = await self._queue.get()
+            try:
+                await self._process_with_retries(meeting_id)
+            finally:
+                self._pending.discard(meeting_id)
+                self._queue.task_done()
+
+    async def _process_with_retries(self, meeting_id: str) -> None:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await self._sync_meeting(meeting_id)
+                return
+            except ValueError as e:
+                # The meeting itself is invalid (e.g. in the past); retrying won't help.
+                logger.error(f"Calendar sync for meeting {meeting_id} rejected: {e}")
+                await self._set_status(meeting_id, "confirmation_failed")
+                return
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    logger.error(f"Calendar sync for meeting {meeting_id} failed after {attempt} attempts: {e}", exc_info=True)
+                    # Put the meeting back so the confirmation link can be used again.
+                    await self._set_status(meeting_id, "pending_confirmation")
+                    return
+                delay = self.retry_base_delay * (2 ** (attempt - 1))
+                logger.warning(f"Calendar sync for meeting {meeting_id} failed (attempt {attempt}), retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+
+    async def _sync_meeting(self, meeting_id: str) -> None:
+        supabase = await get_async_supabase()
+        response = await supabase.table("meetings").select("*").eq("id", meeting_id).execute()
+        if not response.data:
+            logger.warning(f"Meeting {meeting_id} disappeared before its calendar event was created.")
+            return
+
+        meeting_details = response.data[0]
+        if meeting_details["status"] == "confirmed":
+            return
+
+        event_id = calendar_event_id_for(meeting_id)
+        summary = f"Onboard Call with {meeting_details['company_name']} | Zappies AI"
+        description = (
+            f"Onboarding call with {meeting_details['full_name']} from {meeting_details['company_name']} to discuss the 'Project Pipeline AI'.\n\n"
+            f"Stated Goal: {meeting_details['goal']}\n"
+            f"Stated Budget: R{meeting_details['monthly_budget']}/month"
+        )
+        try:
+            await acreate_calendar_event(
+                start_time=meeting_details['start_time'],
+                summary=summary,
+                description=description,
+                attendees=[meeting_details['email']],
+                event_id=event_id
+            )
+        except httpx.HTTPStatusError as e:
+            # 409 means an earlier attempt already created this exact event.
+            if e.response.status_code != 409:
+                raise
+            logger.info(f"Calendar event for meeting {meeting_id} already exists.")
+
+        await supabase.table("meetings").update({
+            "status": "confirmed",
+            "google_calendar_event_id": event_id
+        }).eq("id", meeting_id).execute()
+        logger.info(f"Meeting {meeting_id} confirmed and calendar event created successfully.")
+
+    async def _set_status(self, meeting_id: str, new_status: str) -> None:
+        try:
+            supabase = await get_async_supabase()
+            await supabase.table("meetings").update({"status": new_status}).eq("id", meeting_id).execute()
+        except Exception as e:
+            logger.error(f"Could not set meeting {meeting_id} status to '{new_status}': {e}", exc_info=True)
+
+
+def calendar_event_id_for(meeting_id: str) -> str:
+    """
+    Returns a deterministic Calendar event id for a meeting. Calendar ids may only contain the
+    characters a-v and 0-9, which a lowercase UUID without dashes satisfies.
+    """
+    return meeting_id.replace("-", "").lower()
+
+
+calendar_sync_worker = CalendarSyncWorker(
+    concurrency=settings.CALENDAR_SYNC_CONCURRENCY,
+    max_attempts=settings.CALENDAR_SYNC_MAX_ATTEMPTS,
+    retry_base_delay=settings.CALENDAR_SYNC_RETRY_BASE_DELAY
+)
@@ -0,0 +1,169 @@
+# api/capture.py
+"""
+Opt-in traffic capture for building realistic replay workloads (TRAFFIC_CAPTURE_ENABLED).
+
+`TrafficCaptureMiddleware` records each POST /chat as one JSONL line: when it arrived, the
+anonymized conversation id and query, the status, the latency, the per-stage timings and how
+the turn was answered (route and tool-call sequence). `benchmarks/replay.py` re-drives a
+captured file against a server.
+
+Sampling is per conversation: a conversation is either captured whole or not at all, decided by
+its hashed id, so a replay sees complete multi-turn conversations rather than stray turns.
+
+Anonymization: conversation ids are replaced with a keyed hash, so turns of one conversation
+stay grouped but can't be traced back, and e-mail addresses, phone and other long numbers and
+URLs in the query are replaced with placeholders. Names and free-text details are not
+detected, so treat capture files as sensitive. API keys, replies and tool arguments are never
+recorded.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextvars import ContextVar
+
+from config.settings import settings
+from monitoring.metrics import current_request_timings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CAPTURED_PATHS = ("/chat",)
+_REDACTIONS = (
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "<email>"),
+    (re.compile(r"https?://\S+|www\.\S+"), "<url>"),
+    (re.compile(r"\+?\d[\d\s().-]{7,}\d"), "<phone>"),
+    (re.compile(r"\b\d{5,}\b"), "<number>"),
+)
+
+_turn: ContextVar[dict | None] = ContextVar("captured_turn", default=None)
+
+
+def note_turn(route: str, tools: list[str] | None = None) -> None:
+    """Records how the current /chat turn was answered, if it is being captured."""
+    turn = _turn.get()
+    if turn is not None:
+        turn["route"] = route
+        if tools is not None:
+            turn["tools"] = tools
+
+
+def redact(text: str) -> str:
+    for pattern, placeholder in _REDACTIONS:
+        text = pattern.sub(placeholder, text)
+    return text
+
+
+class CaptureWriter:
+    """Appends records to a JSONL file from a worker thread, so the event loop never waits on disk."""
+
+    def __init__(self, path: str, salt: str):
+        self.path = path
+        # Without a configured salt, ids are only consistent within one process's capture.
+        self._salt = (salt or os.urandom(16).hex()).encode()
+        self._lock = threading.Lock()
+        self._file = None
+
+    def anonymize_id(self, value: str) -> str:
+        return hmac.new(self._salt, value.encode(), hashlib.sha256).hexdigest()[:16]
+
+    @staticmethod
+    def is_sampled(anonymized_id: str, sample_rate: float) -> bool:
+        """Whether a conversation falls in the sample: its keyed hash, read as a fraction, is below the rate."""
+        return int(anonymized_id, 16) / 16 ** len(anonymized_id) < sample_rate
+
+    def _write(self, line: str) -> None:
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    async def write(self, record: dict) -> None:
+        try:
+            await asyncio.to_thread(self._write, json.dumps(record, ensure_ascii=False))
+        except Exception as e:
+            # Capture is diagnostics; it must never fail the request it describes.
+            logger.error(f"Could not write captured request: {e}")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class TrafficCaptureMiddleware:
+    """
+    Pure ASGI middleware: it tees the request body as the endpoint reads it and watches the
+    response status, without buffering either. Must be added before (i.e. inside) the metrics
+    middleware so the request's stage timings are visible to it.
+    """
+
+    def __init__(self, app, writer: CaptureWriter, sample_rate: float = 1.0):
+        self.app = app
+        self.writer = writer
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in CAPTURED_PATHS
+                or self.sample_rate <= 0):
+            await self.app(scope, receive, send)
+            return
+
+        body = bytearray()
+        status_code = 500
+        turn = {"route": None, "tools": []}
+        token = _turn.set(turn)
+        arrived_at = time.time()
+        started = time.perf_counter()
+
+        async def receive_and_record():
+            message = await receive()
+            if message["type"] == "http.request":
+                body.extend(message.get("body", b""))
+            return message
+
+        async def send_and_record(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive_and_record, send_and_record)
+        finally:
+            latency = time.perf_counter() - started
+            _turn.reset(token)
+            record = self._record(scope["path"], bytes(body), arrived_at, latency, status_code, turn)
+            # The conversation id is only known once the body has been read, so sampling happens here.
+            if self.writer.is_sampled(record["conversation_id"], self.sample_rate):
+                await self.writer.write(record)
+
+    def _record(self, path: str, body: bytes, arrived_at: float, latency: float, status_code: int, turn: dict) -> dict:
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            payload = {}
+        timings = current_request_timings() or {}
+        return {
+            "ts": round(arrived_at, 3),
+            "path": path,
+            "conversation_id": self.writer.anonymize_id(str(payload.get("conversation_id", ""))),
+            "query": redact(str(payload.get("query", ""))),
+            "status": status_code,
+            "latency_ms": round(latency * 1000, 1),
+            "stages_ms": {stage: round(seconds * 1000, 1) for stage, seconds in timings.items()},
+            "route": turn["route"],
+            "tools": turn["tools"],
+        }
+
+
+def create_capture_writer() -> CaptureWriter:
+    return CaptureWriter(settings.TRAFFIC_CAPTURE_PATH, settings.TRAFFIC_CAPTURE_SALT)
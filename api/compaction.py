@@ -0,0 +1,160 @@
+# api/compaction.py
+import asyncio
+import datetime
+import logging
+
+from config.settings import settings
+from monitoring.metrics import COMPACTED_MESSAGES, COMPACTION_RUNS
+from tools.clients import get_async_supabase
+from tools.conversation_archive import pack_messages
+from api.conversation_cache import conversation_cache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """You maintain a running summary of a customer conversation with a sales assistant.
+Update the summary with the messages below. Keep every fact the assistant may need later: the
+customer's name, company, email, goals, budget, booked or proposed meetings and open questions.
+Write at most 200 words of plain prose.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+
+Updated summary:"""
+
+
+def _render_messages(messages: list[dict]) -> str:
+    lines = []
+    for message in messages:
+        content = message.get("data", {}).get("content")
+        if content:
+            lines.append(f"{message.get('type', 'unknown')}: {content}")
+    return "\n".join(lines)
+
+
+class ConversationCompactor:
+    """
+    Background worker that keeps conversation_history rows small.
+
+    Conversations that hold more than `max_messages` messages, or have been idle for
+    `inactive_hours`, have everything but their last `keep_messages` messages moved into a
+    gzip-compressed segment of the archive table. The hot row keeps the recent window plus an
+    LLM-written summary of what was archived, so the agent still knows the gist.
+
+    No conversation lock is taken, so a slow summary never delays a user's turn. Instead the
+    archive RPC only applies if the row's version hasn't changed since it was read; a turn that
+    slips in makes the compactor skip that conversation until the next pass.
+    """
+
+    def __init__(self, interval_seconds: float, max_messages: int, inactive_hours: float,
+                 keep_messages: int, batch_size: int, summarize: bool):
+        self.interval_seconds = interval_seconds
+        self.max_messages = max_messages
+        self.inactive_hours = inactive_hours
+        self.keep_messages = keep_messages
+        self.batch_size = batch_size
+        self.summarize = summarize
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"🗜️ Conversation compaction worker started (every {self.interval_seconds:.0f}s).")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.compact_once()
+            except Exception as e:
+                logger.error(f"Conversation compaction pass failed: {e}", exc_info=True)
+            await asyncio.sleep(self.interval_seconds)
+
+    async def compact_once(self) -> int:
+        """Compacts one batch of candidate conversations and returns how many were compacted."""
+        supabase = await get_async_supabase()
+        inactive_before = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=self.inactive_hours)
+        response = await supabase.rpc("find_compaction_candidates", {
+            "p_max_messages": self.max_messages,
+            "p_inactive_before": inactive_before.isoformat(),
+            "p_keep": self.keep_messages,
+            "p_limit": self.batch_size
+        }).execute()
+
+        compacted = 0
+        for row in response.data or []:
+            conversation_id = row["conversation_id"]
+            try:
+                if await self._compact_conversation(supabase, conversation_id):
+                    compacted += 1
+            except Exception as e:
+                COMPACTION_RUNS.inc(outcome="error")
+                logger.error(f"Could not compact conversation {conversation_id}: {e}", exc_info=True)
+        if compacted:
+            logger.info(f"🗜️ Compacted {compacted} conversation(s).")
+        return compacted
+
+    async def _compact_conversation(self, supabase, conversation_id: str) -> bool:
+        response = await supabase.table(settings.DB_CONVERSATION_HISTORY_TABLE).select(
+            "history, version, summary"
+        ).eq("conversation_id", conversation_id).execute()
+        if not response.data:
+            return False
+        row = response.data[0]
+        history = row.get("history") or []
+        if len(history) <= self.keep_messages:
+            return False
+
+        archived = history[:-self.keep_messages] if self.keep_messages else history
+        summary = row.get("summary")
+        if self.summarize:
+            summary = await self._summarize(summary, archived)
+
+        result = await supabase.rpc("archive_conversation_segment", {
+            "p_conversation_id": conversation_id,
+            "p_expected_version": row.get("version") or 0,
+            "p_payload": pack_messages(archived),
+            "p_message_count": len(archived),
+            "p_summary": summary
+        }).execute()
+        # Other processes drop their copy through realtime invalidation or their cache TTL.
+        conversation_cache.invalidate(conversation_id)
+        if not result.data:
+            COMPACTION_RUNS.inc(outcome="conflict")
+            return False
+        COMPACTION_RUNS.inc(outcome="compacted")
+        COMPACTED_MESSAGES.inc(len(archived))
+        return True
+
+    async def _summarize(self, summary: str | None, messages: list[dict]) -> str | None:
+        rendered = _render_messages(messages)
+        if not rendered:
+            return summary
+        try:
+            from agent.agent_factory import get_shared_resources
+            response = await get_shared_resources().llm.ainvoke(
+                SUMMARY_PROMPT.format(summary=summary or "(none)", messages=rendered),
+                config={"tags": ["compaction"]}
+            )
+            return str(response.content).strip() or summary
+        except Exception as e:
+            # Archiving still shrinks the row; the full history stays available from the archive.
+            logger.error(f"Could not summarize archived messages: {e}", exc_info=True)
+            return summary
+
+
+compaction_worker = ConversationCompactor(
+    interval_seconds=settings.COMPACTION_INTERVAL_SECONDS,
+    max_messages=settings.COMPACTION_MAX_MESSAGES,
+    inactive_hours=settings.COMPACTION_INACTIVE_HOURS,
+    keep_messages=settings.COMPACTION_KEEP_MESSAGES,
+    batch_size=settings.COMPACTION_BATCH_SIZE,
+    summarize=settings.COMPACTION_SUMMARIZE
+)
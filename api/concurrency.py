@@ -0,0 +1,176 @@
+# api/concurrency.py
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from config.settings import settings
+from tools.deadline import DeadlineExceeded, bounded_timeout
+from monitoring.metrics import (
+    CONCURRENCY_IN_FLIGHT,
+    CONCURRENCY_LIMIT,
+    CONCURRENCY_QUEUED,
+    CONCURRENCY_REJECTIONS,
+    stage_timer
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ConcurrencyLimitExceeded(Exception):
+    """Raised when a turn can't get an agent slot; the caller should answer 503 with Retry-After."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Server is busy ({reason}). Retry after {retry_after}s.")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """True for errors that mean the upstream (Gemini, Supabase, Neo4j) is overloaded."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return True
+    status_code = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status_code in (429, 503):
+        return True
+    return type(error).__name__ in ("ResourceExhausted", "ServiceUnavailable", "TooManyRequests", "RateLimitError")
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD limit on concurrently running agent turns, with a bounded, fair wait queue.
+
+    The limit grows by roughly one slot per window of successful turns that finish within the
+    target latency, and shrinks multiplicatively (at most once per target-latency window) when a
+    turn is slow or fails with an overload error. Waiters are queued per client key and granted
+    round-robin across keys, so a client with a large backlog can't starve the others.
+    """
+
+    def __init__(self, initial_limit: int, min_limit: int, max_limit: int, target_latency: float,
+                 max_queue: int, queue_timeout: float, backoff_ratio: float = 0.8):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.target_latency = target_latency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.backoff_ratio = backoff_ratio
+        self.in_flight = 0
+        self.queued = 0
+        self._waiters: OrderedDict[str, deque[asyncio.Future]] = OrderedDict()
+        self._avg_latency = target_latency / 2
+        self._last_decrease = 0.0
+        self._publish()
+
+    def _publish(self) -> None:
+        CONCURRENCY_LIMIT.set(int(self.limit))
+        CONCURRENCY_IN_FLIGHT.set(self.in_flight)
+        CONCURRENCY_QUEUED.set(self.queued)
+
+    def retry_after(self) -> int:
+        """Seconds until a new request is likely to get a slot, from queue depth and turn latency."""
+        turns_ahead = (self.queued + 1) / max(int(self.limit), 1)
+        return max(1, min(60, math.ceil(turns_ahead * self._avg_latency)))
+
+    def _reject(self, reason: str) -> ConcurrencyLimitExceeded:
+        CONCURRENCY_REJECTIONS.inc(reason=reason)
+        return ConcurrencyLimitExceeded(reason, self.retry_after())
+
+    def _remove_waiter(self, key: str, waiter: asyncio.Future) -> None:
+        queue = self._waiters.get(key)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+            self.queued -= 1
+        except ValueError:
+            return
+        if not queue:
+            del self._waiters[key]
+
+    def _grant_waiters(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            # Round-robin: serve the key at the front, then move it to the back if it has more waiting.
+            key, queue = self._waiters.popitem(last=False)
+            waiter = queue.popleft()
+            self.queued -= 1
+            if queue:
+                self._waiters[key] = queue
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+        self._publish()
+
+    async def acquire(self, key: str) -> None:
+        if self.in_flight < int(self.limit) and not self.queued:
+            self.in_flight += 1
+            self._publish()
+            return
+        if self.queued >= self.max_queue:
+            raise self._reject("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, deque()).append(waiter)
+        self.queued += 1
+        self._publish()
+        try:
+            # Never queue past the request's deadline; DeadlineExceeded is a TimeoutError too.
+            await asyncio.wait_for(waiter, bounded_timeout(self.queue_timeout))
+        except (asyncio.TimeoutError, DeadlineExceeded, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was granted just as we gave up on it; pass it on.
+                self.release()
+            else:
+                self._remove_waiter(key, waiter)
+                self._publish()
+            if isinstance(e, (asyncio.TimeoutError, DeadlineExceeded)):
+                raise self._reject("queue_timeout") from None
+            raise
+
+    def release(self, latency: float | None = None, overloaded: bool = False) -> None:
+        self.in_flight -= 1
+        if latency is not None:
+            self._adjust(latency, overloaded)
+        self._grant_waiters()
+
+    def _adjust(self, latency: float, overloaded: bool) -> None:
+        self._avg_latency = 0.8 * self._avg_latency + 0.2 * latency
+        now = time.monotonic()
+        if overloaded or latency > self.target_latency:
+            # One slow period usually shows up in every turn that was running; back off once for it.
+            if now - self._last_decrease >= self.target_latency:
+                self._last_decrease = now
+                self.limit = max(float(self.min_limit), self.limit * self.backoff_ratio)
+                logger.warning(f"Agent concurrency limit decreased to {int(self.limit)} "
+                               f"(latency {latency:.1f}s, overloaded={overloaded}).")
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+
+    @asynccontextmanager
+    async def slot(self, key: str):
+        """Holds an agent slot for the duration of the block, feeding its latency back into the limit."""
+        with stage_timer("queue_wait"):
+            await self.acquire(key)
+        started = time.perf_counter()
+        overloaded = False
+        try:
+            yield
+        except BaseException as e:
+            overloaded = is_overload_error(e)
+            raise
+        finally:
+            self.release(time.perf_counter() - started, overloaded)
+
+
+agent_limiter = AdaptiveConcurrencyLimiter(
+    initial_limit=settings.CONCURRENCY_LIMIT,
+    min_limit=settings.CONCURRENCY_MIN_LIMIT,
+    max_limit=settings.CONCURRENCY_MAX_LIMIT,
+    target_latency=settings.CONCURRENCY_TARGET_LATENCY_SECONDS,
+    max_queue=settings.CONCURRENCY_MAX_QUEUE,
+    queue_timeout=settings.CONCURRENCY_QUEUE_TIMEOUT_SECONDS
+)
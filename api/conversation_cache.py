@@ -0,0 +1,128 @@
+# api/conversation_cache.py
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from config.settings import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ConversationState:
+    """A cached snapshot of a conversation_history row."""
+    status: str
+    messages: list[dict]
+    version: int
+    total_tokens: int = 0
+    # Running summary of messages moved to the archive table by compaction
+    summary: str | None = None
+    cached_at: float = field(default_factory=time.monotonic)
+
+
+class ConversationStateCache:
+    """
+    Per-process LRU cache of conversation status and the most recent messages.
+
+    Writes made by this process are applied write-through after the database write succeeds.
+    Writes made by other processes are picked up either through Supabase Realtime change
+    notifications (when enabled) or, at the latest, when the entry's TTL expires.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, history_window: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.history_window = history_window
+        self._entries: OrderedDict[str, ConversationState] = OrderedDict()
+        self._channel = None
+
+    def get(self, conversation_id: str) -> ConversationState | None:
+        state = self._entries.get(conversation_id)
+        if state is None:
+            return None
+        if time.monotonic() - state.cached_at > self.ttl_seconds:
+            del self._entries[conversation_id]
+            return None
+        self._entries.move_to_end(conversation_id)
+        return state
+
+    def put(self, conversation_id: str, status: str, messages: list[dict], version: int,
+            total_tokens: int = 0, summary: str | None = None) -> ConversationState:
+        state = ConversationState(
+            status=status, messages=messages[-self.history_window:], version=version,
+            total_tokens=total_tokens, summary=summary
+        )
+        self._entries[conversation_id] = state
+        self._entries.move_to_end(conversation_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return state
+
+    def append_messages(self, conversation_id: str, new_messages: list[dict], version: int) -> None:
+        """Applies a successful append to the cached entry, or drops it if it was stale."""
+        state = self._entries.get(conversation_id)
+        if state is None:
+            return
+        if state.version != version - 1:
+            # Someone else wrote in between; our window no longer matches the row.
+            self.invalidate(conversation_id)
+            return
+        self.put(conversation_id, state.status, state.messages + new_messages, version, state.total_tokens, state.summary)
+
+    def add_token_usage(self, conversation_id: str, tokens: int) -> None:
+        """Applies a recorded turn's token usage to the cached entry, if any."""
+        state = self._entries.get(conversation_id)
+        if state is not None:
+            state.total_tokens += tokens
+
+    def invalidate(self, conversation_id: str, version: int | None = None, status: str | None = None,
+                   total_tokens: int | None = None) -> None:
+        """
+        Drops an entry. If `version` is given, entries at that version or newer are kept, unless
+        `status` or `total_tokens` differ from the cached ones: handovers and token usage are
+        written without bumping the version.
+        """
+        state = self._entries.get(conversation_id)
+        if state is None:
+            return
+        if (version is not None and state.version >= version
+                and status in (None, state.status) and total_tokens in (None, state.total_tokens)):
+            return
+        del self._entries[conversation_id]
+
+    async def start_invalidation_listener(self, supabase) -> None:
+        """Subscribes to conversation_history changes so writes from other workers evict stale entries."""
+        def on_change(payload: dict) -> None:
+            data = payload.get("data", payload)
+            record = data.get("record") or data.get("old_record") or {}
+            conversation_id = record.get("conversation_id")
+            if conversation_id:
+                total_tokens = None
+                if "prompt_tokens" in record or "completion_tokens" in record:
+                    total_tokens = (record.get("prompt_tokens") or 0) + (record.get("completion_tokens") or 0)
+                self.invalidate(conversation_id, record.get("version"), record.get("status"), total_tokens)
+
+        try:
+            self._channel = supabase.channel("conversation-state-cache")
+            self._channel.on_postgres_changes(
+                "*", schema="public", table=settings.DB_CONVERSATION_HISTORY_TABLE, callback=on_change
+            )
+            await self._channel.subscribe()
+            logger.info("🔔 Conversation cache subscribed to realtime invalidations.")
+        except Exception as e:
+            # The TTL still bounds staleness, so the cache stays usable without realtime.
+            logger.error(f"Could not subscribe to conversation_history changes: {e}", exc_info=True)
+
+    async def stop_invalidation_listener(self) -> None:
+        if self._channel is not None:
+            await self._channel.unsubscribe()
+            self._channel = None
+
+
+conversation_cache = ConversationStateCache(
+    max_entries=settings.CONVERSATION_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.CONVERSATION_CACHE_TTL_SECONDS,
+    history_window=settings.CONVERSATION_CACHE_HISTORY_WINDOW
+)
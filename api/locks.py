@@ -0,0 +1,141 @@
+# api/locks.py
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+from config.settings import settings
+from tools.deadline import DeadlineExceeded, bounded_timeout
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ConversationLockTimeout(Exception):
+    """Raised when a conversation's lock, or a connection to take it with, isn't free within the lock timeout."""
+
+
+@dataclass
+class _LockEntry:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    users: int = 0
+
+
+class InProcessLockBackend:
+    """
+    Per-conversation asyncio locks for a single process.
+
+    Entries are reference-counted and dropped as soon as no turn holds or waits for them, so
+    memory is bounded by the number of in-flight turns rather than by every conversation ever seen.
+    """
+
+    def __init__(self):
+        self._entries: dict[str, _LockEntry] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @asynccontextmanager
+    async def hold(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _LockEntry()
+        entry.users += 1
+        try:
+            async with entry.lock:
+                yield
+        finally:
+            entry.users -= 1
+            if entry.users == 0:
+                del self._entries[key]
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class PostgresAdvisoryLockBackend:
+    """
+    Per-conversation locks shared by every worker and instance, using Postgres advisory locks
+    on the Supabase database.
+
+    Turns for the same conversation in this process first queue on an in-process lock, so each
+    process holds at most one database connection per conversation. A session-level lock is
+    released explicitly, or by Postgres if the holding connection dies, so a crashed worker can't
+    leave a conversation locked. Requires a direct (or session-mode pooler) connection string;
+    transaction-mode pooling does not keep advisory locks.
+
+    The connection is held for the whole turn, including its wait for an agent slot, so waiting
+    for a free connection is bounded by the lock timeout as well.
+    """
+
+    def __init__(self, dsn: str, pool_size: int, acquire_timeout: float):
+        self.dsn = dsn
+        self.pool_size = pool_size
+        self.acquire_timeout = acquire_timeout
+        self._local = InProcessLockBackend()
+        self._pool = None
+
+    async def start(self) -> None:
+        if self._pool is not None:
+            return
+        try:
+            import asyncpg
+        except ImportError as e:
+            raise RuntimeError("CONVERSATION_LOCK_BACKEND=postgres requires the 'asyncpg' package.") from e
+        # statement_cache_size=0 keeps asyncpg compatible with Supabase's connection pooler.
+        self._pool = await asyncpg.create_pool(
+            self.dsn, min_size=1, max_size=self.pool_size, statement_cache_size=0
+        )
+        logger.info(f"🔒 Postgres advisory lock backend connected (pool size {self.pool_size}).")
+
+    async def stop(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    @asynccontextmanager
+    async def hold(self, key: str):
+        if self._pool is None:
+            await self.start()
+        async with self._local.hold(key):
+            try:
+                connection = await self._pool.acquire(timeout=bounded_timeout(self.acquire_timeout))
+            except (asyncio.TimeoutError, DeadlineExceeded) as e:
+                raise ConversationLockTimeout(
+                    f"No lock connection for conversation {key} became free within {self.acquire_timeout}s."
+                ) from e
+            try:
+                try:
+                    await connection.execute(
+                        "SELECT pg_advisory_lock(hashtextextended($1, 0))", key,
+                        timeout=bounded_timeout(self.acquire_timeout)
+                    )
+                except (asyncio.TimeoutError, DeadlineExceeded) as e:
+                    raise ConversationLockTimeout(
+                        f"Conversation {key} is still locked after {self.acquire_timeout}s."
+                    ) from e
+                try:
+                    yield
+                finally:
+                    await connection.execute("SELECT pg_advisory_unlock(hashtextextended($1, 0))", key)
+            finally:
+                await self._pool.release(connection)
+
+
+def create_lock_backend() -> InProcessLockBackend | PostgresAdvisoryLockBackend:
+    """Builds the lock backend selected by CONVERSATION_LOCK_BACKEND."""
+    backend = settings.CONVERSATION_LOCK_BACKEND
+    if backend == "memory":
+        return InProcessLockBackend()
+    if backend == "postgres":
+        if not settings.SUPABASE_DB_URL:
+            raise RuntimeError("CONVERSATION_LOCK_BACKEND=postgres requires SUPABASE_DB_URL.")
+        return PostgresAdvisoryLockBackend(
+            settings.SUPABASE_DB_URL,
+            pool_size=settings.CONVERSATION_LOCK_POOL_SIZE or settings.CONCURRENCY_MAX_LIMIT,
+            acquire_timeout=settings.CONVERSATION_LOCK_TIMEOUT_SECONDS
+        )
+    raise ValueError(f"Unknown CONVERSATION_LOCK_BACKEND '{backend}'; expected 'memory' or 'postgres'.")
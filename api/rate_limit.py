@@ -0,0 +1,214 @@
+# api/rate_limit.py
+import hashlib
+import json
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from config.settings import settings
+from monitoring.metrics import RATE_LIMITED
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a caller or conversation has used up its request quota."""
+
+    def __init__(self, scope: str, retry_after: float):
+        self.scope = scope
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"Rate limit exceeded for this {scope}. Retry in {self.retry_after}s.")
+
+
+class CostExceedsBurst(Exception):
+    """Raised when one request costs more than its bucket can ever hold; retrying can't help, splitting it can."""
+
+    def __init__(self, scope: str, cost: float, burst: float):
+        self.scope = scope
+        self.burst = burst
+        super().__init__(f"This request costs {cost:g} tokens but this {scope} allows at most {burst:g} at once.")
+
+
+@dataclass(frozen=True)
+class Quota:
+    """A sustained rate (requests per minute) and the burst (bucket size) allowed at once. A rate of 0 means unlimited."""
+    per_minute: float
+    burst: float
+
+    @property
+    def unlimited(self) -> bool:
+        return self.per_minute <= 0
+
+
+@dataclass(frozen=True)
+class ApiClient:
+    """
+    A caller identified by its API key. `name` is for display and logs; `key_id`, a hash of the
+    key, names its rate-limit buckets, so two keys that share a name never share a quota.
+    """
+    name: str
+    quota: Quota
+    key_id: str
+
+
+def key_id(api_key: str) -> str:
+    # Hashed so raw keys never end up in bucket names (or the rate_limit_buckets table).
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+def load_api_clients() -> dict[str, ApiClient]:
+    """
+    Maps each accepted API key to its client. API_SECRET_KEY is the "default" client; API_KEYS
+    adds more, e.g. {"key-1": {"name": "acme", "per_minute": 300, "burst": 50}}.
+    """
+    default_quota = Quota(settings.RATE_LIMIT_KEY_PER_MINUTE, settings.RATE_LIMIT_KEY_BURST)
+    clients = {}
+    if settings.API_SECRET_KEY:
+        clients[settings.API_SECRET_KEY] = ApiClient("default", default_quota, key_id(settings.API_SECRET_KEY))
+    for key, config in json.loads(settings.API_KEYS or "{}").items():
+        clients[key] = ApiClient(
+            config.get("name", key[:8]),
+            Quota(
+                float(config.get("per_minute", default_quota.per_minute)),
+                float(config.get("burst", default_quota.burst))
+            ),
+            key_id(key)
+        )
+    return clients
+
+
+class TokenBucket:
+    """Classic token bucket: refills continuously at `rate` tokens/second up to `capacity`."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = now
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait(self, cost: float) -> float:
+        """Seconds until `cost` tokens are available, 0 if they already are. Call `refill` first."""
+        return 0.0 if self.tokens >= cost else (cost - self.tokens) / self.rate
+
+    def take(self, now: float, cost: float = 1.0) -> float:
+        """
+        Takes `cost` tokens and returns 0, or returns the seconds until they would be available.
+        A cost above `capacity` never passes; RateLimiter rejects those before taking.
+        """
+        self.refill(now)
+        wait = self.wait(cost)
+        if not wait:
+            self.tokens -= cost
+        return wait
+
+
+# One bucket to charge: its key, its quota and the cost.
+Charge = tuple[str, Quota, float]
+
+
+class InMemoryRateLimiter:
+    """
+    Per-process token buckets, kept in an LRU bounded by `max_buckets`.
+
+    A check is a dict lookup and a little arithmetic, so it runs before any database or LLM
+    work. An evicted bucket simply starts full again, which only ever errs towards allowing.
+    With several workers each enforces its own share; use the Supabase backend for one shared limit.
+    """
+
+    def __init__(self, max_buckets: int):
+        self.max_buckets = max_buckets
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+
+    def _bucket(self, bucket_key: str, quota: Quota, now: float) -> TokenBucket:
+        bucket = self._buckets.get(bucket_key)
+        if bucket is None:
+            bucket = self._buckets[bucket_key] = TokenBucket(quota.per_minute / 60, quota.burst, now)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(bucket_key)
+        return bucket
+
+    async def take_all(self, charges: list[Charge]) -> list[float]:
+        """
+        Takes the tokens from every bucket if each has enough, otherwise from none. Returns each
+        bucket's wait in seconds (all 0 if the tokens were taken).
+        """
+        now = time.monotonic()
+        buckets = [self._bucket(bucket_key, quota, now) for bucket_key, quota, _ in charges]
+        for bucket in buckets:
+            bucket.refill(now)
+        waits = [bucket.wait(cost) for bucket, (_, _, cost) in zip(buckets, charges)]
+        if not any(waits):
+            for bucket, (_, _, cost) in zip(buckets, charges):
+                bucket.tokens -= cost
+        return waits
+
+
+class SupabaseRateLimiter:
+    """
+    Token buckets stored in Postgres via the `take_rate_limit_tokens` RPC, shared by every worker
+    and instance. Costs one round-trip per check, but still runs before any other work.
+    """
+
+    async def take_all(self, charges: list[Charge]) -> list[float]:
+        from tools.clients import get_async_supabase
+        supabase = await get_async_supabase()
+        response = await supabase.rpc("take_rate_limit_tokens", {
+            "p_buckets": [
+                {"bucket": bucket_key, "rate": quota.per_minute / 60, "burst": quota.burst, "cost": cost}
+                for bucket_key, quota, cost in charges
+            ]
+        }).execute()
+        return [float(wait or 0) for wait in response.data or [0] * len(charges)]
+
+
+class RateLimiter:
+    """Checks the per-API-key and per-conversation quotas against the configured bucket store."""
+
+    def __init__(self, store, conversation_quota: Quota, enabled: bool):
+        self.store = store
+        self.conversation_quota = conversation_quota
+        self.enabled = enabled
+
+    async def check(self, client: ApiClient, conversation_id: str | None = None, cost: float = 1.0) -> None:
+        """
+        Charges `cost` to the API key's bucket and, given a conversation, one token to the
+        conversation's bucket. Both are checked before either is charged, so a request rejected
+        by one limit uses up nothing from the other.
+        """
+        if not self.enabled:
+            return
+        limits = [("api_key", client.key_id, client.quota, cost)]
+        if conversation_id is not None:
+            limits.append(("conversation", f"{client.key_id}:{conversation_id}", self.conversation_quota, 1.0))
+        limits = [limit for limit in limits if not limit[2].unlimited]
+        for scope, _, quota, limit_cost in limits:
+            if limit_cost > quota.burst:
+                RATE_LIMITED.inc(scope=scope)
+                raise CostExceedsBurst(scope, limit_cost, quota.burst)
+        if not limits:
+            return
+
+        waits = await self.store.take_all([(f"{scope}:{key}", quota, c) for scope, key, quota, c in limits])
+        retry_after, scope = max((wait, limit[0]) for wait, limit in zip(waits, limits))
+        if retry_after > 0:
+            RATE_LIMITED.inc(scope=scope)
+            raise RateLimitExceeded(scope, retry_after)
+
+
+def create_rate_limiter() -> RateLimiter:
+    if settings.RATE_LIMIT_BACKEND == "supabase":
+        store = SupabaseRateLimiter()
+    else:
+        store = InMemoryRateLimiter(settings.RATE_LIMIT_MAX_BUCKETS)
+    return RateLimiter(
+        store,
+        Quota(settings.RATE_LIMIT_CONVERSATION_PER_MINUTE, settings.RATE_LIMIT_CONVERSATION_BURST),
+        settings.RATE_LIMIT_ENABLED
+    )
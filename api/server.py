@@ -1,21 +1,40 @@
 # api/server.py
 import asyncio
+import hmac
 import logging
 import datetime
 import pytz
 import json
+import time
 
-from fastapi import FastAPI, HTTPException, Depends, Header, status
+from fastapi import FastAPI, HTTPException, Depends, Header, Request, status
 from pydantic import BaseModel
 from supabase.client import Client, create_client
 from config.settings import settings
-from agent.agent_factory import create_agent_executor
-from langchain.memory import ConversationBufferMemory
 from langchain_core.chat_history import BaseChatMessageHistory
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, messages_from_dict, messages_to_dict
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage, messages_from_dict, messages_to_dict
 from collections import defaultdict
-from fastapi.responses import HTMLResponse
-from tools.google_calendar import create_calendar_event
+from fastapi.responses import HTMLResponse, PlainTextResponse
+from tools.clients import get_async_supabase, aclose_clients
+from tools.conversation_archive import afetch_full_history
+from tools.deadline import deadline_scope, remaining, bounded_timeout
+from api.calendar_sync import calendar_sync_worker
+from api.capture import TrafficCaptureMiddleware, create_capture_writer, note_turn
+from api.compaction import compaction_worker
+from api.concurrency import ConcurrencyLimitExceeded, agent_limiter
+from api.rate_limit import ApiClient, CostExceedsBurst, RateLimitExceeded, create_rate_limiter, load_api_clients
+from api.locks import ConversationLockTimeout, create_lock_backend
+from api.conversation_cache import ConversationState, conversation_cache
+from agent.runtime_config import get_runtime_config, reload_runtime_config, runtime_config_watcher
+from monitoring.metrics import (
+    HTTP_REQUEST_DURATION,
+    REQUEST_DEADLINE_EXCEEDED,
+    TURN_TOKENS,
+    format_server_timing,
+    registry,
+    stage_timer,
+    start_request_timings
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -26,190 +45,669 @@ app = FastAPI(
     version=settings.API_VERSION
 )
 
-async def verify_api_key(x_api_key: str = Header()):
-    if not settings.API_SECRET_KEY:
+# Opt-in /chat traffic capture for replay benchmarks. Added before the metrics middleware
+# below so it runs inside it and can read the request's stage timings.
+capture_writer = create_capture_writer() if settings.TRAFFIC_CAPTURE_ENABLED else None
+if capture_writer is not None:
+    app.add_middleware(TrafficCaptureMiddleware, writer=capture_writer, sample_rate=settings.TRAFFIC_CAPTURE_SAMPLE_RATE)
+
+# Readiness is reported by /ready once warm_up() has connected every client the agent needs.
+readiness = {"ready": False, "error": None}
+_warm_up_task: asyncio.Task | None = None
+
+def _warm_agent_resources() -> None:
+    # LangChain and the Google SDKs are imported here rather than at module import, so the
+    # worker binds its port (and answers /health) while the heavy imports and connections run.
+    from agent.agent_factory import get_shared_resources
+    get_shared_resources()
+    get_runtime_config()
+    if settings.RETRIEVAL_CONTEXT_TOKEN_BUDGET:
+        from utils.helpers import load_encoding
+        load_encoding()
+    if settings.INTENT_ROUTER_ENABLED:
+        from agent.router import get_intent_router
+        get_intent_router().load_exemplars()
+    if settings.FACT_LOOKUP_ENABLED:
+        from agent.fact_index import get_fact_index
+        get_fact_index()
+    if settings.LOCAL_VECTOR_INDEX != "off":
+        from agent.vector_index import get_vector_index
+        get_vector_index()
+
+async def warm_up() -> None:
+    """Connects Neo4j (loading its schema and the async pool), the Gemini clients, the runtime config (persona and tools), the tokenizer, the fact index and Supabase."""
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            started = time.perf_counter()
+            await asyncio.to_thread(_warm_agent_resources)
+            async_supabase = await get_async_supabase()
+            await async_supabase.table(settings.DB_CONVERSATION_HISTORY_TABLE).select("conversation_id").limit(1).execute()
+            from agent.agent_factory import get_shared_resources
+            async_graph = get_shared_resources().async_graph
+            if async_graph is not None:
+                await async_graph.verify_connectivity()
+            readiness.update(ready=True, error=None)
+            logger.info(f"✅ Warm-up finished in {time.perf_counter() - started:.1f}s; ready for traffic.")
+            return
+        except Exception as e:
+            readiness["error"] = str(e)
+            delay = min(60, settings.SERVER_WARMUP_RETRY_SECONDS * attempt)
+            logger.error(f"Warm-up attempt {attempt} failed: {e}. Retrying in {delay}s.", exc_info=True)
+            await asyncio.sleep(delay)
+
+@app.on_event("startup")
+async def start_background_workers():
+    global _warm_up_task
+    await conversation_locks.start()
+    await calendar_sync_worker.start()
+    if settings.RUNTIME_CONFIG_WATCH:
+        await runtime_config_watcher.start()
+    if settings.COMPACTION_ENABLED:
+        await compaction_worker.start()
+    if settings.CONVERSATION_CACHE_REALTIME_INVALIDATION:
+        await conversation_cache.start_invalidation_listener(await get_async_supabase())
+    if settings.SERVER_WARMUP:
+        _warm_up_task = asyncio.create_task(warm_up())
+    else:
+        readiness["ready"] = True
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    if _warm_up_task is not None:
+        _warm_up_task.cancel()
+    await calendar_sync_worker.stop()
+    await runtime_config_watcher.stop()
+    await compaction_worker.stop()
+    await conversation_cache.stop_invalidation_listener()
+    await conversation_locks.stop()
+    await aclose_clients()
+    from agent.graph_async import aclose_async_graph
+    await aclose_async_graph()
+    if capture_writer is not None:
+        capture_writer.close()
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Times every request and, if enabled, reports its per-stage breakdown in a Server-Timing header."""
+    timings = start_request_timings()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+
+    # Use the route template (e.g. /confirm-meeting/{meeting_id}) to keep label cardinality bounded.
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    HTTP_REQUEST_DURATION.observe(elapsed, method=request.method, path=path, status=str(response.status_code))
+    if settings.METRICS_TIMING_HEADER:
+        response.headers["Server-Timing"] = format_server_timing(timings, elapsed)
+    return response
+
+@app.get("/health")
+async def health():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once warm-up has finished, 503 until then (point load balancers here)."""
+    if not readiness["ready"]:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={"status": "warming_up", "error": readiness["error"]}
+        )
+    return {"status": "ready"}
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Exposes this process's metrics in Prometheus text format."""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+# Accepted API keys (API_SECRET_KEY plus API_KEYS) and the client each identifies.
+api_clients = load_api_clients()
+rate_limiter = create_rate_limiter()
+
+async def verify_api_key(x_api_key: str = Header()) -> ApiClient:
+    if not api_clients:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="API Secret Key not configured on the server."
         )
-    if x_api_key != settings.API_SECRET_KEY:
+    client = api_clients.get(x_api_key)
+    if client is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or missing API Key."
         )
+    return client
+
+async def verify_admin_key(x_api_key: str = Header()) -> None:
+    """Admin endpoints accept only ADMIN_API_KEY (or API_SECRET_KEY if it isn't set), never the per-client API_KEYS."""
+    admin_key = settings.ADMIN_API_KEY or settings.API_SECRET_KEY
+    if not admin_key or not hmac.compare_digest(x_api_key.encode(), admin_key.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="This endpoint requires the admin API key."
+        )
+
+async def get_client_key(client: ApiClient = Depends(verify_api_key),
+                         x_tenant_id: str | None = Header(default=None)) -> str:
+    """Identifies the caller for fair scheduling; callers serving several tenants can set X-Tenant-Id."""
+    return f"{client.name}:{x_tenant_id}" if x_tenant_id else client.name
+
+def _rate_limited_exception(e: RateLimitExceeded) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+def _overloaded_exception(e: ConcurrencyLimitExceeded) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)}
+    )
 
-agent_semaphore = asyncio.Semaphore(settings.CONCURRENCY_LIMIT)
 supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
 
-conversation_locks = defaultdict(asyncio.Lock)
+# Serializes turns per conversation: in-process by default, or across workers via Postgres.
+conversation_locks = create_lock_backend()
+
+def _clean_history_dicts(history_data: list[dict]) -> list[dict]:
+    """Fixes any malformed tool_calls in stored history before validation."""
+    # --- THIS IS THE FIX ---
+    # Iterate through the history and fix any malformed tool_calls before validation
+    for message_data in history_data:
+        if message_data.get("type") == "ai":
+            ai_data = message_data.get("data", {})
+            tool_calls = ai_data.get("tool_calls")
+            if tool_calls and isinstance(tool_calls, list):
+                for tool_call in tool_calls:
+                    # If args is a string, attempt to convert it to a dict
+                    if "args" in tool_call and isinstance(tool_call["args"], str):
+                        try:
+                            # First, try to parse it as JSON
+                            tool_call["args"] = json.loads(tool_call["args"])
+                        except json.JSONDecodeError:
+                            # If it's not JSON, wrap it in a dict
+                            tool_call["args"] = {"query": tool_call["args"]}
+    return history_data
+
+CONVERSATION_STATE_COLUMNS = "status, history, version, prompt_tokens, completion_tokens, summary"
+
+def _cache_row(conversation_id: str, row: dict | None) -> ConversationState:
+    if not row:
+        # No row yet: cache the first-turn state so the next read is free as well.
+        return conversation_cache.put(conversation_id, "active", [], 0)
+    return conversation_cache.put(
+        conversation_id,
+        row.get("status") or "active",
+        _clean_history_dicts(row.get("history") or []),
+        row.get("version") or 0,
+        (row.get("prompt_tokens") or 0) + (row.get("completion_tokens") or 0),
+        row.get("summary")
+    )
+
+async def load_conversation_state(conversation_id: str) -> ConversationState:
+    """Returns status and recent history, from the cache or in a single Supabase round-trip."""
+    state = conversation_cache.get(conversation_id)
+    if state is not None:
+        return state
+    async_supabase = await get_async_supabase()
+    with stage_timer("history_io"):
+        response = await async_supabase.table(settings.DB_CONVERSATION_HISTORY_TABLE).select(
+            CONVERSATION_STATE_COLUMNS
+        ).eq("conversation_id", conversation_id).execute()
+    return _cache_row(conversation_id, response.data[0] if response.data else None)
+
+def _state_messages(state: ConversationState) -> list[BaseMessage]:
+    """The agent's view of the history: the compaction summary (if any), then the recent messages."""
+    messages = messages_from_dict(state.messages)
+    if state.summary:
+        messages.insert(0, SystemMessage(content=f"Summary of the earlier conversation: {state.summary}"))
+    return messages
+
+def _serialize_messages(messages: list[BaseMessage]) -> list[dict]:
+    new_history_dicts = []
+    for message in messages:
+        message_dict = messages_to_dict([message])[0]
+        if isinstance(message, AIMessage) and hasattr(message, 'tool_calls') and message.tool_calls:
+            # Ensure the tool_calls are in the correct format before saving
+            message_dict['data']['tool_calls'] = message.tool_calls
+        new_history_dicts.append(message_dict)
+    return new_history_dicts
 
 class SupabaseChatMessageHistory(BaseChatMessageHistory):
+    """
+    Chat history stored as a JSON array on the conversation_history row.
+
+    Reads are served from the per-process conversation cache when possible. Writes append
+    server-side through the `append_conversation_messages` RPC, so the full history is never
+    re-read or re-sent, and are then applied write-through to the cache.
+    """
     def __init__(self, session_id: str, table_name: str):
         self.session_id = session_id
         self.table_name = table_name
 
     @property
     def messages(self):
-        """Retrieve and clean messages from Supabase."""
-        response = supabase.table(self.table_name).select("history").eq("conversation_id", self.session_id).execute()
-        
-        if not response.data or not response.data[0].get('history'):
-            return []
-
-        history_data = response.data[0]['history']
-
-        # --- THIS IS THE FIX ---
-        # Iterate through the history and fix any malformed tool_calls before validation
-        for message_data in history_data:
-            if message_data.get("type") == "ai":
-                ai_data = message_data.get("data", {})
-                tool_calls = ai_data.get("tool_calls")
-                if tool_calls and isinstance(tool_calls, list):
-                    for tool_call in tool_calls:
-                        # If args is a string, attempt to convert it to a dict
-                        if "args" in tool_call and isinstance(tool_call["args"], str):
-                            try:
-                                # First, try to parse it as JSON
-                                tool_call["args"] = json.loads(tool_call["args"])
-                            except json.JSONDecodeError:
-                                # If it's not JSON, wrap it in a dict
-                                tool_call["args"] = {"query": tool_call["args"]}
-        
-        return messages_from_dict(history_data)
+        """Retrieve and clean messages from the cache or Supabase."""
+        state = conversation_cache.get(self.session_id)
+        if state is None:
+            with stage_timer("history_io"):
+                response = supabase.table(self.table_name).select(CONVERSATION_STATE_COLUMNS).eq("conversation_id", self.session_id).execute()
+            state = _cache_row(self.session_id, response.data[0] if response.data else None)
+        return _state_messages(state)
 
+    async def aget_messages(self) -> list[BaseMessage]:
+        state = await load_conversation_state(self.session_id)
+        return _state_messages(state)
 
     def add_messages(self, messages: list[BaseMessage]) -> None:
         """Save messages to Supabase, correctly formatting tool calls."""
-        current_history_dicts = messages_to_dict(self.messages)
-        
-        new_history_dicts = []
-        for message in messages:
-            message_dict = messages_to_dict([message])[0]
-            if isinstance(message, AIMessage) and hasattr(message, 'tool_calls') and message.tool_calls:
-                # Ensure the tool_calls are in the correct format before saving
-                message_dict['data']['tool_calls'] = message.tool_calls
-            new_history_dicts.append(message_dict)
-
-        updated_history = current_history_dicts + new_history_dicts
-        
-        supabase.table(self.table_name).upsert({
-            "conversation_id": self.session_id, 
-            "history": updated_history,
-            "status": "active"
-        }).execute()
+        new_history_dicts = _serialize_messages(messages)
+        with stage_timer("history_io"):
+            response = supabase.rpc("append_conversation_messages", {
+                "p_conversation_id": self.session_id,
+                "p_messages": new_history_dicts
+            }).execute()
+        conversation_cache.append_messages(self.session_id, new_history_dicts, response.data)
+
+    async def aadd_messages(self, messages: list[BaseMessage]) -> None:
+        new_history_dicts = _serialize_messages(messages)
+        async_supabase = await get_async_supabase()
+        with stage_timer("history_io"):
+            response = await async_supabase.rpc("append_conversation_messages", {
+                "p_conversation_id": self.session_id,
+                "p_messages": new_history_dicts
+            }).execute()
+        conversation_cache.append_messages(self.session_id, new_history_dicts, response.data)
 
     def clear(self) -> None:
         supabase.table(self.table_name).delete().eq("conversation_id", self.session_id).execute()
+        conversation_cache.invalidate(self.session_id)
 
 class ChatRequest(BaseModel):
     conversation_id: str
     query: str
 
-@app.post("/chat", dependencies=[Depends(verify_api_key)])
-async def chat_with_agent(request: ChatRequest):
-    lock = conversation_locks[request.conversation_id]
+class ChatBatchRequest(BaseModel):
+    items: list[ChatRequest]
+
+class ReloadRequest(BaseModel):
+    knowledge_base_version: str | None = None
+
+HANDOVER_RESPONSE = "A human agent will be with you shortly. Thank you for your patience."
+EMPTY_RESPONSE_FALLBACK = "I'm sorry, I seem to have lost my train of thought. Could you please tell me a little more about what you're looking for?"
+
+async def record_token_usage(conversation_id: str, prompt_tokens: int, completion_tokens: int) -> None:
+    """Adds a turn's token usage to the conversation's running totals."""
+    TURN_TOKENS.observe(prompt_tokens + completion_tokens)
+    logger.info(f"Convo ID {conversation_id} used {prompt_tokens} prompt + {completion_tokens} completion tokens this turn.")
+    if not (prompt_tokens or completion_tokens):
+        return
+    try:
+        async_supabase = await get_async_supabase()
+        with stage_timer("history_io"):
+            await async_supabase.rpc("record_conversation_usage", {
+                "p_conversation_id": conversation_id,
+                "p_prompt_tokens": prompt_tokens,
+                "p_completion_tokens": completion_tokens
+            }).execute()
+        conversation_cache.add_token_usage(conversation_id, prompt_tokens + completion_tokens)
+    except Exception as e:
+        # Accounting must never fail a turn the user has already been answered for.
+        logger.error(f"Could not record token usage for convo ID {conversation_id}: {e}", exc_info=True)
+
+def _turn_token_budget(conversation_state: ConversationState | None) -> int | None:
+    """The tokens this turn may use: the per-turn budget, capped by what the conversation has left."""
+    turn_budget = settings.AGENT_TURN_TOKEN_BUDGET or None
+    if not settings.CONVERSATION_TOKEN_BUDGET or conversation_state is None:
+        return turn_budget
+    remaining = settings.CONVERSATION_TOKEN_BUDGET - conversation_state.total_tokens
+    return remaining if turn_budget is None else min(turn_budget, remaining)
 
-    async with lock:
+async def answer_on_fast_path(conversation_id: str, query: str, message_history: SupabaseChatMessageHistory,
+                              current_time: str) -> str | None:
+    """Answers a routed knowledge question with one retrieval + one LLM call, or returns None to use the agent."""
+    from agent.agent_factory import LatencyCallbackHandler, TokenUsageCallbackHandler
+    from agent.router import answer_knowledge_question
+
+    token_usage = TokenUsageCallbackHandler()
+    try:
+        timeout = bounded_timeout(None)
+        answer = await asyncio.wait_for(
+            answer_knowledge_question(
+                query,
+                await message_history.aget_messages(),
+                current_time,
+                callbacks=[LatencyCallbackHandler(), token_usage]
+            ),
+            timeout
+        )
+    except Exception as e:
+        logger.error(f"Fast path failed for convo ID {conversation_id}; using the full agent: {e}", exc_info=True)
+        answer = None
+    finally:
+        await record_token_usage(conversation_id, token_usage.prompt_tokens, token_usage.completion_tokens)
+
+    if answer:
+        await message_history.aadd_messages([HumanMessage(content=query), AIMessage(content=answer)])
+    return answer
+
+# How long past the deadline a turn may keep running (e.g. to save a stopped agent's reply)
+# before it is cancelled outright.
+DEADLINE_GRACE_SECONDS = 5.0
+
+async def run_chat_turn(conversation_id: str, query: str, client_key: str = "default") -> str:
+    """
+    Runs one conversational turn within the CHAT_REQUEST_TIMEOUT_SECONDS deadline.
+
+    Lock and queue waits, tool calls and the agent loop are bounded by the time left, so a turn
+    normally finishes on time with a (possibly partial) answer. A turn still running after the
+    deadline plus a short grace period is cancelled, which releases its conversation lock and
+    agent slot, and the caller gets CHAT_TIMEOUT_MESSAGE.
+    """
+    with deadline_scope(settings.CHAT_REQUEST_TIMEOUT_SECONDS):
+        left = remaining()
+        try:
+            return await asyncio.wait_for(
+                _run_chat_turn(conversation_id, query, client_key),
+                None if left is None else left + DEADLINE_GRACE_SECONDS
+            )
+        except asyncio.TimeoutError:
+            REQUEST_DEADLINE_EXCEEDED.inc()
+            note_turn("timeout")
+            logger.warning(f"Turn for convo ID {conversation_id} was cancelled at the request deadline.")
+            return settings.CHAT_TIMEOUT_MESSAGE
+
+async def _run_chat_turn(conversation_id: str, query: str, client_key: str) -> str:
+    """
+    Runs one conversational turn, serialized per conversation and bounded by the adaptive
+    agent limiter. Raises ConcurrencyLimitExceeded if no agent slot frees up in time.
+    """
+    from agent.agent_factory import create_agent_executor, LatencyCallbackHandler
+    from agent.router import KNOWLEDGE, TEMPLATE_INTENTS, get_intent_router
+    from langchain.memory import ConversationBufferMemory
+
+    async with conversation_locks.hold(conversation_id):
+        conversation_state = None
         try:
-            # --- THIS IS A FIX ---
-            # Removed .single() to prevent errors on the first turn of a conversation.
-            status_response = supabase.table("conversation_history").select("status").eq("conversation_id", request.conversation_id).execute()
+            # A single round-trip (or none, for hot conversations) for both the status
+            # check and the history the agent's memory loads below.
+            conversation_state = await load_conversation_state(conversation_id)
+
+            if conversation_state.status == 'handover':
+                logger.info(f"Conversation {conversation_id} is in handover. Bypassing agent.")
+                message_history = SupabaseChatMessageHistory(session_id=conversation_id, table_name=settings.DB_CONVERSATION_HISTORY_TABLE)
+                await message_history.aadd_messages([HumanMessage(content=query)])
+                note_turn("handover")
+                return HANDOVER_RESPONSE
+        except Exception as e:
+            # Usually a schema that predates a column in CONVERSATION_STATE_COLUMNS; see the readme's upgrade SQL.
+            logger.error(f"Could not load the state of convo ID {conversation_id}; continuing without it: {e}", exc_info=True)
+
+        token_budget = _turn_token_budget(conversation_state)
+        if token_budget is not None and token_budget <= 0:
+            logger.info(f"Conversation {conversation_id} has used its token budget. Bypassing agent.")
+            message_history = SupabaseChatMessageHistory(session_id=conversation_id, table_name=settings.DB_CONVERSATION_HISTORY_TABLE)
+            await message_history.aadd_messages([
+                HumanMessage(content=query),
+                AIMessage(content=settings.CONVERSATION_BUDGET_EXCEEDED_MESSAGE)
+            ])
+            note_turn("budget_exceeded")
+            return settings.CONVERSATION_BUDGET_EXCEEDED_MESSAGE
+
+        sast_tz = pytz.timezone("Africa/Johannesburg")
+        current_time_sast = datetime.datetime.now(sast_tz).strftime('%A, %Y-%m-%d %H:%M:%S %Z')
+        message_history = SupabaseChatMessageHistory(
+            session_id=conversation_id,
+            table_name=settings.DB_CONVERSATION_HISTORY_TABLE
+        )
+
+        route = None
+        # Without the conversation state we can't tell whether the user is mid-workflow.
+        if settings.INTENT_ROUTER_ENABLED and conversation_state is not None:
+            try:
+                with stage_timer("routing"):
+                    route = await get_intent_router().aroute(query, conversation_state.messages)
+                logger.info(f"Convo ID {conversation_id} routed to '{route.intent}' ({route.method}).")
+            except Exception as e:
+                logger.error(f"Intent routing failed for convo ID {conversation_id}; using the full agent: {e}", exc_info=True)
+
+        if route is not None and route.intent in TEMPLATE_INTENTS:
+            reply = get_intent_router().templates[route.intent]
+            await message_history.aadd_messages([HumanMessage(content=query), AIMessage(content=reply)])
+            note_turn(f"template:{route.intent}")
+            return reply
+
+        async with agent_limiter.slot(client_key):
+            if route is not None and route.intent == KNOWLEDGE:
+                answer = await answer_on_fast_path(conversation_id, query, message_history, current_time_sast)
+                if answer:
+                    note_turn("fast_path")
+                    return answer
+
+            memory = ConversationBufferMemory(
+                memory_key="history",
+                chat_memory=message_history,
+                return_messages=True,
+                input_key="input"
+            )
+
+            agent_executor, tool_callback = create_agent_executor(
+                memory, conversation_id=conversation_id, token_budget=token_budget
+            )
+            token_usage = agent_executor.token_usage
+
+            agent_input = {
+                "input": query,
+                "current_time": current_time_sast,
+                "conversation_id": conversation_id
+            }
+            logger.info(f"--- AGENT INPUT FOR CONVO ID: {conversation_id} ---")
+            logger.info(agent_input)
+            logger.info("----------------------------------------------------")
+            
+            try:
+                with stage_timer("agent_run"):
+                    response = await agent_executor.ainvoke(
+                        agent_input, config={"callbacks": [LatencyCallbackHandler(), token_usage]}
+                    )
+            finally:
+                await record_token_usage(conversation_id, token_usage.prompt_tokens, token_usage.completion_tokens)
+
+            agent_output = response.get("output")
+            if agent_executor.stop_reason:
+                logger.warning(f"Agent for convo ID {conversation_id} stopped early ({agent_executor.stop_reason}).")
             
-            if status_response.data and status_response.data[0].get('status') == 'handover':
-                logger.info(f"Conversation {request.conversation_id} is in handover. Bypassing agent.")
-                message_history = SupabaseChatMessageHistory(session_id=request.conversation_id, table_name=settings.DB_CONVERSATION_HISTORY_TABLE)
-                message_history.add_messages([HumanMessage(content=request.query)])
-                return {"response": "A human agent will be with you shortly. Thank you for your patience."}
-        except Exception:
-            pass
-        
-        async with agent_semaphore:
+            tool_calls = tool_callback.tool_calls
+            note_turn("agent", [call["name"] for call in tool_calls])
+            if any(call["name"] == "request_human_handover" for call in tool_calls):
+                # The handover tool changed the row's status behind the cache's back.
+                conversation_cache.invalidate(conversation_id)
+            ai_message = AIMessage(content=agent_output)
+            if tool_calls:
+                ai_message.tool_calls = tool_calls
+
+            # message_history.add_messages([
+            #     HumanMessage(content=request.query),
+            #     ai_message
+            # ])
+
+            if not agent_output or not agent_output.strip():
+                logger.warning(f"Agent for convo ID {conversation_id} generated an empty response. Sending a default message.")
+                agent_output = EMPTY_RESPONSE_FALLBACK
+
+            return agent_output
+
+@app.post("/chat")
+async def chat_with_agent(request: ChatRequest, client: ApiClient = Depends(verify_api_key),
+                          client_key: str = Depends(get_client_key)):
+    try:
+        # Both the API key's and the conversation's bucket, before any other work.
+        await rate_limiter.check(client, request.conversation_id)
+    except RateLimitExceeded as e:
+        logger.warning(f"Rate limited /chat for conversation_id {request.conversation_id}: {e}")
+        raise _rate_limited_exception(e)
+    try:
+        return {"response": await run_chat_turn(request.conversation_id, request.query, client_key)}
+    except ConcurrencyLimitExceeded as e:
+        logger.warning(f"Rejected /chat for conversation_id {request.conversation_id}: {e}")
+        raise _overloaded_exception(e)
+    except ConversationLockTimeout as e:
+        logger.warning(f"Rejected /chat for conversation_id {request.conversation_id}: {e}")
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error in /chat for conversation_id {request.conversation_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+@app.post("/chat/batch")
+async def chat_batch(request: ChatBatchRequest, client: ApiClient = Depends(verify_api_key),
+                     client_key: str = Depends(get_client_key)):
+    """
+    Processes many chat messages in one request, e.g. a webhook backlog replayed after an outage.
+
+    Messages for the same conversation run strictly in the order given; distinct conversations
+    are drained by a pool of workers no larger than the agent limiter's current limit, so the
+    batch never floods the limiter's wait queue (which it shares, with the warm clients, with /chat).
+    Each item gets its own result, so one failing message doesn't fail the batch; items
+    rejected because the server is overloaded get status "rejected" and a retry_after. Once an
+    item fails or is rejected, the later items of its conversation are not run (status "skipped"),
+    since they would be answered without the turn before them.
+    Every item counts against the API key's rate limit; per-conversation limits don't apply,
+    since a replayed backlog legitimately holds bursts of messages for one conversation.
+    """
+    if len(request.items) > settings.CHAT_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"A batch may contain at most {settings.CHAT_BATCH_MAX_ITEMS} items."
+        )
+    try:
+        await rate_limiter.check(client, cost=len(request.items))
+    except CostExceedsBurst as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"{e} Split the batch into batches of at most {e.burst:g} items."
+        )
+    except RateLimitExceeded as e:
+        raise _rate_limited_exception(e)
+
+    indices_by_conversation: dict[str, list[int]] = defaultdict(list)
+    for index, item in enumerate(request.items):
+        indices_by_conversation[item.conversation_id].append(index)
+
+    results: list[dict] = [{} for _ in request.items]
+
+    async def drain_conversation(indices: list[int]) -> None:
+        for position, index in enumerate(indices):
+            item = request.items[index]
+            result = {"index": index, "conversation_id": item.conversation_id}
             try:
-                message_history = SupabaseChatMessageHistory(
-                    session_id=request.conversation_id,
-                    table_name=settings.DB_CONVERSATION_HISTORY_TABLE
-                )
-                
-                memory = ConversationBufferMemory(
-                    memory_key="history",
-                    chat_memory=message_history,
-                    return_messages=True,
-                    input_key="input"
-                )
-
-                agent_executor, tool_callback = create_agent_executor(memory, conversation_id=request.conversation_id)
-
-                sast_tz = pytz.timezone("Africa/Johannesburg")
-                current_time_sast = datetime.datetime.now(sast_tz).strftime('%A, %Y-%m-%d %H:%M:%S %Z')
-
-                agent_input = {
-                    "input": request.query,
-                    "current_time": current_time_sast,
-                    "conversation_id": request.conversation_id
-                }
-                logger.info(f"--- AGENT INPUT FOR CONVO ID: {request.conversation_id} ---")
-                logger.info(agent_input)
-                logger.info("----------------------------------------------------")
-                
-                response = await agent_executor.ainvoke(agent_input)
-
-                agent_output = response.get("output")
-                
-                tool_calls = tool_callback.tool_calls
-                ai_message = AIMessage(content=agent_output)
-                if tool_calls:
-                    ai_message.tool_calls = tool_calls
-
-                # message_history.add_messages([
-                #     HumanMessage(content=request.query),
-                #     ai_message
-                # ])
-
-                if not agent_output or not agent_output.strip():
-                    logger.warning(f"Agent for convo ID {request.conversation_id} generated an empty response. Sending a default message.")
-                    agent_output = "I'm sorry, I seem to have lost my train of thought. Could you please tell me a little more about what you're looking for?"
-
-                return {"response": agent_output}
+                result["response"] = await run_chat_turn(item.conversation_id, item.query, client_key)
+                result["status"] = "ok"
+            except ConcurrencyLimitExceeded as e:
+                result["status"] = "rejected"
+                result["error"] = str(e)
+                result["retry_after"] = e.retry_after
             except Exception as e:
-                logger.error(f"Error in /chat for conversation_id {request.conversation_id}: {e}", exc_info=True)
-                raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+                logger.error(f"Error in /chat/batch for conversation_id {item.conversation_id}: {e}", exc_info=True)
+                result["status"] = "error"
+                result["error"] = str(e)
+            results[index] = result
+            if result["status"] != "ok":
+                for skipped in indices[position + 1:]:
+                    results[skipped] = {
+                        "index": skipped,
+                        "conversation_id": item.conversation_id,
+                        "status": "skipped",
+                        "error": f"Not processed because message {index} of this conversation was not."
+                    }
+                return
+
+    pending: asyncio.Queue[list[int]] = asyncio.Queue()
+    for indices in indices_by_conversation.values():
+        pending.put_nowait(indices)
+
+    async def worker() -> None:
+        while not pending.empty():
+            await drain_conversation(pending.get_nowait())
+
+    worker_count = min(len(indices_by_conversation), max(1, int(agent_limiter.limit)))
+    await asyncio.gather(*(worker() for _ in range(worker_count)))
+    return {"results": results}
+
+@app.get("/admin/runtime-config", dependencies=[Depends(verify_admin_key)])
+async def runtime_config():
+    """Shows which runtime config version this worker is serving."""
+    return get_runtime_config().describe()
+
+@app.post("/admin/reload", dependencies=[Depends(verify_admin_key)])
+async def reload_config(request: ReloadRequest | None = None):
+    """
+    Reloads the persona prompt, custom tools and intents on this worker, optionally switching to
+    a new knowledge-base version. Turns already running finish on the version they started with.
+    """
+    try:
+        config = await asyncio.to_thread(
+            reload_runtime_config, request.knowledge_base_version if request else None
+        )
+    except Exception as e:
+        logger.error(f"Runtime config reload failed: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Reload failed; still serving version {get_runtime_config().version}: {e}"
+        )
+    return config.describe()
+
+@app.get("/admin/conversations/{conversation_id}/history", dependencies=[Depends(verify_admin_key)])
+async def conversation_full_history(conversation_id: str):
+    """Returns a conversation's complete history, including segments moved to the archive by compaction."""
+    async_supabase = await get_async_supabase()
+    history = await afetch_full_history(async_supabase, conversation_id)
+    state = await load_conversation_state(conversation_id)
+    return {
+        "conversation_id": conversation_id,
+        "status": state.status,
+        "summary": state.summary,
+        "message_count": len(history),
+        "history": history
+    }
 
 @app.get("/confirm-meeting/{meeting_id}", response_class=HTMLResponse)
 async def confirm_meeting(meeting_id: str):
-    """Endpoint to confirm a meeting, create a calendar event, and update the DB."""
+    """
+    Endpoint to confirm a meeting. The calendar event is created by the background
+    calendar sync worker, so this returns as soon as the meeting is marked 'confirming'.
+    """
     try:
-        response = supabase.table("meetings").select("*").eq("id", meeting_id).single().execute()
-        
+        supabase = await get_async_supabase()
+        response = await supabase.table("meetings").select("id, status").eq("id", meeting_id).execute()
+
         if not response.data:
             return "<h1>Meeting Not Found</h1><p>This confirmation link is invalid or has expired.</p>"
-        
-        meeting_details = response.data
-        
-        if meeting_details['status'] == 'confirmed':
+
+        current_status = response.data[0]['status']
+
+        if current_status == 'confirmed':
             return "<h1>Meeting Already Confirmed</h1><p>Your spot was already secured. We look forward to seeing you!</p>"
 
-        summary = f"Onboard Call with {meeting_details['company_name']} | Zappies AI"
-        description = (
-            f"Onboarding call with {meeting_details['full_name']} from {meeting_details['company_name']} to discuss the 'Project Pipeline AI'.\n\n"
-            f"Stated Goal: {meeting_details['goal']}\n"
-            f"Stated Budget: R{meeting_details['monthly_budget']}/month"
-        )
-        
-        created_event = create_calendar_event(
-            start_time=meeting_details['start_time'],
-            summary=summary,
-            description=description,
-            attendees=[meeting_details['email']]
-        )
-        
-        supabase.table("meetings").update({
-            "status": "confirmed",
-            "google_calendar_event_id": created_event.get('id')
-        }).eq("id", meeting_id).execute()
-        
-        logger.info(f"Meeting {meeting_id} confirmed and calendar event created successfully.")
-        return "<h1>Thank You!</h1><p>Your meeting has been successfully confirmed. We've added it to our calendar and look forward to speaking with you!</p>"
+        if current_status != 'confirming':
+            # Conditional update: only one click (or one server process) wins the transition,
+            # so a double-click can never enqueue two calendar syncs.
+            claimed = await supabase.table("meetings").update({
+                "status": "confirming"
+            }).eq("id", meeting_id).eq("status", current_status).execute()
+            if claimed.data:
+                calendar_sync_worker.enqueue(meeting_id)
+
+        logger.info(f"Meeting {meeting_id} confirmation accepted; calendar sync queued.")
+        return "<h1>Thank You!</h1><p>Your meeting has been successfully confirmed. We're adding it to our calendar and look forward to speaking with you!</p>"
 
     except Exception as e:
         logger.error(f"Error confirming meeting {meeting_id}: {e}", exc_info=True)
-        return "<h1>Error</h1><p>Sorry, something went wrong while confirming your meeting. Please try again later.</p>"
\ No newline at end of file
+        return "<h1>Error</h1><p>Sorry, something went wrong while confirming your meeting. Please try again later.</p>"
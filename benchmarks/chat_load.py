@@ -0,0 +1,175 @@
+# benchmarks/chat_load.py
+"""
+Offline load benchmark for the /chat endpoint.
+
+Drives `api.server:app` in-process with concurrent requests while Gemini, Neo4j and Supabase
+are replaced by the deterministic fakes in `benchmarks/fakes.py`, then reports throughput,
+latency percentiles and the mean time per stage (from the Server-Timing header).
+
+Usage:
+    python -m benchmarks.chat_load --requests 500 --concurrency 50 --llm-delay 0.05
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings are read at import time, so the fake environment must be in place first.
+os.environ.setdefault("SUPABASE_URL", "http://supabase.bench.local")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "bench.bench.bench")
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+os.environ.setdefault("API_SECRET_KEY", "bench-key")
+os.environ["METRICS_TIMING_HEADER"] = "true"
+os.environ["CONVERSATION_CACHE_REALTIME_INVALIDATION"] = "false"
+
+import httpx
+from langchain_neo4j import GraphCypherQAChain
+
+from benchmarks.fakes import (
+    AsyncInMemorySupabase,
+    HashEmbeddings,
+    InMemoryDatabase,
+    InMemoryGraph,
+    InMemorySupabase,
+    ScriptedChatModel,
+)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def parse_server_timing(header: str) -> dict[str, float]:
+    timings = {}
+    for entry in header.split(","):
+        name, _, duration = entry.strip().partition(";dur=")
+        if name and duration:
+            timings[name] = float(duration)
+    return timings
+
+
+def install_fakes(args) -> InMemoryDatabase:
+    """Points every client used by the server at the local fakes."""
+    import agent.agent_factory as agent_factory
+    import api.server as server
+    import tools.clients as clients
+
+    database = InMemoryDatabase(delay=args.db_delay)
+    embeddings = HashEmbeddings(delay=args.embedding_delay)
+    database.tables["documents"] = [
+        {"id": str(i), "content": f"Synthetic knowledge chunk {i} about fees, rules and bookings.",
+         "metadata": {"source": "bench.md"}, "embedding": embeddings._embed(f"chunk {i}")}
+        for i in range(args.documents)
+    ]
+    clients._supabase = InMemorySupabase(database)
+    clients._async_supabase = AsyncInMemorySupabase(database)
+    server.supabase = clients._supabase
+
+    graph = InMemoryGraph(delay=args.graph_delay)
+    graph_chain = GraphCypherQAChain.from_llm(
+        cypher_llm=ScriptedChatModel(mode="text", response_delay=args.llm_delay,
+                                     response_text="MATCH (n) RETURN n.id AS id LIMIT 5", tags=["cypher_generation"]),
+        qa_llm=ScriptedChatModel(mode="text", response_delay=args.llm_delay,
+                                 response_text="The fee is R250 per child.", tags=["graph_qa"]),
+        graph=graph,
+        allow_dangerous_requests=True
+    )
+    agent_factory._shared_resources = agent_factory.SharedResources(
+        llm=ScriptedChatModel(mode="react", response_delay=args.llm_delay, tool_script=args.tool_script),
+        graph=graph,
+        graph_chain=graph_chain,
+        supabase=clients._supabase,
+        embeddings=embeddings
+    )
+    # The benchmark drives one API key far past its production quota on purpose.
+    server.rate_limiter.enabled = False
+    return database
+
+
+async def run_load(args) -> dict:
+    from api.server import app
+    from config.settings import settings
+
+    latencies: list[float] = []
+    stage_samples: dict[str, list[float]] = defaultdict(list)
+    errors = 0
+    request_ids = iter(range(args.requests))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def worker() -> None:
+            nonlocal errors
+            for i in request_ids:
+                payload = {"conversation_id": f"bench-{i % args.conversations}", "query": f"What is the fee for a party? #{i}"}
+                start = time.perf_counter()
+                response = await client.post("/chat", json=payload, headers={"x-api-key": settings.API_SECRET_KEY})
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+                for stage, ms in parse_server_timing(response.headers.get("server-timing", "")).items():
+                    stage_samples[stage].append(ms)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        wall_time = time.perf_counter() - started
+
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "errors": errors,
+        "wall_time_s": round(wall_time, 3),
+        "requests_per_s": round(args.requests / wall_time, 2) if wall_time else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "max": round(max(latencies, default=0) * 1000, 2),
+        },
+        "stage_mean_ms": {stage: round(statistics.mean(samples), 2) for stage, samples in sorted(stage_samples.items())},
+        "config": {
+            "llm_delay": args.llm_delay, "db_delay": args.db_delay, "graph_delay": args.graph_delay,
+            "embedding_delay": args.embedding_delay, "tool_script": args.tool_script,
+            "conversations": args.conversations,
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline /chat load benchmark with local fakes.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--conversations", type=int, default=50, help="Distinct conversation ids to spread requests over.")
+    parser.add_argument("--llm-delay", type=float, default=0.05, help="Seconds per fake LLM call.")
+    parser.add_argument("--db-delay", type=float, default=0.005, help="Seconds per fake Supabase call.")
+    parser.add_argument("--graph-delay", type=float, default=0.01, help="Seconds per fake Neo4j query.")
+    parser.add_argument("--embedding-delay", type=float, default=0.01, help="Seconds per fake embedding call.")
+    parser.add_argument("--documents", type=int, default=200, help="Synthetic rows in the fake documents table.")
+    parser.add_argument("--tool-script", nargs="*", default=["General_Information_Search", "Knowledge_Graph_Search"],
+                        help="Tools the fake agent calls, in order, before answering.")
+    parser.add_argument("--output", help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    install_fakes(args)
+    # Per-request INFO logging would dominate the measurement.
+    logging.getLogger().setLevel(logging.WARNING)
+    results = asyncio.run(run_load(args))
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+# benchmarks/fakes.py
+"""
+Deterministic local stand-ins for Gemini, Neo4j and Supabase.
+
+They implement just enough of each client's surface for the code paths in `api/server.py`,
+`agent/agent_factory.py` and `tools/` to run unchanged, with configurable artificial latency
+so benchmarks measure our own overhead rather than upstream services.
+"""
+import asyncio
+import copy
+import hashlib
+import itertools
+import math
+import re
+import threading
+import time
+import uuid
+from typing import Any
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_neo4j.graphs.graph_store import GraphStore
+
+
+# --- Gemini stand-ins ---
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    A chat model that returns canned text after a fixed delay.
+
+    In `react` mode it plays a ReAct agent: one `Action` step per entry of `tool_script`
+    (counted from the Observations already in the scratchpad), then a `Final Answer`.
+    In `text` mode it always returns `response_text` (used for Cypher generation and graph QA).
+    """
+    mode: str = "react"
+    response_delay: float = 0.0
+    tool_script: list[str] = []
+    response_text: str = "This is a scripted answer."
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-chat-model"
+
+    def _respond(self, messages: list[BaseMessage]) -> str:
+        if self.mode != "react":
+            return self.response_text
+        prompt = messages[-1].content if messages else ""
+        turn = prompt.split("New input:")[-1]
+        question = turn.strip().splitlines()[0] if turn.strip() else ""
+        step = turn.count("Observation:")
+        if step < len(self.tool_script):
+            return (
+                "Thought: I need to use a tool to respond to the user.\n"
+                f"Action: {self.tool_script[step]}\n"
+                f"Action Input: {question}"
+            )
+        return f"Thought: I have a complete response for the user.\nFinal Answer: {self.response_text}"
+
+    def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.response_delay)
+        text = self._respond(messages)
+        usage = {"input_tokens": sum(len(str(m.content)) // 4 for m in messages), "output_tokens": len(text) // 4}
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+    async def _agenerate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.response_delay)
+        text = self._respond(messages)
+        usage = {"input_tokens": sum(len(str(m.content)) // 4 for m in messages), "output_tokens": len(text) // 4}
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic unit-length embeddings derived from a hash of the text."""
+
+    def __init__(self, size: int = 768, delay: float = 0.0):
+        self.size = size
+        self.delay = delay
+
+    def _embed(self, text: str) -> list[float]:
+        seed = hashlib.sha256(text.encode("utf-8")).digest()
+        values = []
+        for block in itertools.count():
+            digest = hashlib.sha256(seed + block.to_bytes(4, "little")).digest()
+            values.extend((byte - 127.5) / 127.5 for byte in digest)
+            if len(values) >= self.size:
+                break
+        values = values[:self.size]
+        norm = math.sqrt(sum(v * v for v in values)) or 1.0
+        return [v / norm for v in values]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        time.sleep(self.delay)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        time.sleep(self.delay)
+        return self._embed(text)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        await asyncio.sleep(self.delay)
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        await asyncio.sleep(self.delay)
+        return self._embed(text)
+
+
+# --- Neo4j stand-in ---
+
+class InMemoryGraph(GraphStore):
+    """A Neo4jGraph stand-in that answers every query with the stored rows after a fixed delay."""
+
+    def __init__(self, rows: list[dict] | None = None, delay: float = 0.0):
+        self.rows = rows if rows is not None else [
+            {"entity": "Party", "relationship": "HAS_FEE", "target": "R250 per child"},
+            {"entity": "Membership", "relationship": "APPLIES_TO", "target": "IPIC Active"},
+        ]
+        self.delay = delay
+        self.graph_documents = []
+        self.queries: list[str] = []
+
+    @property
+    def get_schema(self) -> str:
+        return "Node properties:\nEntity {id: STRING}\nRelationships:\n(:Entity)-[:HAS_FEE]->(:Entity)"
+
+    @property
+    def get_structured_schema(self) -> dict[str, Any]:
+        return {
+            "node_props": {"Entity": [{"property": "id", "type": "STRING"}]},
+            "rel_props": {},
+            "relationships": [{"start": "Entity", "type": "HAS_FEE", "end": "Entity"}],
+            "metadata": {},
+        }
+
+    def query(self, query: str, params: dict = {}, *args, **kwargs) -> list[dict[str, Any]]:
+        time.sleep(self.delay)
+        self.queries.append(query)
+        return copy.deepcopy(self.rows)
+
+    def refresh_schema(self) -> None:
+        pass
+
+    def add_graph_documents(self, graph_documents, include_source: bool = False, **kwargs) -> None:
+        self.graph_documents.extend(graph_documents)
+
+
+class KeywordGraphTransformer:
+    """
+    An LLMGraphTransformer stand-in that turns capitalized words into nodes, chaining each
+    node to the next with one of the allowed relationship types, after a per-chunk delay.
+    """
+
+    def __init__(self, delay_per_chunk: float = 0.0, relationship_types: list[str] | None = None, max_nodes: int = 8):
+        self.delay_per_chunk = delay_per_chunk
+        self.relationship_types = relationship_types or ["APPLIES_TO", "HAS_FEE"]
+        self.max_nodes = max_nodes
+
+    def convert_to_graph_documents(self, documents) -> list:
+        from langchain_community.graphs.graph_document import GraphDocument, Node, Relationship
+
+        graph_documents = []
+        for document in documents:
+            time.sleep(self.delay_per_chunk)
+            names = list(dict.fromkeys(re.findall(r"\b[A-Z][a-z]{3,}\b", document.page_content)))[:self.max_nodes]
+            nodes = [Node(id=name, type="Policy") for name in names]
+            relationships = [
+                Relationship(source=a, target=b, type=self.relationship_types[i % len(self.relationship_types)])
+                for i, (a, b) in enumerate(zip(nodes, nodes[1:]))
+            ]
+            graph_documents.append(GraphDocument(nodes=nodes, relationships=relationships, source=document))
+        return graph_documents
+
+
+# --- Supabase stand-in ---
+
+class _Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class InMemoryDatabase:
+    """Tables and RPCs shared by the sync and async Supabase stand-ins."""
+
+    def __init__(self, delay: float = 0.0, documents: list[dict] | None = None):
+        self.delay = delay
+        self.tables: dict[str, list[dict]] = {}
+        self.lock = threading.Lock()
+        self.rpcs = {
+            "append_conversation_messages": self._append_conversation_messages,
+            "match_documents": self._match_documents,
+            "record_conversation_usage": self._record_conversation_usage,
+            "replace_graph_facts": self._replace_graph_facts,
+        }
+        if documents:
+            self.tables["documents"] = documents
+
+    def table_rows(self, name: str) -> list[dict]:
+        return self.tables.setdefault(name, [])
+
+    def _append_conversation_messages(self, params: dict):
+        rows = self.table_rows("conversation_history")
+        for row in rows:
+            if row["conversation_id"] == params["p_conversation_id"]:
+                row["history"] = (row.get("history") or []) + params["p_messages"]
+                row["version"] = row.get("version", 0) + 1
+                return row["version"]
+        rows.append({
+            "conversation_id": params["p_conversation_id"], "history": list(params["p_messages"]),
+            "status": "active", "version": 1
+        })
+        return 1
+
+    def _record_conversation_usage(self, params: dict):
+        for row in self.table_rows("conversation_history"):
+            if row["conversation_id"] == params["p_conversation_id"]:
+                row["prompt_tokens"] = row.get("prompt_tokens", 0) + params["p_prompt_tokens"]
+                row["completion_tokens"] = row.get("completion_tokens", 0) + params["p_completion_tokens"]
+                return row["prompt_tokens"] + row["completion_tokens"]
+        return None
+
+    def _replace_graph_facts(self, params: dict):
+        self.tables["graph_facts"] = [{"id": i, **fact} for i, fact in enumerate(params["p_facts"], start=1)]
+        return len(params["p_facts"])
+
+    def _match_documents(self, params: dict):
+        query = params["query_embedding"]
+        scored = []
+        for row in self.table_rows("documents"):
+            embedding = row.get("embedding") or []
+            similarity = sum(a * b for a, b in zip(query, embedding))
+            scored.append({**row, "similarity": similarity})
+        scored.sort(key=lambda r: r["similarity"], reverse=True)
+        return scored[:params.get("match_count", 4)]
+
+
+def _matches(row: dict, filters: list[tuple[str, Any]]) -> bool:
+    for column, value in filters:
+        if column.startswith("metadata->>"):
+            actual = (row.get("metadata") or {}).get(column[len("metadata->>"):])
+        else:
+            actual = row.get(column)
+        if str(actual) != str(value):
+            return False
+    return True
+
+
+class _Query:
+    """A tiny subset of the PostgREST query builder: select/insert/update/upsert/delete + eq/order."""
+
+    def __init__(self, database: InMemoryDatabase, table: str):
+        self.database = database
+        self.table = table
+        self.operation = "select"
+        self.columns = "*"
+        self.payload = None
+        self.filters: list[tuple[str, Any]] = []
+        self.limit_count: int | None = None
+        self.offset = 0
+        self.order_by: tuple[str, bool] | None = None
+
+    def select(self, columns: str = "*", **kwargs):
+        self.operation, self.columns = "select", columns
+        return self
+
+    def insert(self, payload, **kwargs):
+        self.operation, self.payload = "insert", payload
+        return self
+
+    def update(self, payload, **kwargs):
+        self.operation, self.payload = "update", payload
+        return self
+
+    def upsert(self, payload, **kwargs):
+        self.operation, self.payload = "upsert", payload
+        return self
+
+    def delete(self, **kwargs):
+        self.operation = "delete"
+        return self
+
+    def eq(self, column: str, value):
+        self.filters.append((column, value))
+        return self
+
+    def order(self, column: str, desc: bool = False, **kwargs):
+        self.order_by = (column, desc)
+        return self
+
+    def limit(self, count: int):
+        self.limit_count = count
+        return self
+
+    def range(self, start: int, end: int):
+        self.offset, self.limit_count = start, end - start + 1
+        return self
+
+    def single(self):
+        self.limit_count = 1
+        return self
+
+    def _project(self, row: dict) -> dict:
+        if self.columns.strip() == "*":
+            return copy.deepcopy(row)
+        names = [c.strip() for c in self.columns.split(",")]
+        return {name: copy.deepcopy(row.get(name)) for name in names}
+
+    def _run(self):
+        with self.database.lock:
+            rows = self.database.table_rows(self.table)
+            if self.operation == "select":
+                matched = [r for r in rows if _matches(r, self.filters)]
+                if self.order_by:
+                    column, desc = self.order_by
+                    matched.sort(key=lambda r: r.get(column), reverse=desc)
+                data = [self._project(r) for r in matched][self.offset:]
+                return data[:self.limit_count] if self.limit_count else data
+            if self.operation == "insert":
+                new_rows = self.payload if isinstance(self.payload, list) else [self.payload]
+                inserted = [{"id": str(uuid.uuid4()), **copy.deepcopy(r)} for r in new_rows]
+                rows.extend(inserted)
+                return inserted
+            if self.operation == "update":
+                updated = [r for r in rows if _matches(r, self.filters)]
+                for row in updated:
+                    row.update(copy.deepcopy(self.payload))
+                return copy.deepcopy(updated)
+            if self.operation == "upsert":
+                payloads = self.payload if isinstance(self.payload, list) else [self.payload]
+                upserted = []
+                for payload in payloads:
+                    key = next((k for k in ("conversation_id", "file_path", "id") if k in payload), None)
+                    existing = next((r for r in rows if key and r.get(key) == payload.get(key)), None)
+                    if existing is not None:
+                        existing.update(copy.deepcopy(payload))
+                        upserted.append(copy.deepcopy(existing))
+                    else:
+                        rows.append(copy.deepcopy(payload))
+                        upserted.append(copy.deepcopy(payload))
+                return upserted
+            if self.operation == "delete":
+                removed = [r for r in rows if _matches(r, self.filters)]
+                rows[:] = [r for r in rows if not _matches(r, self.filters)]
+                return removed
+
+
+class _SyncQuery(_Query):
+    def execute(self) -> _Response:
+        time.sleep(self.database.delay)
+        return _Response(self._run())
+
+
+class _AsyncQuery(_Query):
+    async def execute(self) -> _Response:
+        await asyncio.sleep(self.database.delay)
+        return _Response(self._run())
+
+
+class _SyncRpc:
+    def __init__(self, database: InMemoryDatabase, name: str, params: dict):
+        self.database, self.name, self.params = database, name, params
+
+    def execute(self) -> _Response:
+        time.sleep(self.database.delay)
+        with self.database.lock:
+            return _Response(self.database.rpcs[self.name](self.params))
+
+
+class _AsyncRpc(_SyncRpc):
+    async def execute(self) -> _Response:
+        await asyncio.sleep(self.database.delay)
+        with self.database.lock:
+            return _Response(self.database.rpcs[self.name](self.params))
+
+
+class InMemorySupabase:
+    """Synchronous Supabase client stand-in backed by an InMemoryDatabase."""
+
+    def __init__(self, database: InMemoryDatabase):
+        self.database = database
+
+    def table(self, name: str) -> _SyncQuery:
+        return _SyncQuery(self.database, name)
+
+    from_ = table
+
+    def rpc(self, name: str, params: dict | None = None) -> _SyncRpc:
+        return _SyncRpc(self.database, name, params or {})
+
+
+class AsyncInMemorySupabase:
+    """Asynchronous Supabase client stand-in backed by the same InMemoryDatabase."""
+
+    def __init__(self, database: InMemoryDatabase):
+        self.database = database
+
+    def table(self, name: str) -> _AsyncQuery:
+        return _AsyncQuery(self.database, name)
+
+    from_ = table
+
+    def rpc(self, name: str, params: dict | None = None) -> _AsyncRpc:
+        return _AsyncRpc(self.database, name, params or {})
@@ -0,0 +1,182 @@
+# benchmarks/ingest_bench.py
+"""
+Ingestion throughput and memory benchmark.
+
+Generates a synthetic Markdown/PDF corpus, runs `ingestion.ingest.run_ingestion` against local
+fakes for the graph transformer, embeddings, Neo4j and Supabase, and reports files/sec,
+chunks/sec, peak RSS and seconds per stage as JSON.
+
+Each corpus size runs in its own subprocess so peak RSS is measured per size.
+
+Usage:
+    python -m benchmarks.ingest_bench --sizes 10 100 1000 --output ingest_results.json
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+os.environ.setdefault("SUPABASE_URL", "http://supabase.bench.local")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "bench.bench.bench")
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+
+WORDS = (
+    "policy rule membership party guest payment booking fee deposit refund session child adult "
+    "supervision entry waiver weekend weekday cancellation notice package venue catering socks "
+    "Party Membership Guest Deposit Refund Waiver Package Venue Catering Supervision"
+).split()
+
+
+def _paragraph(rng: random.Random, sentences: int) -> str:
+    return " ".join(
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+        for _ in range(sentences)
+    )
+
+
+def write_markdown(path: str, rng: random.Random, pages: int) -> None:
+    lines = [f"# Synthetic Policy Document {os.path.basename(path)}"]
+    for section in range(pages):
+        lines.append(f"\n## Section {section + 1}: {rng.choice(WORDS).title()} Rules")
+        for sub in range(2):
+            lines.append(f"\n### {rng.choice(WORDS).title()} {sub + 1}\n")
+            lines.append(_paragraph(rng, 6))
+        lines.append("\n| Item | Fee |\n| --- | --- |")
+        lines.extend(f"| {rng.choice(WORDS).title()} | R{rng.randint(50, 900)} |" for _ in range(4))
+    with open(path, "w") as f:
+        f.write("\n".join(lines))
+
+
+def write_pdf(path: str, rng: random.Random, pages: int) -> None:
+    """Writes a minimal, valid multi-page text PDF without any third-party dependency."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for _ in range(pages):
+        text_lines = [_paragraph(rng, 1)[:90] for _ in range(40)]
+        stream = "BT /F1 10 Tf 50 780 Td 14 TL " + " ".join(
+            "(" + line.replace("\\", "").replace("(", "").replace(")", "") + ") '" for line in text_lines
+        ) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        content_id = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {content_id} 0 R "
+                       f"/Resources << /Font << /F1 3 0 R >> >> >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    output += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(output)
+
+
+def generate_corpus(directory: str, files: int, pages_per_file: int, pdf_ratio: float, seed: int) -> None:
+    rng = random.Random(seed)
+    for i in range(files):
+        if rng.random() < pdf_ratio:
+            write_pdf(os.path.join(directory, f"doc_{i:05d}.pdf"), rng, pages_per_file)
+        else:
+            write_markdown(os.path.join(directory, f"doc_{i:05d}.md"), rng, pages_per_file)
+
+
+def run_single(args) -> dict:
+    """Runs one corpus size in the current process and returns its measurements."""
+    import contextlib
+    import io
+
+    from benchmarks.fakes import HashEmbeddings, InMemoryDatabase, InMemoryGraph, InMemorySupabase, KeywordGraphTransformer
+    from ingestion.ingest import run_ingestion
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        generate_corpus(corpus_dir, args.files, args.pages, args.pdf_ratio, args.seed)
+        corpus_bytes = sum(os.path.getsize(os.path.join(corpus_dir, f)) for f in os.listdir(corpus_dir))
+
+        graph = InMemoryGraph(delay=args.db_delay)
+        supabase = InMemorySupabase(InMemoryDatabase(delay=args.db_delay))
+        transformer = KeywordGraphTransformer(delay_per_chunk=args.extract_delay)
+        embeddings = HashEmbeddings(delay=args.embed_delay)
+
+        started = time.perf_counter()
+        # The pipeline prints progress per file; keep the benchmark output machine-readable.
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = run_ingestion(graph, supabase, transformer, embeddings, source_path=corpus_dir)
+        elapsed = time.perf_counter() - started
+
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS.
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+
+    return {
+        "files": args.files,
+        "pages_per_file": args.pages,
+        "corpus_mb": round(corpus_bytes / (1024 * 1024), 3),
+        "chunks": stats["chunks"],
+        "duplicate_chunks": stats["duplicate_chunks"],
+        "chunk_tokens": stats.get("chunk_tokens", {}),
+        "graph_documents": stats["graph_documents"],
+        "merged_entities": stats["merged_entities"],
+        "elapsed_s": round(elapsed, 3),
+        "files_per_s": round(stats["files_processed"] / elapsed, 2) if elapsed else 0.0,
+        "chunks_per_s": round(stats["chunks"] / elapsed, 2) if elapsed else 0.0,
+        "peak_rss_mb": round(peak_rss_mb, 1),
+        "stage_seconds": {stage: round(seconds, 4) for stage, seconds in stats["stage_seconds"].items()},
+    }
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Ingestion throughput and memory benchmark with local fakes.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100], help="Corpus sizes (file counts) to benchmark.")
+    parser.add_argument("--files", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--pages", type=int, default=5, help="Sections (Markdown) or pages (PDF) per file.")
+    parser.add_argument("--pdf-ratio", type=float, default=0.5, help="Fraction of files generated as PDF.")
+    parser.add_argument("--extract-delay", type=float, default=0.0, help="Seconds per chunk for fake graph extraction.")
+    parser.add_argument("--embed-delay", type=float, default=0.0, help="Seconds per fake embedding batch.")
+    parser.add_argument("--db-delay", type=float, default=0.0, help="Seconds per fake database call.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    if args.files is not None:
+        # Child process: run one size and emit its result on stdout.
+        print(json.dumps(run_single(args)))
+        return
+
+    results = []
+    for size in args.sizes:
+        command = [sys.executable, "-m", "benchmarks.ingest_bench", "--files", str(size),
+                   "--pages", str(args.pages), "--pdf-ratio", str(args.pdf_ratio),
+                   "--extract-delay", str(args.extract_delay), "--embed-delay", str(args.embed_delay),
+                   "--db-delay", str(args.db_delay), "--seed", str(args.seed)]
+        completed = subprocess.run(command, capture_output=True, text=True, check=True, cwd=PROJECT_ROOT)
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    report = {"revision": _git_revision(), "results": results}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
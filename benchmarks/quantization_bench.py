@@ -0,0 +1,132 @@
+# benchmarks/quantization_bench.py
+"""
+Recall-vs-memory benchmark for the local vector index (agent/vector_index.py).
+
+Runs the same queries through exact float search and through the int8 and binary
+representations, and reports recall@k against the exact results, vector memory (total and
+per vector) and query latency as JSON.
+
+The corpus is synthetic clustered embeddings by default, so no credentials are needed. With
+--from-supabase the vectors of the real `documents` table are used instead, with perturbed
+copies of stored vectors as queries.
+
+Usage:
+    python -m benchmarks.quantization_bench --vectors 50000 --dim 768 --queries 200 --k 12
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+os.environ.setdefault("SUPABASE_URL", "http://supabase.bench.local")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "bench.bench.bench")
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+
+
+def synthetic_corpus(rng: np.random.Generator, vectors: int, dim: int, clusters: int) -> np.ndarray:
+    """Gaussian clusters around random centres: embeddings of a topical corpus are clumped, not uniform."""
+    centres = rng.normal(size=(clusters, dim)).astype(np.float32)
+    assignments = rng.integers(0, clusters, size=vectors)
+    return centres[assignments] + 0.6 * rng.normal(size=(vectors, dim)).astype(np.float32)
+
+
+def load_documents_table() -> np.ndarray:
+    from agent.vector_index import VectorIndex
+    from tools.clients import get_supabase
+    return VectorIndex.load(get_supabase(), "float", rescore_factor=1).to_float()
+
+
+def make_queries(rng: np.random.Generator, corpus: np.ndarray, queries: int) -> np.ndarray:
+    # Perturbed corpus vectors, like a user question phrased close to one chunk.
+    picks = corpus[rng.integers(0, len(corpus), size=queries)]
+    scale = np.linalg.norm(picks, axis=1, keepdims=True) / np.sqrt(corpus.shape[1])
+    return picks + 0.5 * scale * rng.normal(size=picks.shape).astype(np.float32)
+
+
+def build(corpus: np.ndarray, representation: str, rescore_factor: int):
+    from agent.vector_index import PAGE_SIZE, VectorIndex
+    index = VectorIndex(representation, rescore_factor)
+    for start in range(0, len(corpus), PAGE_SIZE):
+        page = corpus[start:start + PAGE_SIZE]
+        index.add(page, [{"id": start + i} for i in range(len(page))])
+    return index
+
+
+def run(index, queries: np.ndarray, k: int, exact: list[set[int]] | None) -> tuple[dict, list[set[int]]]:
+    latencies, results = [], []
+    for query in queries:
+        started = time.perf_counter()
+        indexes, _ = index.search_indexes(query, k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append(set(indexes.tolist()))
+    latencies.sort()
+    nbytes = index.nbytes
+    measurement = {
+        "representation": index.representation,
+        "rescore_factor": index.rescore_factor if index.representation == "binary" else None,
+        "recall_at_k": round(statistics.mean(len(r & e) / k for r, e in zip(results, exact)), 4) if exact else 1.0,
+        "index_mb": round(nbytes / (1024 * 1024), 3),
+        "bytes_per_vector": round(nbytes / len(index.rows), 1),
+        "p50_ms": round(latencies[len(latencies) // 2], 3),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+    }
+    return measurement, results
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recall vs memory of the quantized local vector index.")
+    parser.add_argument("--vectors", type=int, default=20000, help="Synthetic corpus size.")
+    parser.add_argument("--dim", type=int, default=768, help="Synthetic embedding dimension (embedding-001 is 768).")
+    parser.add_argument("--clusters", type=int, default=200, help="Topic clusters in the synthetic corpus.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=12, help="Results per query (RETRIEVAL_FETCH_K by default).")
+    parser.add_argument("--rescore-factors", type=int, nargs="+", default=[2, 5, 10, 20],
+                        help="Binary candidates rescored per result.")
+    parser.add_argument("--from-supabase", action="store_true", help="Use the documents table instead of synthetic vectors.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.from_supabase:
+        corpus = load_documents_table()
+    else:
+        corpus = synthetic_corpus(rng, args.vectors, args.dim, args.clusters)
+    queries = make_queries(rng, corpus, args.queries)
+
+    baseline, exact = run(build(corpus, "float", 1), queries, args.k, None)
+    results = [baseline]
+    results.append(run(build(corpus, "int8", 1), queries, args.k, exact)[0])
+    for factor in args.rescore_factors:
+        results.append(run(build(corpus, "binary", factor), queries, args.k, exact)[0])
+
+    report = {
+        "revision": _git_revision(),
+        "vectors": len(corpus),
+        "dim": corpus.shape[1],
+        "k": args.k,
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# benchmarks/replay.py
+"""
+Replays a /chat traffic capture (see api/capture.py) against a running server and compares
+latency distributions between runs.
+
+Requests are sent at their captured arrival offsets divided by --speed (0 sends them as fast
+as --concurrency allows). Turns of the same conversation are sent one after another, as they
+were captured, so they don't collide on the conversation lock. Every run uses fresh
+conversation ids (prefixed with the run id), so replays never touch real conversations or
+each other's history.
+
+Usage:
+    python -m benchmarks.replay run captures/chat_traffic.jsonl --url http://localhost:8000 \\
+        --api-key $API_SECRET_KEY --concurrency 20 --speed 2 --output before.json
+    python -m benchmarks.replay compare before.json after.json
+    python -m benchmarks.replay compare captures/chat_traffic.jsonl after.json
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import time
+import uuid
+from collections import Counter, defaultdict
+
+import httpx
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency_summary(latencies_ms: list[float]) -> dict:
+    summary = {f"p{pct}": round(percentile(latencies_ms, pct), 1) for pct in PERCENTILES}
+    summary["mean"] = round(statistics.mean(latencies_ms), 1) if latencies_ms else 0.0
+    summary["max"] = round(max(latencies_ms, default=0.0), 1)
+    return summary
+
+
+def load_capture(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return sorted(records, key=lambda record: record["ts"])
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def replay(records: list[dict], url: str, api_key: str, concurrency: int, speed: float, timeout: float) -> dict:
+    run_id = uuid.uuid4().hex[:8]
+    by_conversation: dict[str, list[tuple[int, dict]]] = defaultdict(list)
+    for i, record in enumerate(records):
+        by_conversation[record["conversation_id"]].append((i, record))
+
+    slots = asyncio.Semaphore(concurrency)
+    latencies: list[float] = [0.0] * len(records)
+    statuses: list[int | str] = [0] * len(records)
+    lag: list[float] = []
+    first_ts = records[0]["ts"] if records else 0.0
+
+    async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+        started = time.perf_counter()
+
+        async def send(i: int, record: dict) -> None:
+            if speed > 0:
+                due = (record["ts"] - first_ts) / speed
+                delay = due - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                lag.append(max(0.0, -delay))
+            async with slots:
+                payload = {"conversation_id": f"replay-{run_id}-{record['conversation_id']}", "query": record["query"]}
+                request_started = time.perf_counter()
+                try:
+                    response = await client.post(record.get("path", "/chat"), json=payload, headers={"x-api-key": api_key})
+                    statuses[i] = response.status_code
+                except httpx.HTTPError as e:
+                    statuses[i] = type(e).__name__
+                latencies[i] = (time.perf_counter() - request_started) * 1000
+
+        async def conversation(turns: list[tuple[int, dict]]) -> None:
+            for i, record in turns:
+                await send(i, record)
+
+        await asyncio.gather(*(conversation(turns) for turns in by_conversation.values()))
+        wall_time = time.perf_counter() - started
+
+    ok = [latency for latency, status in zip(latencies, statuses) if status == 200]
+    return {
+        "revision": _git_revision(),
+        "url": url,
+        "requests": len(records),
+        "conversations": len(by_conversation),
+        "concurrency": concurrency,
+        "speed": speed,
+        "wall_time_s": round(wall_time, 3),
+        "requests_per_s": round(len(records) / wall_time, 2) if wall_time else 0.0,
+        "status_counts": dict(Counter(str(status) for status in statuses)),
+        # The workload mix as captured, e.g. how many turns went through the agent vs the fast path.
+        "captured_routes": dict(Counter(record.get("route") or "unknown" for record in records)),
+        "latency_ms": latency_summary(ok),
+        # How far behind the captured schedule sends fell; large values mean the client, not the server, set the pace.
+        "schedule_lag_ms": latency_summary([seconds * 1000 for seconds in lag]),
+        "latencies_ms": [round(latency, 1) for latency in latencies],
+    }
+
+
+def summarize(path: str) -> tuple[str, dict]:
+    """Latency summary of a replay result or, for a .jsonl capture, of the captured production latencies."""
+    if path.endswith(".jsonl"):
+        records = load_capture(path)
+        latencies = [record["latency_ms"] for record in records if record.get("status") == 200]
+        return f"{path} (captured)", latency_summary(latencies)
+    with open(path, encoding="utf-8") as f:
+        result = json.load(f)
+    return f"{path} @ {result.get('revision') or 'unknown'}", result["latency_ms"]
+
+
+def compare(paths: list[str]) -> None:
+    """Prints the latency percentiles of each run side by side, with the change relative to the first."""
+    runs = [summarize(path) for path in paths]
+    keys = [f"p{pct}" for pct in PERCENTILES] + ["mean", "max"]
+    baseline = runs[0][1]
+    print(f"{'':<8}" + "".join(f"{name[-36:]:>40}" for name, _ in runs))
+    for key in keys:
+        cells = []
+        for i, (_, summary) in enumerate(runs):
+            value = summary.get(key, 0.0)
+            if i and baseline.get(key):
+                cells.append(f"{value:,.1f} ms ({(value - baseline[key]) / baseline[key]:+.1%})")
+            else:
+                cells.append(f"{value:,.1f} ms")
+        print(f"{key:<8}" + "".join(f"{cell:>40}" for cell in cells))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay captured /chat traffic and compare latency between runs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Replay a capture file against a server.")
+    run_parser.add_argument("capture", help="JSONL file written by TRAFFIC_CAPTURE_ENABLED.")
+    run_parser.add_argument("--url", default="http://localhost:8000")
+    run_parser.add_argument("--api-key", required=True)
+    run_parser.add_argument("--concurrency", type=int, default=20, help="Maximum requests in flight.")
+    run_parser.add_argument("--speed", type=float, default=1.0,
+                            help="Multiple of the captured arrival rate; 0 sends as fast as possible.")
+    run_parser.add_argument("--limit", type=int, help="Replay only the first N captured requests.")
+    run_parser.add_argument("--timeout", type=float, default=120.0, help="Per-request client timeout in seconds.")
+    run_parser.add_argument("--output", help="Optional path to write the results as JSON.")
+
+    compare_parser = commands.add_parser("compare", help="Compare latency percentiles of replay results or captures.")
+    compare_parser.add_argument("runs", nargs="+", help="Replay result JSON files and/or capture JSONL files; the first is the baseline.")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        compare(args.runs)
+        return
+
+    records = load_capture(args.capture)[:args.limit]
+    result = asyncio.run(replay(records, args.url, args.api_key, args.concurrency, args.speed, args.timeout))
+    print(json.dumps({key: value for key, value in result.items() if key != "latencies_ms"}, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,10 @@
 import os
 from dotenv import load_dotenv
 
+# Variables set in the real environment, before .env is merged in. They take precedence over
+# .env, which matters for settings re-read from .env at runtime (see agent/runtime_config.py).
+ENVIRONMENT_KEYS = frozenset(os.environ)
+
 # Load environment variables from a .env file at the project root
 load_dotenv()
 
@@ -20,13 +24,80 @@ class Settings:
     # --- Google Calendar ---
     GOOGLE_CALENDAR_ID: str = os.getenv("GOOGLE_CALENDAR_ID", "primary")
     SERVICE_ACCOUNT_FILE: str = "service_account.json"
+    # Background calendar sync for confirmed meetings
+    CALENDAR_SYNC_CONCURRENCY: int = int(os.getenv("CALENDAR_SYNC_CONCURRENCY", 2))
+    CALENDAR_SYNC_MAX_ATTEMPTS: int = int(os.getenv("CALENDAR_SYNC_MAX_ATTEMPTS", 5))
+    CALENDAR_SYNC_RETRY_BASE_DELAY: float = float(os.getenv("CALENDAR_SYNC_RETRY_BASE_DELAY", 2.0))
+
+    # --- Server ---
+    # "development" runs one auto-reloading process; "production" runs WEB_CONCURRENCY workers without reload
+    SERVER_MODE: str = os.getenv("SERVER_MODE", "development").lower()
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", 2))
+    # Connect Neo4j/Gemini/Supabase at startup; /ready reports 503 until this finishes
+    SERVER_WARMUP: bool = os.getenv("SERVER_WARMUP", "true").lower() == "true"
+    SERVER_WARMUP_RETRY_SECONDS: float = float(os.getenv("SERVER_WARMUP_RETRY_SECONDS", 5))
+    # Reload the persona, custom tools, intents and KNOWLEDGE_BASE_VERSION (from .env) when their files change
+    RUNTIME_CONFIG_WATCH: bool = os.getenv("RUNTIME_CONFIG_WATCH", "true").lower() == "true"
+    RUNTIME_CONFIG_POLL_SECONDS: float = float(os.getenv("RUNTIME_CONFIG_POLL_SECONDS", 5))
 
     # --- API and Security ---
     API_SECRET_KEY: str = os.getenv("API_SECRET_KEY", "DEFAULT_SECRET_KEY")
+    # Key for the /admin endpoints (reload, runtime config, full histories); defaults to API_SECRET_KEY.
+    # API_KEYS entries are never accepted there.
+    ADMIN_API_KEY: str = os.getenv("ADMIN_API_KEY", "")
     API_TITLE: str = "Zappies-AI Bot API"
     API_DESCRIPTION: str = "A dynamic, reusable AI agent API."
     API_VERSION: str = "1.0.0"
+    # Extra API keys with their own quotas, as JSON: {"<key>": {"name": "acme", "per_minute": 300, "burst": 50}}
+    API_KEYS: str = os.getenv("API_KEYS", "")
+    # Token-bucket rate limits, checked before any database or LLM work (0 per minute disables a limit)
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    # "memory" limits each worker separately; "supabase" shares the buckets across all workers
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+    RATE_LIMIT_MAX_BUCKETS: int = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", 100000))
+    # Default quota for an API key (API_SECRET_KEY, and API_KEYS entries that don't set their own)
+    RATE_LIMIT_KEY_PER_MINUTE: float = float(os.getenv("RATE_LIMIT_KEY_PER_MINUTE", 600))
+    RATE_LIMIT_KEY_BURST: float = float(os.getenv("RATE_LIMIT_KEY_BURST", 100))
+    # Quota for a single conversation
+    RATE_LIMIT_CONVERSATION_PER_MINUTE: float = float(os.getenv("RATE_LIMIT_CONVERSATION_PER_MINUTE", 12))
+    RATE_LIMIT_CONVERSATION_BURST: float = float(os.getenv("RATE_LIMIT_CONVERSATION_BURST", 5))
+    # Starting point for the adaptive limit on concurrent agent turns
     CONCURRENCY_LIMIT: int = int(os.getenv("CONCURRENCY_LIMIT", 5))
+    CONCURRENCY_MIN_LIMIT: int = int(os.getenv("CONCURRENCY_MIN_LIMIT", 1))
+    CONCURRENCY_MAX_LIMIT: int = int(os.getenv("CONCURRENCY_MAX_LIMIT", 50))
+    # Turns slower than this shrink the limit; faster ones grow it
+    CONCURRENCY_TARGET_LATENCY_SECONDS: float = float(os.getenv("CONCURRENCY_TARGET_LATENCY_SECONDS", 20))
+    CONCURRENCY_MAX_QUEUE: int = int(os.getenv("CONCURRENCY_MAX_QUEUE", 200))
+    CONCURRENCY_QUEUE_TIMEOUT_SECONDS: float = float(os.getenv("CONCURRENCY_QUEUE_TIMEOUT_SECONDS", 30))
+    CHAT_BATCH_MAX_ITEMS: int = int(os.getenv("CHAT_BATCH_MAX_ITEMS", 500))
+    # Deadline for one chat turn, including lock and queue waits (0 disables it). Tool calls,
+    # Calendar requests and the agent loop are all bounded by the time left on it.
+    CHAT_REQUEST_TIMEOUT_SECONDS: float = float(os.getenv("CHAT_REQUEST_TIMEOUT_SECONDS", 60))
+    CHAT_TIMEOUT_MESSAGE: str = os.getenv(
+        "CHAT_TIMEOUT_MESSAGE",
+        "I'm sorry, I'm taking too long to respond right now. Please send your message again in a moment."
+    )
+    # Default timeout for a single tool call, plus per-tool overrides as JSON, e.g. {"Knowledge_Graph_Search": 25}.
+    # An override of 0 (the default for tools marked with side effects) never cuts the tool off.
+    # TOOL_TIMEOUTS is re-read from .env on a runtime config reload
+    TOOL_TIMEOUT_SECONDS: float = float(os.getenv("TOOL_TIMEOUT_SECONDS", 20))
+    TOOL_TIMEOUTS: str = os.getenv("TOOL_TIMEOUTS", "")
+
+    # --- Metrics ---
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    # Adds a Server-Timing header with the per-stage breakdown to every response
+    METRICS_TIMING_HEADER: bool = os.getenv("METRICS_TIMING_HEADER", "false").lower() == "true"
+    # Record anonymized /chat requests, timings and tool sequences to JSONL for benchmarks/replay.py
+    TRAFFIC_CAPTURE_ENABLED: bool = os.getenv("TRAFFIC_CAPTURE_ENABLED", "false").lower() == "true"
+    TRAFFIC_CAPTURE_PATH: str = os.getenv("TRAFFIC_CAPTURE_PATH", "captures/chat_traffic.jsonl")
+    # Fraction of conversations captured; every turn of a sampled conversation is recorded
+    TRAFFIC_CAPTURE_SAMPLE_RATE: float = float(os.getenv("TRAFFIC_CAPTURE_SAMPLE_RATE", 1.0))
+    # Key for hashing conversation ids; set it to keep ids (and so sampling) consistent across restarts and workers
+    TRAFFIC_CAPTURE_SALT: str = os.getenv("TRAFFIC_CAPTURE_SALT", "")
+
+    # --- Shared Async Clients ---
+    HTTP_CLIENT_TIMEOUT: float = float(os.getenv("HTTP_CLIENT_TIMEOUT", 15.0))
+    HTTP_CLIENT_MAX_CONNECTIONS: int = int(os.getenv("HTTP_CLIENT_MAX_CONNECTIONS", 100))
 
     # --- LLM and Embeddings ---
     GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY")
@@ -34,15 +105,60 @@ class Settings:
     EMBEDDING_MODEL: str = "models/embedding-001"
     AGENT_TEMPERATURE: float = 0.1
     AGENT_MAX_ITERATIONS: int = 10
+    # Timeout for a single Gemini request
+    LLM_REQUEST_TIMEOUT_SECONDS: float = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", 30))
+
+    # --- Intent Router ---
+    # Answers small talk from templates and plain knowledge questions with one retrieval + one
+    # LLM call; everything else (and anything ambiguous) goes to the full ReAct agent
+    INTENT_ROUTER_ENABLED: bool = os.getenv("INTENT_ROUTER_ENABLED", "true").lower() == "true"
+    # Minimum cosine similarity to an exemplar in agent/intents.json, and lead over the next intent
+    INTENT_ROUTER_THRESHOLD: float = float(os.getenv("INTENT_ROUTER_THRESHOLD", 0.80))
+    INTENT_ROUTER_MARGIN: float = float(os.getenv("INTENT_ROUTER_MARGIN", 0.05))
+
+    # --- Token and Latency Budgets (0 disables a budget) ---
+    # Tokens (prompt + completion, all LLM calls) one /chat turn may consume before the agent stops
+    AGENT_TURN_TOKEN_BUDGET: int = int(os.getenv("AGENT_TURN_TOKEN_BUDGET", 40000))
+    # Wall-clock seconds one turn may run; checked between ReAct iterations
+    AGENT_TURN_TIME_BUDGET_SECONDS: float = float(os.getenv("AGENT_TURN_TIME_BUDGET_SECONDS", 45))
+    # Lifetime tokens per conversation; once spent, the agent is no longer invoked
+    CONVERSATION_TOKEN_BUDGET: int = int(os.getenv("CONVERSATION_TOKEN_BUDGET", 0))
+    AGENT_BUDGET_EXCEEDED_MESSAGE: str = os.getenv(
+        "AGENT_BUDGET_EXCEEDED_MESSAGE",
+        "I'm sorry, that's taking me longer than it should. Could you rephrase or narrow down your question so I can help you properly?"
+    )
+    CONVERSATION_BUDGET_EXCEEDED_MESSAGE: str = os.getenv(
+        "CONVERSATION_BUDGET_EXCEEDED_MESSAGE",
+        "Thanks for chatting with us! A member of our team will pick up this conversation from here."
+    )
 
     # --- Vector Database (Supabase) ---
     SUPABASE_URL: str = os.getenv("SUPABASE_URL")
     SUPABASE_SERVICE_KEY: str = os.getenv("SUPABASE_SERVICE_KEY")
+    # Direct Postgres connection string (Project Settings -> Database), used for shared locks
+    SUPABASE_DB_URL: str = os.getenv("SUPABASE_DB_URL")
+
+    # --- Per-Conversation Locking ---
+    # "memory" serializes turns within one process; "postgres" across all workers and instances
+    CONVERSATION_LOCK_BACKEND: str = os.getenv("CONVERSATION_LOCK_BACKEND", "memory").lower()
+    # Connections per worker for "postgres"; each running or slot-queued turn holds one (0 = CONCURRENCY_MAX_LIMIT)
+    CONVERSATION_LOCK_POOL_SIZE: int = int(os.getenv("CONVERSATION_LOCK_POOL_SIZE", 0))
+    CONVERSATION_LOCK_TIMEOUT_SECONDS: float = float(os.getenv("CONVERSATION_LOCK_TIMEOUT_SECONDS", 120))
 
     # --- Graph Database (Neo4j) ---
     NEO4J_URI: str = os.getenv("NEO4J_URI", "bolt://localhost:7687")
     NEO4J_USERNAME: str = os.getenv("NEO4J_USERNAME", "neo4j")
     NEO4J_PASSWORD: str = os.getenv("NEO4J_PASSWORD")
+    # Server-side transaction timeout for Cypher queries; a cancelled turn can't stop a running query otherwise
+    NEO4J_QUERY_TIMEOUT_SECONDS: float = float(os.getenv("NEO4J_QUERY_TIMEOUT_SECONDS", 15))
+    # Knowledge_Graph_Search runs its Cypher through the async driver instead of a worker thread
+    NEO4J_ASYNC_ENABLED: bool = os.getenv("NEO4J_ASYNC_ENABLED", "true").lower() == "true"
+    NEO4J_DATABASE: str | None = os.getenv("NEO4J_DATABASE") or None
+    NEO4J_ASYNC_POOL_SIZE: int = int(os.getenv("NEO4J_ASYNC_POOL_SIZE", 50))
+    # How long a query waits for a free pooled connection
+    NEO4J_ACQUISITION_TIMEOUT_SECONDS: float = float(os.getenv("NEO4J_ACQUISITION_TIMEOUT_SECONDS", 10))
+    # Read transactions go to read replicas/followers with a neo4j:// URI; turn off to run plain auto-commit queries
+    NEO4J_READ_ROUTING: bool = os.getenv("NEO4J_READ_ROUTING", "true").lower() == "true"
 
     # --- Data Ingestion ---
     SOURCE_DIRECTORY_PATH: str = "data/"
@@ -50,6 +166,74 @@ class Settings:
     DB_VECTOR_TABLE: str = "documents"
     DB_VECTOR_QUERY_NAME: str = "match_documents"
     DB_CONVERSATION_HISTORY_TABLE: str = "conversation_history"
+    # "structured" packs Markdown/PDF sections along their headings up to CHUNK_MAX_TOKENS (tiktoken);
+    # "recursive" is the original 2000-character splitter
+    CHUNK_STRATEGY: str = os.getenv("CHUNK_STRATEGY", "structured")
+    CHUNK_MAX_TOKENS: int = int(os.getenv("CHUNK_MAX_TOKENS", 1000))
+    # Near-duplicate chunks (MinHash/LSH, confirmed by shingle Jaccard) are embedded and extracted once
+    DEDUP_ENABLED: bool = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+    DEDUP_THRESHOLD: float = float(os.getenv("DEDUP_THRESHOLD", 0.85))
+    DEDUP_NUM_PERM: int = int(os.getenv("DEDUP_NUM_PERM", 64))
+    DEDUP_BANDS: int = int(os.getenv("DEDUP_BANDS", 16))
+    DEDUP_SHINGLE_SIZE: int = int(os.getenv("DEDUP_SHINGLE_SIZE", 5))
+    # Retrieval: candidates fetched, chunks kept after MMR, and the token budget for their text
+    RETRIEVAL_FETCH_K: int = int(os.getenv("RETRIEVAL_FETCH_K", 12))
+    RETRIEVAL_TOP_K: int = int(os.getenv("RETRIEVAL_TOP_K", 4))
+    RETRIEVAL_CONTEXT_TOKEN_BUDGET: int = int(os.getenv("RETRIEVAL_CONTEXT_TOKEN_BUDGET", 600))
+    # 1.0 ranks purely by relevance; lower values favour diverse chunks
+    RETRIEVAL_MMR_LAMBDA: float = float(os.getenv("RETRIEVAL_MMR_LAMBDA", 0.7))
+    # Serve vector search from an in-process index over the documents table instead of match_documents:
+    # "off", "float" (exact), "int8" (1 byte/dim) or "binary" (sign bits, candidates rescored with int8)
+    LOCAL_VECTOR_INDEX: str = os.getenv("LOCAL_VECTOR_INDEX", "off")
+    # Binary search rescores this many candidates per requested result
+    LOCAL_VECTOR_RESCORE_FACTOR: int = int(os.getenv("LOCAL_VECTOR_RESCORE_FACTOR", 10))
+    # Rows of Cypher results passed to the graph QA prompt
+    GRAPH_QA_TOP_K: int = int(os.getenv("GRAPH_QA_TOP_K", 10))
+    # Bump after re-ingesting so in-flight retrieval results from the old data aren't shared
+    # (picked up from .env without a restart; see RUNTIME_CONFIG_WATCH)
+    KNOWLEDGE_BASE_VERSION: str = os.getenv("KNOWLEDGE_BASE_VERSION", "1")
+
+    # --- Conversation State Cache ---
+    CONVERSATION_CACHE_MAX_ENTRIES: int = int(os.getenv("CONVERSATION_CACHE_MAX_ENTRIES", 10000))
+    CONVERSATION_CACHE_TTL_SECONDS: float = float(os.getenv("CONVERSATION_CACHE_TTL_SECONDS", 300))
+    # Number of most recent messages kept in the cache and passed to the agent as history
+    CONVERSATION_CACHE_HISTORY_WINDOW: int = int(os.getenv("CONVERSATION_CACHE_HISTORY_WINDOW", 50))
+    # Requires realtime to be enabled on the conversation_history table in Supabase
+    CONVERSATION_CACHE_REALTIME_INVALIDATION: bool = os.getenv("CONVERSATION_CACHE_REALTIME_INVALIDATION", "false").lower() == "true"
+
+    # --- Conversation Compaction ---
+    # Moves old messages of long or idle conversations into DB_CONVERSATION_ARCHIVE_TABLE,
+    # leaving the most recent messages and a running summary on the hot row
+    DB_CONVERSATION_ARCHIVE_TABLE: str = "conversation_archive"
+    COMPACTION_ENABLED: bool = os.getenv("COMPACTION_ENABLED", "false").lower() == "true"
+    COMPACTION_INTERVAL_SECONDS: float = float(os.getenv("COMPACTION_INTERVAL_SECONDS", 600))
+    # A conversation is compacted once it holds more messages than this, or has been idle this long
+    COMPACTION_MAX_MESSAGES: int = int(os.getenv("COMPACTION_MAX_MESSAGES", 200))
+    COMPACTION_INACTIVE_HOURS: float = float(os.getenv("COMPACTION_INACTIVE_HOURS", 24))
+    # Messages left on the hot row after compaction
+    COMPACTION_KEEP_MESSAGES: int = int(os.getenv("COMPACTION_KEEP_MESSAGES", 20))
+    COMPACTION_BATCH_SIZE: int = int(os.getenv("COMPACTION_BATCH_SIZE", 50))
+    # Summarize archived messages with the LLM so the agent keeps their gist
+    COMPACTION_SUMMARIZE: bool = os.getenv("COMPACTION_SUMMARIZE", "true").lower() == "true"
+
+    # --- Graph Fact Table ---
+    # Relationship types materialized into DB_GRAPH_FACTS_TABLE at ingestion and served by the Fact_Lookup tool
+    DB_GRAPH_FACTS_TABLE: str = "graph_facts"
+    FACT_LOOKUP_ENABLED: bool = os.getenv("FACT_LOOKUP_ENABLED", "true").lower() == "true"
+    FACT_TABLE_RELATIONSHIPS: list[str] = [
+        "HAS_FEE", "APPLIES_TO", "REQUIRES", "PROHIBITS", "INCLUDES", "HAS_CONDITION"
+    ]
+    # Minimum difflib similarity for a fuzzy entity-name match
+    FACT_MATCH_CUTOFF: float = float(os.getenv("FACT_MATCH_CUTOFF", 0.75))
+
+    # --- Entity Resolution ---
+    # After ingestion, merge nodes of the same label whose names are this similar (difflib ratio or embedding cosine).
+    # Off by default: merges can't be undone, so preview them with `python -m ingestion.entity_resolution --dry-run` first
+    ENTITY_RESOLUTION_ENABLED: bool = os.getenv("ENTITY_RESOLUTION_ENABLED", "false").lower() == "true"
+    ENTITY_RESOLUTION_STRING_THRESHOLD: float = float(os.getenv("ENTITY_RESOLUTION_STRING_THRESHOLD", 0.9))
+    ENTITY_RESOLUTION_EMBEDDING_THRESHOLD: float = float(os.getenv("ENTITY_RESOLUTION_EMBEDDING_THRESHOLD", 0.92))
+    # Clusters merged per transaction
+    ENTITY_RESOLUTION_BATCH_SIZE: int = int(os.getenv("ENTITY_RESOLUTION_BATCH_SIZE", 100))
 
     # --- Graph Generation (Optional Customization) ---
     GRAPH_ALLOWED_NODES: list[str] = [
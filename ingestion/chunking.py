@@ -0,0 +1,361 @@
+# ingestion/chunking.py
+"""
+Structure-aware chunking for ingestion.
+
+Documents are split into sections along their heading hierarchy (Markdown `#` headings, or
+headings recognised from PDF text layout), and consecutive sections are packed into chunks up
+to a token budget. Tables and fenced code blocks are kept whole where they fit. Every chunk
+carries its heading breadcrumb in `metadata["breadcrumb"]` and its size in
+`metadata["token_count"]`, and a chunk that continues a section starts with that breadcrumb so
+it still makes sense on its own.
+
+Run directly to size an ingestion run without calling any LLM:
+    python -m ingestion.chunking data/ --max-tokens 1000
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from dataclasses import dataclass, field
+
+from langchain_core.documents import Document
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import settings
+from utils.helpers import count_tokens, load_encoding
+
+_MD_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_MD_FENCE = re.compile(r"^\s*(```|~~~)")
+_PDF_NUMBERED_HEADING = re.compile(r"^(\d+(?:\.\d+)*)\.?\s+[A-Za-z]")
+_PDF_PAGE_NUMBER = re.compile(r"^(page\s+)?\d+(\s+of\s+\d+)?$", re.IGNORECASE)
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+# Words a Title Case heading may leave in lowercase.
+_MINOR_WORDS = frozenset("a an and as at by for from in of on or the to with".split())
+BREADCRUMB_SEPARATOR = " > "
+
+
+@dataclass
+class Section:
+    """The body of one heading: its breadcrumb path and the blocks (paragraphs, tables, code) under it."""
+    path: tuple[str, ...]
+    heading: str | None = None
+    blocks: list[str] = field(default_factory=list)
+    # For PDFs, the page each block starts on.
+    pages: list[int | None] = field(default_factory=list)
+
+
+def _markdown_blocks(lines: list[str]) -> list[str]:
+    """Groups lines into blocks separated by blank lines; a table or fenced code block is always one block."""
+    blocks, current, in_fence = [], [], False
+    for line in lines:
+        if _MD_FENCE.match(line):
+            in_fence = not in_fence
+        if not in_fence and not line.strip():
+            if current:
+                blocks.append("\n".join(current))
+                current = []
+            continue
+        # A table directly after a paragraph (no blank line between) still starts its own block.
+        if not in_fence and current and line.lstrip().startswith("|") != current[-1].lstrip().startswith("|"):
+            blocks.append("\n".join(current))
+            current = []
+        current.append(line.rstrip())
+    if current:
+        blocks.append("\n".join(current))
+    return blocks
+
+
+def markdown_sections(text: str) -> list[Section]:
+    """Splits Markdown into one section per heading, tracking the heading hierarchy."""
+    sections: list[Section] = []
+    stack: list[tuple[int, str]] = []
+    heading, body, in_fence = None, [], False
+
+    def close():
+        blocks = _markdown_blocks(body)
+        if blocks or heading:
+            sections.append(Section(tuple(title for _, title in stack), heading, blocks, [None] * len(blocks)))
+
+    for line in text.splitlines():
+        if _MD_FENCE.match(line):
+            in_fence = not in_fence
+        match = None if in_fence else _MD_HEADING.match(line)
+        if not match:
+            body.append(line)
+            continue
+        close()
+        level, title = len(match.group(1)), match.group(2).strip()
+        while stack and stack[-1][0] >= level:
+            stack.pop()
+        stack.append((level, title))
+        heading, body = line.strip(), []
+    close()
+    return sections
+
+
+def pdf_heading_level(line: str) -> int | None:
+    """
+    Guesses whether a line of extracted PDF text is a heading, since PDFs carry no markup:
+    numbered headings ("2.1 Party Bookings") take their depth from the numbering, ALL CAPS lines
+    are top-level and short Title Case lines are second-level. Returns None for body text.
+    """
+    line = line.strip()
+    if not line or len(line) > 80 or len(line.split()) > 12 or line[-1] in ".,;:!?":
+        return None
+    numbered = _PDF_NUMBERED_HEADING.match(line)
+    if numbered:
+        return min(numbered.group(1).count(".") + 1, 6)
+    letters = [c for c in line if c.isalpha()]
+    if len(letters) >= 3 and all(c.isupper() for c in letters):
+        return 1
+    words = [word for word in line.split() if word[0].isalpha()]
+    if len(words) >= 2 and all(word[0].isupper() or word.lower() in _MINOR_WORDS for word in words):
+        return 2
+    return None
+
+
+def pdf_sections(pages: list[Document]) -> list[Section]:
+    """
+    Rebuilds sections from PDF page text: wrapped lines are joined back into paragraphs
+    (undoing end-of-line hyphenation), bare page numbers are dropped and headings are found
+    with `pdf_heading_level`.
+    """
+    sections = [Section(())]
+    stack: list[tuple[int, str]] = []
+    paragraph: list[str] = []
+    paragraph_page = None
+
+    def flush():
+        nonlocal paragraph
+        if paragraph:
+            sections[-1].blocks.append(" ".join(paragraph))
+            sections[-1].pages.append(paragraph_page)
+            paragraph = []
+
+    # Paragraphs can run across a page break, so only a blank line or heading ends one.
+    for page in pages:
+        page_number = page.metadata.get("page")
+        for raw_line in page.page_content.splitlines():
+            line = raw_line.strip()
+            if not line:
+                flush()
+                continue
+            if _PDF_PAGE_NUMBER.match(line):
+                continue
+            level = pdf_heading_level(line)
+            if level is not None:
+                flush()
+                while stack and stack[-1][0] >= level:
+                    stack.pop()
+                stack.append((level, line))
+                sections.append(Section(tuple(title for _, title in stack), line))
+                continue
+            if not paragraph:
+                paragraph_page = page_number
+            if paragraph and paragraph[-1].endswith("-") and line[:1].islower():
+                paragraph[-1] = paragraph[-1][:-1] + line
+            else:
+                paragraph.append(line)
+    flush()
+    return [section for section in sections if section.blocks or section.heading]
+
+
+def _split_by_tokens(text: str, max_tokens: int) -> list[str]:
+    encoding = load_encoding()
+    tokens = encoding.encode(text)
+    return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+
+def split_block(block: str, max_tokens: int) -> list[str]:
+    """
+    Splits a block larger than `max_tokens`: tables by rows (repeating the header row), other
+    text by sentences, and anything still too large by raw token windows.
+    """
+    if count_tokens(block) <= max_tokens:
+        return [block]
+
+    lines = block.splitlines()
+    is_table = len(lines) > 2 and all(line.lstrip().startswith("|") for line in lines)
+    if is_table:
+        header, rows, joiner = lines[:2], lines[2:], "\n"
+        budget = max_tokens - count_tokens("\n".join(header))
+    else:
+        header, rows, joiner = [], _SENTENCE_BOUNDARY.split(block), " "
+        budget = max_tokens
+    if budget <= 0:
+        return _split_by_tokens(block, max_tokens)
+
+    pieces, current, current_tokens = [], [], 0
+    for row in rows:
+        row_tokens = count_tokens(row)
+        if row_tokens > budget:
+            if current:
+                pieces.append(current)
+                current, current_tokens = [], 0
+            pieces.extend([part] for part in _split_by_tokens(row, budget))
+            continue
+        if current and current_tokens + row_tokens > budget:
+            pieces.append(current)
+            current, current_tokens = [], 0
+        current.append(row)
+        current_tokens += row_tokens + 1
+    if current:
+        pieces.append(current)
+    return ["\n".join(header + piece) if is_table else joiner.join(piece) for piece in pieces]
+
+
+def _common_prefix(paths: list[tuple[str, ...]]) -> tuple[str, ...]:
+    prefix = paths[0]
+    for path in paths[1:]:
+        length = 0
+        while length < min(len(prefix), len(path)) and prefix[length] == path[length]:
+            length += 1
+        prefix = prefix[:length]
+    return prefix
+
+
+def pack_sections(sections: list[Section], max_tokens: int, metadata: dict) -> list[Document]:
+    """
+    Packs consecutive sections into chunks of at most about `max_tokens` tokens. A chunk never
+    spans two top-level sections, and a heading always stays with the text that follows it.
+    The breadcrumb of a chunk holding several sections is the part of their paths they share.
+    """
+    chunks: list[Document] = []
+    parts: list[str] = []
+    paths: list[tuple[str, ...]] = []
+    pages: list[int | None] = []
+    used = 0
+
+    def flush():
+        nonlocal parts, paths, pages, used
+        if parts:
+            content = "\n\n".join(parts)
+            chunk_metadata = {
+                **metadata,
+                "breadcrumb": BREADCRUMB_SEPARATOR.join(_common_prefix(paths)),
+                "token_count": count_tokens(content),
+            }
+            first_page = next((page for page in pages if page is not None), None)
+            if first_page is not None:
+                chunk_metadata["page"] = first_page
+            chunks.append(Document(page_content=content, metadata=chunk_metadata))
+        parts, paths, pages, used = [], [], [], 0
+
+    for section in sections:
+        if paths and paths[0][:1] != section.path[:1]:
+            flush()
+        crumb = BREADCRUMB_SEPARATOR.join(section.path)
+        # Room for the heading (or, in a continuation chunk, the breadcrumb) in front of each piece.
+        reserve = max(count_tokens(section.heading or ""), count_tokens(crumb)) + 2
+        pending_heading = section.heading
+        # A heading with no body still opens the chunk its subsections go into.
+        blocks = zip(section.blocks, section.pages) if section.blocks else [("", None)]
+
+        for block, page in blocks:
+            for piece in split_block(block, max(max_tokens - reserve, 1)) if block else [""]:
+                prefix = pending_heading
+                piece_tokens = count_tokens(piece) + (count_tokens(prefix) + 2 if prefix else 0)
+                if parts and used + piece_tokens > max_tokens:
+                    flush()
+                if not parts and not prefix and crumb:
+                    prefix = crumb
+                    piece_tokens += count_tokens(crumb) + 2
+                text = "\n\n".join(part for part in (prefix, piece) if part)
+                if text:
+                    parts.append(text)
+                    paths.append(section.path)
+                    pages.append(page)
+                    used += piece_tokens
+                pending_heading = None
+    flush()
+    return chunks
+
+
+class StructuredChunker:
+    """
+    Drop-in replacement for a LangChain text splitter's `split_documents`. Expects the raw
+    Markdown of a file as one document, or a PDF as one document per page.
+    """
+
+    def __init__(self, max_tokens: int):
+        self.max_tokens = max_tokens
+        # tiktoken downloads the encoding on first use; fail here, before any file is processed, if it can't.
+        load_encoding()
+
+    def split_documents(self, documents: list[Document]) -> list[Document]:
+        by_source: dict[str, list[Document]] = {}
+        for document in documents:
+            by_source.setdefault(document.metadata.get("source", ""), []).append(document)
+
+        chunks = []
+        for source, source_documents in by_source.items():
+            metadata = {"source": source} if source else {}
+            if source.endswith(".pdf"):
+                sections = pdf_sections(source_documents)
+            else:
+                sections = markdown_sections("\n\n".join(document.page_content for document in source_documents))
+            chunks.extend(pack_sections(sections, self.max_tokens, metadata))
+        return chunks
+
+
+def create_text_splitter(strategy: str | None = None, max_tokens: int | None = None):
+    """The splitter for `strategy` (default CHUNK_STRATEGY): "structured" or the legacy "recursive" character splitter."""
+    if (strategy or settings.CHUNK_STRATEGY) == "recursive":
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        return RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200)
+    return StructuredChunker(max_tokens or settings.CHUNK_MAX_TOKENS)
+
+
+def _percentile(sorted_values: list[int], percentile: float) -> int:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * percentile))]
+
+
+def token_report(chunks: list[Document], max_tokens: int | None = None) -> dict:
+    """Chunk count and token distribution, i.e. how many extraction/embedding calls a run costs and how large they are."""
+    counts = sorted(chunk.metadata.get("token_count") or count_tokens(chunk.page_content) for chunk in chunks)
+    if not counts:
+        return {"chunks": 0, "total_tokens": 0}
+    report = {
+        "chunks": len(counts),
+        "total_tokens": sum(counts),
+        "mean": round(sum(counts) / len(counts), 1),
+        "min": counts[0],
+        "p50": _percentile(counts, 0.5),
+        "p90": _percentile(counts, 0.9),
+        "max": counts[-1],
+    }
+    if max_tokens:
+        # Quarters of the budget; a well-packed corpus has most chunks in the top two.
+        edges = [max_tokens * quarter // 4 for quarter in range(1, 5)]
+        histogram = {f"<={edge}": 0 for edge in edges}
+        histogram[f">{max_tokens}"] = 0
+        for count in counts:
+            label = next((f"<={edge}" for edge in edges if count <= edge), f">{max_tokens}")
+            histogram[label] += 1
+        report["histogram"] = histogram
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk a knowledge base directory and report the token distribution.")
+    parser.add_argument("path", nargs="?", default="data")
+    parser.add_argument("--max-tokens", type=int, default=settings.CHUNK_MAX_TOKENS)
+    parser.add_argument("--strategy", choices=("structured", "recursive"), default=settings.CHUNK_STRATEGY)
+    args = parser.parse_args()
+
+    from ingestion.ingest import load_documents
+    splitter = create_text_splitter(args.strategy, args.max_tokens)
+
+    chunks = []
+    for root, _, files in os.walk(args.path):
+        for name in sorted(files):
+            if name.endswith((".md", ".pdf")):
+                documents = load_documents(os.path.join(root, name), raw_markdown=args.strategy == "structured")
+                chunks.extend(splitter.split_documents(documents))
+    print(json.dumps({"strategy": args.strategy, **token_report(chunks, args.max_tokens)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
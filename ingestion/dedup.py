@@ -0,0 +1,129 @@
+# ingestion/dedup.py
+"""
+Near-duplicate chunk detection for ingestion.
+
+Client documents often repeat the same policy text across several files. Chunks are compared
+by MinHash signatures over word shingles, candidate pairs are found with LSH banding, and each
+candidate is confirmed with the exact Jaccard similarity of its shingles. Only one canonical
+copy of each group is embedded and sent for graph extraction; the other copies' sources are
+recorded on it. Chunks already stored by earlier runs seed the index, so a chunk that repeats
+one of them is dropped as well.
+"""
+import random
+import re
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from langchain_core.documents import Document
+
+# A Mersenne prime larger than any 32-bit shingle hash, for the universal hash family.
+_PRIME = (1 << 61) - 1
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def shingles(text: str, size: int) -> set[int]:
+    """Hashed word n-grams of the lowercased text. Texts shorter than `size` words form one shingle."""
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))}
+    return {zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a: set[int], b: set[int]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """MinHash signatures with `num_perm` hash functions of the form (a*x + b) mod p."""
+
+    def __init__(self, num_perm: int, seed: int = 1):
+        rng = random.Random(seed)
+        self.permutations = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+    def signature(self, shingle_set: set[int]) -> tuple[int, ...]:
+        return tuple(min((a * x + b) % _PRIME for x in shingle_set) for a, b in self.permutations)
+
+
+class LSHIndex:
+    """
+    Banded LSH over MinHash signatures. Two signatures become candidates when all rows of at
+    least one band agree, which happens with high probability above roughly (1/bands)^(1/rows).
+    """
+
+    def __init__(self, num_perm: int, bands: int):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands}).")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets: dict[tuple, list[int]] = defaultdict(list)
+
+    def _keys(self, signature: tuple[int, ...]):
+        for band in range(self.bands):
+            yield (band, signature[band * self.rows:(band + 1) * self.rows])
+
+    def query(self, signature: tuple[int, ...]) -> set[int]:
+        return {item for key in self._keys(signature) for item in self._buckets.get(key, ())}
+
+    def insert(self, item: int, signature: tuple[int, ...]) -> None:
+        for key in self._keys(signature):
+            self._buckets[key].append(item)
+
+
+@dataclass
+class DedupResult:
+    canonical_chunks: list[Document]
+    duplicates: int = 0
+    # For each source file, the other files it shares at least one chunk with.
+    linked_files: dict[str, set[str]] = field(default_factory=dict)
+
+
+def link_duplicate_chunks(chunks: list[Document], threshold: float, num_perm: int, bands: int,
+                          shingle_size: int, stored_chunks: list[Document] = ()) -> DedupResult:
+    """
+    Keeps the first chunk of every near-duplicate group (Jaccard >= `threshold`) and drops the
+    rest. A kept chunk lists the other files its dropped copies came from in
+    `metadata["duplicate_sources"]`.
+
+    `stored_chunks` are chunks already in the vector table. They are matched against but never
+    returned: a chunk that repeats one of them is dropped and its file linked to the stored
+    chunk's file. Their stored metadata is left as it is.
+    """
+    hasher = MinHasher(num_perm)
+    index = LSHIndex(num_perm, bands)
+    result = DedupResult(canonical_chunks=[])
+    # Stored chunks first, then kept ones; an index below len(stored_chunks) is a stored chunk.
+    candidates: list[Document] = list(stored_chunks)
+    candidate_shingles: list[set[int]] = []
+    for chunk in candidates:
+        chunk_shingles = shingles(chunk.page_content, shingle_size)
+        index.insert(len(candidate_shingles), hasher.signature(chunk_shingles))
+        candidate_shingles.append(chunk_shingles)
+
+    for chunk in chunks:
+        chunk_shingles = shingles(chunk.page_content, shingle_size)
+        signature = hasher.signature(chunk_shingles)
+        match = next(
+            (i for i in sorted(index.query(signature)) if jaccard(chunk_shingles, candidate_shingles[i]) >= threshold),
+            None
+        )
+        if match is None:
+            index.insert(len(candidates), signature)
+            candidates.append(chunk)
+            candidate_shingles.append(chunk_shingles)
+            result.canonical_chunks.append(chunk)
+            continue
+
+        result.duplicates += 1
+        canonical = candidates[match]
+        source, canonical_source = chunk.metadata.get("source"), canonical.metadata.get("source")
+        if source and canonical_source and source != canonical_source:
+            if match >= len(stored_chunks):
+                sources = canonical.metadata.setdefault("duplicate_sources", [])
+                if source not in sources:
+                    sources.append(source)
+            result.linked_files.setdefault(source, set()).add(canonical_source)
+            result.linked_files.setdefault(canonical_source, set()).add(source)
+    return result
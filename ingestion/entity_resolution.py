@@ -0,0 +1,256 @@
+# ingestion/entity_resolution.py
+"""
+Post-ingestion entity resolution.
+
+`LLMGraphTransformer` names the same thing differently from chunk to chunk ("Play Park",
+"IPIC Play", "play area"), and every spelling becomes its own node. This pass finds likely
+duplicates within each node label, clusters them, and merges each cluster into one node with
+`apoc.refactor.mergeNodes`, which moves every relationship onto the surviving node. The merged
+names are kept on it as `aliases`. Names that differ in a number ("R250 per child" and "R260 per
+child", "Party Package 1" and "Party Package 2") are never merged, however similar they look.
+
+Run directly to resolve the current graph, or with --dry-run to only print the clusters:
+    python -m ingestion.entity_resolution --dry-run
+"""
+import argparse
+import difflib
+import os
+import re
+import sys
+from collections import defaultdict
+from dataclasses import dataclass, field
+from itertools import combinations
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import settings
+from utils.helpers import cosine
+
+# Tokens shared by more names than this carry no signal ("fee", "rule") and would make the
+# candidate blocks quadratic.
+MAX_BLOCK_SIZE = 200
+_STOPWORDS = frozenset("a an and for in of on or the to with".split())
+
+
+@dataclass
+class Entity:
+    node_id: str
+    name: str
+    label: str
+    degree: int = 0
+
+
+@dataclass
+class ResolutionReport:
+    nodes_before: int = 0
+    nodes_after: int = 0
+    relationships_before: int = 0
+    relationships_after: int = 0
+    # Each cluster as [surviving name, merged names...].
+    clusters: list[list[str]] = field(default_factory=list)
+
+    @property
+    def merged_nodes(self) -> int:
+        return sum(len(cluster) - 1 for cluster in self.clusters)
+
+    def summary(self) -> str:
+        return (f"{len(self.clusters)} cluster(s) merged: nodes {self.nodes_before} -> {self.nodes_after}, "
+                f"relationships {self.relationships_before} -> {self.relationships_after}")
+
+
+def _normalize(name: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", name.lower())).strip()
+
+
+def _numbers(name: str) -> tuple[str, ...]:
+    return tuple(re.findall(r"\d+", name))
+
+
+class _UnionFind:
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+
+    def find(self, item: int) -> int:
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, a: int, b: int) -> None:
+        self.parent[self.find(a)] = self.find(b)
+
+
+def fetch_entities(graph) -> list[Entity]:
+    rows = graph.query(
+        """
+        MATCH (n:__Entity__)
+        RETURN elementId(n) AS node_id,
+               n.id AS name,
+               [label IN labels(n) WHERE label <> '__Entity__'][0] AS label,
+               COUNT { (n)--() } AS degree
+        """
+    )
+    return [
+        Entity(row["node_id"], row["name"], row.get("label") or "", row.get("degree") or 0)
+        for row in rows
+        if row.get("node_id") and isinstance(row.get("name"), str)
+    ]
+
+
+def count_graph(graph) -> tuple[int, int]:
+    rows = graph.query(
+        """
+        MATCH (n:__Entity__)
+        OPTIONAL MATCH (n)-[r]->(:__Entity__)
+        RETURN count(DISTINCT n) AS nodes, count(r) AS relationships
+        """
+    )
+    row = rows[0] if rows else {}
+    return row.get("nodes") or 0, row.get("relationships") or 0
+
+
+def _candidate_pairs(names: list[str]) -> set[tuple[int, int]]:
+    """Pairs of names that share at least one informative token (blocking), instead of all n^2 pairs."""
+    blocks: dict[str, list[int]] = defaultdict(list)
+    for i, name in enumerate(names):
+        for token in set(name.split()):
+            if len(token) > 2 and token not in _STOPWORDS:
+                blocks[token].append(i)
+    pairs = set()
+    for members in blocks.values():
+        if len(members) <= MAX_BLOCK_SIZE:
+            pairs.update(combinations(members, 2))
+    return pairs
+
+
+def cluster_label(entities: list[Entity], embeddings, string_threshold: float,
+                  embedding_threshold: float) -> list[list[Entity]]:
+    """
+    Clusters the entities of one label. Two names are duplicates if they contain the same numbers
+    and either normalize to the same string, reach `string_threshold` in difflib similarity, or
+    reach `embedding_threshold` in the cosine similarity of their embeddings; duplicates of
+    duplicates join the same cluster. Returns only clusters with more than one entity.
+    """
+    names = [_normalize(entity.name) for entity in entities]
+    numbers = [_numbers(name) for name in names]
+    union_find = _UnionFind(len(entities))
+
+    by_name: dict[str, int] = {}
+    for i, name in enumerate(names):
+        if name in by_name:
+            union_find.union(i, by_name[name])
+        else:
+            by_name[name] = i
+
+    # A fee, package number or age is the whole point of the name, and difflib and embeddings both
+    # score "R250" and "R260" as near-identical, so only names with the same numbers are compared.
+    pairs = [
+        (a, b) for a, b in _candidate_pairs(names)
+        if numbers[a] == numbers[b] and union_find.find(a) != union_find.find(b)
+    ]
+    string_scores = {pair: difflib.SequenceMatcher(None, names[pair[0]], names[pair[1]]).ratio() for pair in pairs}
+    undecided = [pair for pair in pairs if string_scores[pair] < string_threshold]
+
+    vectors = {}
+    if embeddings is not None and undecided:
+        # Only names that still need a decision are embedded, in one batch.
+        indexes = sorted({i for pair in undecided for i in pair})
+        vectors = dict(zip(indexes, embeddings.embed_documents([names[i] for i in indexes])))
+
+    for a, b in pairs:
+        if string_scores[(a, b)] >= string_threshold or (
+            a in vectors and cosine(vectors[a], vectors[b]) >= embedding_threshold
+        ):
+            union_find.union(a, b)
+
+    clusters: dict[int, list[Entity]] = defaultdict(list)
+    for i, entity in enumerate(entities):
+        clusters[union_find.find(i)].append(entity)
+    return [cluster for cluster in clusters.values() if len(cluster) > 1]
+
+
+def _survivor_first(cluster: list[Entity]) -> list[Entity]:
+    # The best-connected node survives; ties go to the shorter, then alphabetically first, name.
+    return sorted(cluster, key=lambda entity: (-entity.degree, len(entity.name), entity.name))
+
+
+def merge_clusters(graph, clusters: list[list[Entity]], batch_size: int) -> None:
+    """
+    Merges each cluster into its first node, `batch_size` clusters per transaction. Relationships
+    of the merged nodes are moved onto the survivor, and ones that become identical are combined.
+    """
+    payload = [
+        {
+            "keep": cluster[0].node_id,
+            "merge": [entity.node_id for entity in cluster[1:]],
+            "aliases": [entity.name for entity in cluster[1:]],
+        }
+        for cluster in clusters
+    ]
+    for start in range(0, len(payload), batch_size):
+        graph.query(
+            """
+            UNWIND $clusters AS cluster
+            MATCH (keep) WHERE elementId(keep) = cluster.keep
+            SET keep.aliases = coalesce(keep.aliases, []) + cluster.aliases
+            WITH keep, cluster
+            MATCH (duplicate) WHERE elementId(duplicate) IN cluster.merge
+            WITH keep, collect(duplicate) AS duplicates
+            CALL apoc.refactor.mergeNodes([keep] + duplicates, {properties: 'discard', mergeRels: true})
+            YIELD node
+            RETURN count(node) AS merged
+            """,
+            params={"clusters": payload[start:start + batch_size]}
+        )
+
+
+def resolve_entities(graph, embeddings, string_threshold: float | None = None,
+                     embedding_threshold: float | None = None, batch_size: int | None = None,
+                     dry_run: bool = False) -> ResolutionReport:
+    """Finds and merges duplicate entities label by label and reports the node and relationship counts before and after."""
+    string_threshold = string_threshold or settings.ENTITY_RESOLUTION_STRING_THRESHOLD
+    embedding_threshold = embedding_threshold or settings.ENTITY_RESOLUTION_EMBEDDING_THRESHOLD
+    batch_size = batch_size or settings.ENTITY_RESOLUTION_BATCH_SIZE
+
+    report = ResolutionReport()
+    report.nodes_before, report.relationships_before = count_graph(graph)
+
+    by_label: dict[str, list[Entity]] = defaultdict(list)
+    for entity in fetch_entities(graph):
+        by_label[entity.label].append(entity)
+
+    clusters = []
+    for label in sorted(by_label):
+        for cluster in cluster_label(by_label[label], embeddings, string_threshold, embedding_threshold):
+            clusters.append(_survivor_first(cluster))
+    report.clusters = [[entity.name for entity in cluster] for cluster in clusters]
+
+    if clusters and not dry_run:
+        merge_clusters(graph, clusters, batch_size)
+        report.nodes_after, report.relationships_after = count_graph(graph)
+    else:
+        report.nodes_after, report.relationships_after = report.nodes_before, report.relationships_before
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge duplicate entities in the knowledge graph.")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the clusters that would be merged.")
+    args = parser.parse_args()
+
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    from langchain_neo4j import Neo4jGraph
+
+    graph = Neo4jGraph(url=settings.NEO4J_URI, username=settings.NEO4J_USERNAME, password=settings.NEO4J_PASSWORD)
+    embeddings = GoogleGenerativeAIEmbeddings(model=settings.EMBEDDING_MODEL)
+    report = resolve_entities(graph, embeddings, dry_run=args.dry_run)
+    for cluster in report.clusters:
+        print(f"  {cluster[0]} <- {', '.join(cluster[1:])}")
+    if args.dry_run:
+        print(f"Would merge {report.merged_nodes} node(s) in {len(report.clusters)} cluster(s).")
+    else:
+        print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
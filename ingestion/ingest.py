@@ -4,9 +4,10 @@ import os
 import re
 import hashlib
 import sys
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
-from langchain_community.document_loaders import PyPDFLoader, UnstructuredMarkdownLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_community.document_loaders import PyPDFLoader, TextLoader, UnstructuredMarkdownLoader
 from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from langchain_experimental.graph_transformers import LLMGraphTransformer
 from langchain_neo4j import Neo4jGraph
@@ -18,6 +19,9 @@ from langchain_core.documents import Document
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config.settings import settings
+from ingestion.chunking import create_text_splitter, token_report
+from ingestion.dedup import link_duplicate_chunks
+from ingestion.entity_resolution import resolve_entities
 
 # Load environment variables from the root .env file
 load_dotenv()
@@ -40,6 +44,57 @@ def get_processed_files_from_db(supabase: Client):
     except Exception:
         return {}
 
+def get_linked_files_from_db(supabase: Client) -> dict[str, list[str]]:
+    """Retrieves, per processed file, the other files it shares deduplicated chunks with."""
+    response = supabase.table(settings.DB_INGESTION_LOG_TABLE).select("file_path, linked_files").execute()
+    return {item['file_path']: item.get('linked_files') or [] for item in response.data}
+
+def get_stored_chunks(supabase: Client, page_size: int = 1000) -> list[Document]:
+    """Retrieves the text and metadata of every chunk already in the vector table, paged in id order."""
+    chunks, start = [], 0
+    while True:
+        page = supabase.table(settings.DB_VECTOR_TABLE).select(
+            "content, metadata"
+        ).order("id").range(start, start + page_size - 1).execute().data
+        chunks.extend(Document(page_content=row["content"] or "", metadata=row.get("metadata") or {}) for row in page)
+        if len(page) < page_size:
+            return chunks
+        start += page_size
+
+def check_schema(supabase: Client) -> None:
+    """
+    Fails fast if a database object an enabled feature writes to is missing (e.g. a database
+    created before the feature), rather than after the run has paid for extraction and embeddings.
+    """
+    required = []
+    if settings.DEDUP_ENABLED:
+        required.append(("DEDUP_ENABLED", settings.DB_INGESTION_LOG_TABLE, "linked_files"))
+    if settings.FACT_LOOKUP_ENABLED:
+        required.append(("FACT_LOOKUP_ENABLED", settings.DB_GRAPH_FACTS_TABLE, "entity"))
+    for flag, table, column in required:
+        try:
+            supabase.table(table).select(column).limit(1).execute()
+        except Exception as e:
+            raise RuntimeError(
+                f"{flag} needs the column {table}.{column}, which the database doesn't have ({e}). Run the "
+                f"'Upgrading an Existing Database' SQL from the readme, or set {flag}=false."
+            ) from e
+
+def add_linked_dependents(files_to_update: set, changed_files: set, linked_log: dict, current_files: dict, files_to_add: set) -> None:
+    """
+    Adds every unchanged file that shares deduplicated chunks with a changed file to `files_to_update`.
+
+    A canonical chunk is stored once, under the first file it was seen in, so deleting or updating
+    that file would lose the chunk for its other copies. Re-processing the whole linked group
+    together keeps every copy represented.
+    """
+    pending = list(changed_files)
+    while pending:
+        for other in linked_log.get(pending.pop(), []):
+            if other in current_files and other not in files_to_update and other not in files_to_add:
+                files_to_update.add(other)
+                pending.append(other)
+
 def normalize_text(text):
     """Removes extra whitespace from text."""
     return re.sub(r'\s+', ' ', text).strip()
@@ -56,27 +111,80 @@ def standardize_terms(text):
         text = re.sub(old, new, text, flags=re.IGNORECASE)
     return text
 
-def main():
+@contextmanager
+def timed_stage(stage_timings: dict, stage: str):
+    """Adds the wall time of the enclosed block to `stage_timings[stage]`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_timings[stage] = stage_timings.get(stage, 0.0) + time.perf_counter() - start
+
+def load_documents(file_path: str, raw_markdown: bool | None = None) -> list[Document]:
     """
-    Main ingestion pipeline to process and load data into the knowledge base.
+    Loads a PDF or Markdown file into LangChain documents. Markdown is loaded as raw text for the
+    structured chunker, which needs the headings and tables that the Unstructured loader strips.
     """
-    print("🚀 Starting knowledge base ingestion pipeline...")
+    if raw_markdown is None:
+        raw_markdown = settings.CHUNK_STRATEGY == "structured"
+    if file_path.endswith(".pdf"):
+        loader = PyPDFLoader(file_path)
+    elif file_path.endswith(".md"):
+        loader = TextLoader(file_path, encoding="utf-8") if raw_markdown else UnstructuredMarkdownLoader(file_path)
+    return loader.load()
 
-    # --- 1. Establish Connections ---
-    print("Step 1: Establishing database connections...")
-    graph = Neo4jGraph(
-        url=settings.NEO4J_URI,
-        username=settings.NEO4J_USERNAME,
-        password=settings.NEO4J_PASSWORD
+def materialize_fact_table(graph, supabase) -> int:
+    """
+    Rebuilds the graph_facts lookup table from the relationship types in FACT_TABLE_RELATIONSHIPS,
+    so the API can answer common fee/rule questions without generating Cypher.
+    """
+    rows = graph.query(
+        """
+        MATCH (s)-[r]->(t)
+        WHERE type(r) IN $relationships
+        RETURN s.id AS entity,
+               [label IN labels(s) WHERE label <> '__Entity__'][0] AS entity_label,
+               type(r) AS relationship,
+               t.id AS target,
+               [label IN labels(t) WHERE label <> '__Entity__'][0] AS target_label
+        """,
+        params={"relationships": settings.FACT_TABLE_RELATIONSHIPS}
     )
-    supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
-    graph_generation_llm = ChatGoogleGenerativeAI(model=settings.GENERATIVE_MODEL, temperature=0)
-    embeddings = GoogleGenerativeAIEmbeddings(model=settings.EMBEDDING_MODEL)
+    facts = [
+        {
+            "entity": row["entity"],
+            "entity_label": row.get("entity_label"),
+            "relationship": row["relationship"],
+            "target": row["target"],
+            "target_label": row.get("target_label"),
+        }
+        for row in rows
+        if row.get("entity") and row.get("target") and row.get("relationship")
+    ]
+    # Replaced in one transaction so the API never sees a half-written table.
+    supabase.rpc("replace_graph_facts", {"p_facts": facts}).execute()
+    return len(facts)
+
+def run_ingestion(graph, supabase, llm_transformer, embeddings, source_path: str | None = None) -> dict:
+    """
+    Runs the ingestion pipeline against the given clients and returns run statistics.
+
+    Clients are injected so the same pipeline can run against the real services (see `main`)
+    or against local fakes for benchmarking. The returned dict holds file and chunk counts and
+    the seconds spent in each stage: delete, load, split, normalize, dedup, extract, embed, write, resolve
+    and facts.
+    """
+    stats = {
+        "files_processed": 0, "files_deleted": 0, "chunks": 0, "duplicate_chunks": 0,
+        "graph_documents": 0, "merged_entities": 0, "facts": 0, "stage_seconds": {}
+    }
+    stage_timings = stats["stage_seconds"]
+    check_schema(supabase)
 
     # --- 2. Check for File Changes ---
     print("\nStep 2: Checking for new, updated, or deleted files...")
     processed_log = get_processed_files_from_db(supabase)
-    source_path = settings.SOURCE_DIRECTORY_PATH
+    source_path = source_path or settings.SOURCE_DIRECTORY_PATH
     current_files = {
         os.path.join(source_path, f): calculate_checksum(os.path.join(source_path, f))
         for f in os.listdir(source_path)
@@ -89,82 +197,162 @@ def main():
 
     if not files_to_add and not files_to_delete and not files_to_update:
         print("✅ Knowledge base is already up-to-date.")
-        return
+        return stats
+
+    if settings.DEDUP_ENABLED:
+        add_linked_dependents(
+            files_to_update, files_to_delete | files_to_update, get_linked_files_from_db(supabase), current_files, files_to_add
+        )
 
     # --- 3. Handle Deletions and Updates ---
     files_requiring_deletion = files_to_delete.union(files_to_update)
     if files_requiring_deletion:
         print(f"\nStep 3: Deleting outdated data for {len(files_requiring_deletion)} file(s)...")
-        for file_path in files_requiring_deletion:
-            # Delete from Neo4j
-            graph.query("MATCH (s:Source {uri: $source_path})-[*0..]-(n) DETACH DELETE s, n", params={"source_path": file_path})
-            # Delete from Supabase Vector Store
-            supabase.table(settings.DB_VECTOR_TABLE).delete().eq("metadata->>source", file_path).execute()
-            # Delete from Ingestion Log
-            supabase.table(settings.DB_INGESTION_LOG_TABLE).delete().eq("file_path", file_path).execute()
+        with timed_stage(stage_timings, "delete"):
+            for file_path in files_requiring_deletion:
+                # Delete from Neo4j
+                graph.query("MATCH (s:Source {uri: $source_path})-[*0..]-(n) DETACH DELETE s, n", params={"source_path": file_path})
+                # Delete from Supabase Vector Store
+                supabase.table(settings.DB_VECTOR_TABLE).delete().eq("metadata->>source", file_path).execute()
+                # Delete from Ingestion Log
+                supabase.table(settings.DB_INGESTION_LOG_TABLE).delete().eq("file_path", file_path).execute()
+        stats["files_deleted"] = len(files_to_delete)
         print("Deletion complete.")
 
     # --- 4. Process and Add New/Updated Files ---
     files_to_process = files_to_add.union(files_to_update)
     if files_to_process:
         print(f"\nStep 4: Processing {len(files_to_process)} new or updated file(s)...")
+        text_splitter = create_text_splitter()
         all_chunks = []
-        for file_path in files_to_process:
+        # Sorted so the same file wins as the canonical copy of a duplicated chunk on every run.
+        for file_path in sorted(files_to_process):
             print(f"  - Processing: {file_path}")
-            
-            if file_path.endswith(".pdf"):
-                loader = PyPDFLoader(file_path)
-            elif file_path.endswith(".md"):
-                loader = UnstructuredMarkdownLoader(file_path)
-            
-            documents = loader.load()
-
-            # Use RecursiveCharacterTextSplitter for chunking
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=2000,
-                chunk_overlap=200
-            )
-            chunks = text_splitter.split_documents(documents)
-
-            for chunk in chunks:
-                chunk.page_content = normalize_text(standardize_terms(chunk.page_content))
-                chunk.metadata["source"] = file_path
+
+            with timed_stage(stage_timings, "load"):
+                documents = load_documents(file_path)
+
+            with timed_stage(stage_timings, "split"):
+                chunks = text_splitter.split_documents(documents)
+
+            with timed_stage(stage_timings, "normalize"):
+                for chunk in chunks:
+                    chunk.page_content = normalize_text(standardize_terms(chunk.page_content))
+                    chunk.metadata["source"] = file_path
             all_chunks.extend(chunks)
 
-        print(f"Created {len(all_chunks)} document chunks from files.")
+        if settings.CHUNK_STRATEGY == "structured":
+            # Structured chunks carry their token counts; recursive ones would need the tokenizer just for this report.
+            stats["chunk_tokens"] = token_report(all_chunks, settings.CHUNK_MAX_TOKENS)
+            print(f"Created {len(all_chunks)} document chunks from files "
+                  f"({stats['chunk_tokens'].get('total_tokens', 0)} tokens, p50 {stats['chunk_tokens'].get('p50', 0)} per chunk).")
+        else:
+            print(f"Created {len(all_chunks)} document chunks from files.")
+
+        linked_files: dict[str, set[str]] = {}
+        if settings.DEDUP_ENABLED and all_chunks:
+            with timed_stage(stage_timings, "dedup"):
+                # Outdated chunks were deleted in step 3, so these all belong to unchanged files.
+                dedup = link_duplicate_chunks(
+                    all_chunks,
+                    threshold=settings.DEDUP_THRESHOLD,
+                    num_perm=settings.DEDUP_NUM_PERM,
+                    bands=settings.DEDUP_BANDS,
+                    shingle_size=settings.DEDUP_SHINGLE_SIZE,
+                    stored_chunks=get_stored_chunks(supabase)
+                )
+            all_chunks, linked_files = dedup.canonical_chunks, dedup.linked_files
+            stats["duplicate_chunks"] = dedup.duplicates
+            print(f"Skipping {dedup.duplicates} near-duplicate chunk(s); {len(all_chunks)} unique chunks remain.")
 
         # --- 5. Generate Graph and Vector Embeddings ---
         print("\nStep 5: Generating graph data and vector embeddings...")
-        llm_transformer = LLMGraphTransformer(
-            llm=graph_generation_llm,
-            allowed_nodes=settings.GRAPH_ALLOWED_NODES,
-            allowed_relationships=settings.GRAPH_ALLOWED_RELATIONSHIPS,
-            strict_mode=True
-        )
-
-        graph_documents = llm_transformer.convert_to_graph_documents(all_chunks)
+        with timed_stage(stage_timings, "extract"):
+            graph_documents = llm_transformer.convert_to_graph_documents(all_chunks)
         print(f"Generated {len(graph_documents)} graph documents.")
 
-        if graph_documents:
-            graph.add_graph_documents(graph_documents, baseEntityLabel=True, include_source=True)
-
-        if all_chunks:
-            SupabaseVectorStore.from_documents(
-                documents=all_chunks,
-                embedding=embeddings,
-                client=supabase,
-                table_name=settings.DB_VECTOR_TABLE,
-                query_name=settings.DB_VECTOR_QUERY_NAME
-            )
+        with timed_stage(stage_timings, "embed"):
+            vectors = embeddings.embed_documents([chunk.page_content for chunk in all_chunks]) if all_chunks else []
+
+        with timed_stage(stage_timings, "write"):
+            if graph_documents:
+                graph.add_graph_documents(graph_documents, baseEntityLabel=True, include_source=True)
+
+            if all_chunks:
+                vector_store = SupabaseVectorStore(
+                    client=supabase,
+                    embedding=embeddings,
+                    table_name=settings.DB_VECTOR_TABLE,
+                    query_name=settings.DB_VECTOR_QUERY_NAME
+                )
+                vector_store.add_vectors(vectors, all_chunks)
         print("Embeddings and graph data stored successfully.")
 
+        stats["files_processed"] = len(files_to_process)
+        stats["chunks"] = len(all_chunks)
+        stats["graph_documents"] = len(graph_documents)
+
     # --- 6. Update Ingestion Log ---
     print("\nStep 6: Updating database ingestion log...")
-    for file_path in files_to_process:
-        checksum = current_files[file_path]
-        supabase.table(settings.DB_INGESTION_LOG_TABLE).upsert({"file_path": file_path, "checksum": checksum}).execute()
+    with timed_stage(stage_timings, "write"):
+        for file_path in files_to_process:
+            checksum = current_files[file_path]
+            log_entry = {"file_path": file_path, "checksum": checksum}
+            if settings.DEDUP_ENABLED:
+                log_entry["linked_files"] = sorted(linked_files.get(file_path, ()))
+            supabase.table(settings.DB_INGESTION_LOG_TABLE).upsert(log_entry).execute()
+        # Unchanged files whose stored chunks a processed file repeats now share chunks with it.
+        if settings.DEDUP_ENABLED and files_to_process:
+            linked_log = get_linked_files_from_db(supabase)
+            for file_path in sorted(set(linked_files) - files_to_process):
+                if file_path in linked_log:
+                    supabase.table(settings.DB_INGESTION_LOG_TABLE).update({
+                        "linked_files": sorted(set(linked_log[file_path]) | linked_files[file_path])
+                    }).eq("file_path", file_path).execute()
+
+    # --- 7. Merge Duplicate Entities ---
+    if settings.ENTITY_RESOLUTION_ENABLED and files_to_process:
+        print("\nStep 7: Resolving duplicate graph entities...")
+        with timed_stage(stage_timings, "resolve"):
+            resolution = resolve_entities(graph, embeddings)
+        stats["merged_entities"] = resolution.merged_nodes
+        print(resolution.summary())
+
+    # --- 8. Rebuild the Graph Fact Table ---
+    if settings.FACT_LOOKUP_ENABLED:
+        print("\nStep 8: Rebuilding the graph fact lookup table...")
+        with timed_stage(stage_timings, "facts"):
+            stats["facts"] = materialize_fact_table(graph, supabase)
+        print(f"Stored {stats['facts']} facts.")
+
+    return stats
+
+def main():
+    """
+    Main ingestion pipeline to process and load data into the knowledge base.
+    """
+    print("🚀 Starting knowledge base ingestion pipeline...")
+
+    # --- 1. Establish Connections ---
+    print("Step 1: Establishing database connections...")
+    graph = Neo4jGraph(
+        url=settings.NEO4J_URI,
+        username=settings.NEO4J_USERNAME,
+        password=settings.NEO4J_PASSWORD
+    )
+    supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
+    graph_generation_llm = ChatGoogleGenerativeAI(model=settings.GENERATIVE_MODEL, temperature=0)
+    embeddings = GoogleGenerativeAIEmbeddings(model=settings.EMBEDDING_MODEL)
+    llm_transformer = LLMGraphTransformer(
+        llm=graph_generation_llm,
+        allowed_nodes=settings.GRAPH_ALLOWED_NODES,
+        allowed_relationships=settings.GRAPH_ALLOWED_RELATIONSHIPS,
+        strict_mode=True
+    )
 
-    print("\n✅ Ingestion pipeline completed successfully!")
+    stats = run_ingestion(graph, supabase, llm_transformer, embeddings)
+    if stats["files_processed"] or stats["files_deleted"]:
+        print("\n✅ Ingestion pipeline completed successfully!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
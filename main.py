@@ -1,8 +1,14 @@
 # /main.py
 
+import logging
 import uvicorn
 import os
 
+from config.settings import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
 if __name__ == "__main__":
     # Get the port from the environment variable, default to 8000
     # This is important for deployment services like Heroku
@@ -10,4 +16,21 @@ if __name__ == "__main__":
 
     # Run the Uvicorn server
     # It will look for the 'app' instance in the 'api.server' module
-    uvicorn.run("api.server:app", host="0.0.0.0", port=port, reload=True)
\ No newline at end of file
+    if settings.SERVER_MODE == "production":
+        if settings.WEB_CONCURRENCY > 1 and settings.CONVERSATION_LOCK_BACKEND == "memory":
+            logger.warning(
+                "Running several workers with CONVERSATION_LOCK_BACKEND=memory: turns of one "
+                "conversation are only serialized within each worker."
+            )
+        # Each worker imports the app (and warms its clients) itself; the parent only supervises.
+        uvicorn.run(
+            "api.server:app",
+            host="0.0.0.0",
+            port=port,
+            workers=settings.WEB_CONCURRENCY,
+            reload=False,
+            proxy_headers=True,
+            forwarded_allow_ips="*"
+        )
+    else:
+        uvicorn.run("api.server:app", host="0.0.0.0", port=port, reload=True)
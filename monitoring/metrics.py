@@ -0,0 +1,237 @@
+# monitoring/metrics.py
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Latency buckets in seconds, sized for everything from a cache hit to a slow LLM turn.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(label_names: tuple[str, ...], label_values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """A monotonically increasing counter with optional labels."""
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Gauge:
+    """A value that can go up and down, e.g. a current limit or queue length."""
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """A cumulative histogram with optional labels, rendered in Prometheus text format."""
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            total[0] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, counts):
+                    bucket_labels = _format_labels(self.label_names, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+                inf_labels = _format_labels(self.label_names, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{inf_labels} {counts[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total[0]}")
+                lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {counts[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric in the process and renders them for the /metrics endpoint."""
+
+    def __init__(self):
+        self._metrics: list[Counter | Gauge | Histogram] = []
+
+    def counter(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, documentation, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> Gauge:
+        metric = Gauge(name, documentation, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, label_names: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUEST_DURATION = registry.histogram(
+    "zappies_http_request_duration_seconds", "End-to-end HTTP request latency.", ("method", "path", "status")
+)
+STAGE_DURATION = registry.histogram(
+    "zappies_stage_duration_seconds", "Time spent in each stage of a chat turn.", ("stage",)
+)
+STAGE_ERRORS = registry.counter(
+    "zappies_stage_errors_total", "Number of failed stage executions.", ("stage",)
+)
+AGENT_ITERATIONS = registry.histogram(
+    "zappies_agent_iterations", "ReAct iterations (tool actions) per agent run.", (),
+    buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
+)
+
+LLM_TOKENS = registry.counter(
+    "zappies_llm_tokens_total", "Prompt and completion tokens consumed, by LLM stage.", ("stage", "kind")
+)
+TURN_TOKENS = registry.histogram(
+    "zappies_turn_tokens", "Total tokens consumed per chat turn.", (),
+    buckets=(500, 1000, 2500, 5000, 10000, 20000, 40000, 80000, 160000)
+)
+AGENT_BUDGET_STOPS = registry.counter(
+    "zappies_agent_budget_stops_total", "Agent runs stopped early, by the limit that was hit.", ("reason",)
+)
+TOOL_TIMEOUTS = registry.counter(
+    "zappies_tool_timeouts_total", "Tool calls abandoned because they exceeded their timeout or the request deadline.", ("tool",)
+)
+REQUEST_DEADLINE_EXCEEDED = registry.counter(
+    "zappies_request_deadline_exceeded_total", "Chat turns cancelled because they were still running after the request deadline."
+)
+CONCURRENCY_LIMIT = registry.gauge(
+    "zappies_agent_concurrency_limit", "Current adaptive limit on concurrently running agent turns."
+)
+CONCURRENCY_IN_FLIGHT = registry.gauge(
+    "zappies_agent_in_flight", "Agent turns currently running."
+)
+CONCURRENCY_QUEUED = registry.gauge(
+    "zappies_agent_queued", "Agent turns waiting for a slot."
+)
+RATE_LIMITED = registry.counter(
+    "zappies_rate_limited_total", "Requests rejected with 429, by the quota that was exhausted.", ("scope",)
+)
+CONCURRENCY_REJECTIONS = registry.counter(
+    "zappies_agent_rejections_total", "Agent turns rejected with 503, by reason.", ("reason",)
+)
+COALESCED_CALLS = registry.counter(
+    "zappies_coalesced_calls_total", "Calls that joined an identical in-flight call instead of running.", ("call",)
+)
+ROUTER_DECISIONS = registry.counter(
+    "zappies_router_decisions_total", "Intent router decisions, by intent and how it was decided.", ("intent", "method")
+)
+COMPACTED_MESSAGES = registry.counter(
+    "zappies_compacted_messages_total", "Messages moved from conversation_history into the archive table."
+)
+COMPACTION_RUNS = registry.counter(
+    "zappies_compaction_conversations_total", "Conversations processed by the compaction worker, by outcome.", ("outcome",)
+)
+
+# Per-request accumulator of stage timings. The dict is shared (not copied) with any task or
+# executor thread spawned during the request, so stages recorded there land on the same request.
+_request_timings: ContextVar[dict[str, float] | None] = ContextVar("request_timings", default=None)
+
+
+def start_request_timings() -> dict[str, float]:
+    """Starts collecting stage timings for the current request and returns the accumulator."""
+    timings: dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def current_request_timings() -> dict[str, float] | None:
+    """The stage timings collected so far for the current request, if any."""
+    return _request_timings.get()
+
+
+def record_stage(stage: str, seconds: float, failed: bool = False) -> None:
+    """Records a stage duration in the histograms and, if inside a request, in its summary."""
+    STAGE_DURATION.observe(seconds, stage=stage)
+    if failed:
+        STAGE_ERRORS.inc(stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Times the enclosed block as `stage`. Works around both sync code and awaits."""
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        record_stage(stage, time.perf_counter() - start, failed)
+
+
+def format_server_timing(timings: dict[str, float], total_seconds: float) -> str:
+    """Formats stage timings as a Server-Timing header value (durations in milliseconds)."""
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    entries.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(entries)
@@ -0,0 +1,75 @@
+# tests/test_capture.py
+import asyncio
+import json
+
+import pytest
+
+from api.capture import CaptureWriter, TrafficCaptureMiddleware, redact
+
+
+@pytest.mark.parametrize("text, redacted", [
+    ("Mail me at jane.doe+party@example.co.za", "Mail me at <email>"),
+    ("Call 082 555 1234 tomorrow", "Call <phone> tomorrow"),
+    ("See https://example.com/menu?x=1 or www.example.com", "See <url> or <url>"),
+    ("My booking ref is 123456", "My booking ref is <number>"),
+    ("Is it R250 for 12 kids?", "Is it R250 for 12 kids?"),
+])
+def test_redact(text, redacted):
+    assert redact(text) == redacted
+
+
+class MemoryWriter(CaptureWriter):
+    def __init__(self):
+        super().__init__("unused.jsonl", "test-salt")
+        self.records: list[dict] = []
+
+    async def write(self, record: dict) -> None:
+        self.records.append(record)
+
+
+async def chat_app(scope, receive, send):
+    await receive()
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+def post_chat(middleware: TrafficCaptureMiddleware, conversation_id: str, query: str) -> None:
+    body = json.dumps({"conversation_id": conversation_id, "query": query}).encode()
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        pass
+
+    asyncio.run(middleware({"type": "http", "method": "POST", "path": "/chat"}, receive, send))
+
+
+def test_sampling_keeps_or_drops_whole_conversations():
+    writer = MemoryWriter()
+    middleware = TrafficCaptureMiddleware(chat_app, writer, sample_rate=0.5)
+    conversation_ids = [f"conversation-{i}" for i in range(40)]
+    for turn in range(3):
+        for conversation_id in conversation_ids:
+            post_chat(middleware, conversation_id, f"turn {turn}")
+
+    turns: dict[str, int] = {}
+    for record in writer.records:
+        turns[record["conversation_id"]] = turns.get(record["conversation_id"], 0) + 1
+    assert set(turns.values()) == {3}
+    assert 0 < len(turns) < len(conversation_ids)
+
+
+def test_sample_rate_bounds_capture_everything_or_nothing():
+    writer = MemoryWriter()
+    post_chat(TrafficCaptureMiddleware(chat_app, writer, sample_rate=1.0), "c1", "Hi")
+    post_chat(TrafficCaptureMiddleware(chat_app, writer, sample_rate=0.0), "c2", "Hi")
+    assert [record["conversation_id"] for record in writer.records] == [writer.anonymize_id("c1")]
+    assert writer.records[0]["status"] == 200
+
+
+def test_is_sampled_is_monotonic_in_the_rate():
+    writer = MemoryWriter()
+    ids = [writer.anonymize_id(f"c{i}") for i in range(200)]
+    sampled_at = {rate: {i for i in ids if writer.is_sampled(i, rate)} for rate in (0.1, 0.5, 0.9)}
+    assert sampled_at[0.1] <= sampled_at[0.5] <= sampled_at[0.9]
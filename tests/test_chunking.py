@@ -0,0 +1,107 @@
+# tests/test_chunking.py
+import pytest
+
+from ingestion import chunking
+from ingestion.chunking import Section, markdown_sections, pack_sections, pdf_heading_level, split_block
+
+
+class WordEncoding:
+    """One token per whitespace-separated word, so budgets are easy to reason about and nothing is downloaded."""
+
+    def encode(self, text: str) -> list[str]:
+        return text.split()
+
+    def decode(self, tokens: list[str]) -> str:
+        return " ".join(tokens)
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    monkeypatch.setattr(chunking, "load_encoding", WordEncoding)
+    monkeypatch.setattr(chunking, "count_tokens", lambda text: len(text.split()))
+
+
+def test_split_block_keeps_a_block_within_budget_whole():
+    assert split_block("Parties start at ten.", 10) == ["Parties start at ten."]
+
+
+def test_split_block_splits_text_on_sentences():
+    block = "One two three. Four five six. Seven eight nine."
+    # Each sentence costs its tokens plus one for the joining space.
+    assert split_block(block, 7) == ["One two three. Four five six.", "Seven eight nine."]
+
+
+def test_split_block_repeats_the_table_header_in_every_piece():
+    header = ["| Item | Fee |", "| --- | --- |"]
+    rows = [f"| Package {i} | R{i}00 |" for i in range(1, 7)]
+    pieces = split_block("\n".join(header + rows), 20)
+
+    assert len(pieces) > 1
+    for piece in pieces:
+        assert piece.splitlines()[:2] == header
+        assert len(piece.split()) <= 20
+    assert [line for piece in pieces for line in piece.splitlines()[2:]] == rows
+
+
+def test_split_block_falls_back_to_token_windows_for_one_long_sentence():
+    block = " ".join(f"w{i}" for i in range(25))
+    pieces = split_block(block, 10)
+    assert [len(piece.split()) for piece in pieces] == [10, 10, 5]
+    assert " ".join(pieces) == block
+
+
+def test_markdown_sections_track_the_heading_hierarchy():
+    text = "# Parties\nIntro.\n## Fees\nR250 per child.\n# Rules\nNo shoes."
+    sections = markdown_sections(text)
+    assert [section.path for section in sections] == [("Parties",), ("Parties", "Fees"), ("Rules",)]
+    assert sections[1].blocks == ["R250 per child."]
+
+
+def test_markdown_sections_ignore_headings_inside_code_fences():
+    text = "# Setup\n```\n# not a heading\n```"
+    assert [section.path for section in markdown_sections(text)] == [("Setup",)]
+
+
+def test_pack_sections_never_spans_two_top_level_sections():
+    sections = [
+        Section(("Parties",), "# Parties", ["Bookings open daily."], [None]),
+        Section(("Rules",), "# Rules", ["Socks are required."], [None]),
+    ]
+    chunks = pack_sections(sections, 100, {"source": "rules.md"})
+    assert [chunk.metadata["breadcrumb"] for chunk in chunks] == ["Parties", "Rules"]
+    assert chunks[0].page_content == "# Parties\n\nBookings open daily."
+    assert chunks[1].metadata["source"] == "rules.md"
+
+
+def test_pack_sections_uses_the_shared_path_as_breadcrumb():
+    sections = [
+        Section(("Parties",), "# Parties", [], []),
+        Section(("Parties", "Fees"), "## Fees", ["R250 per child."], [None]),
+        Section(("Parties", "Food"), "## Food", ["Pizza is included."], [None]),
+    ]
+    chunks = pack_sections(sections, 100, {})
+    assert len(chunks) == 1
+    assert chunks[0].metadata["breadcrumb"] == "Parties"
+    assert chunks[0].page_content.startswith("# Parties\n\n## Fees\n\nR250 per child.")
+
+
+def test_pack_sections_respects_the_budget_and_repeats_the_breadcrumb():
+    body = [" ".join(f"w{i}{j}" for j in range(8)) + "." for i in range(6)]
+    sections = [Section(("Rules", "Safety"), "## Safety", body, [None] * len(body))]
+    chunks = pack_sections(sections, 20, {})
+
+    assert len(chunks) > 1
+    assert all(chunk.metadata["token_count"] <= 20 for chunk in chunks)
+    assert chunks[0].page_content.startswith("## Safety")
+    assert all(chunk.page_content.startswith("Rules > Safety") for chunk in chunks[1:])
+
+
+@pytest.mark.parametrize("line, level", [
+    ("2.1 Party Bookings", 2),
+    ("GENERAL RULES", 1),
+    ("Terms and Conditions", 2),
+    ("Children must wear socks at all times.", None),
+    ("Bring your own socks", None),
+])
+def test_pdf_heading_level(line, level):
+    assert pdf_heading_level(line) == level
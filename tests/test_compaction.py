@@ -0,0 +1,120 @@
+# tests/test_compaction.py
+import asyncio
+
+from api import compaction
+from api.compaction import ConversationCompactor
+from tools.conversation_archive import unpack_messages
+
+
+class Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    def __init__(self, result):
+        self.result = result
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    async def execute(self):
+        return Response(self.result())
+
+
+class FakeSupabase:
+    """One conversation_history row, with the archive RPCs applied the way the SQL in readme.md does."""
+
+    def __init__(self, history: list[dict]):
+        self.row = {"conversation_id": "convo-1", "history": history, "version": 3, "summary": None,
+                    "archived_count": 0}
+        self.segments: list[dict] = []
+
+    def table(self, name):
+        return FakeQuery(lambda: [dict(self.row)])
+
+    def rpc(self, name, params):
+        if name == "find_compaction_candidates":
+            return FakeQuery(lambda: [{"conversation_id": self.row["conversation_id"]}])
+        return FakeQuery(lambda: self._archive_conversation_segment(**params))
+
+    def _archive_conversation_segment(self, p_conversation_id, p_expected_version, p_payload, p_message_count,
+                                      p_summary):
+        if self.row["version"] != p_expected_version:
+            return None
+        self.row.update(
+            history=self.row["history"][p_message_count:],
+            summary=p_summary,
+            archived_count=self.row["archived_count"] + p_message_count,
+            version=self.row["version"] + 1
+        )
+        self.segments.append({"segment": len(self.segments) + 1, "message_count": p_message_count,
+                              "payload": p_payload})
+        return self.row["version"]
+
+
+def messages(count: int) -> list[dict]:
+    return [{"type": "human" if i % 2 == 0 else "ai", "data": {"content": f"message {i}"}} for i in range(count)]
+
+
+def make_compactor(monkeypatch, supabase: FakeSupabase, summarize: bool = False) -> ConversationCompactor:
+    async def fake_get_async_supabase():
+        return supabase
+
+    monkeypatch.setattr(compaction, "get_async_supabase", fake_get_async_supabase)
+    return ConversationCompactor(interval_seconds=60, max_messages=8, inactive_hours=24, keep_messages=4,
+                                 batch_size=10, summarize=summarize)
+
+
+def test_compaction_keeps_the_recent_window_and_archives_the_rest(monkeypatch):
+    history = messages(10)
+    supabase = FakeSupabase(list(history))
+    compactor = make_compactor(monkeypatch, supabase)
+
+    assert asyncio.run(compactor.compact_once()) == 1
+    assert supabase.row["history"] == history[-4:]
+    assert supabase.row["archived_count"] == 6
+    assert supabase.row["version"] == 4
+    assert [segment["message_count"] for segment in supabase.segments] == [6]
+    assert unpack_messages(supabase.segments[0]["payload"]) == history[:6]
+
+
+def test_repeated_passes_raise_the_archived_count(monkeypatch):
+    supabase = FakeSupabase(messages(10))
+    compactor = make_compactor(monkeypatch, supabase)
+    asyncio.run(compactor.compact_once())
+
+    supabase.row["history"] = supabase.row["history"] + messages(5)
+    assert asyncio.run(compactor.compact_once()) == 1
+    assert supabase.row["archived_count"] == 11
+    assert len(supabase.row["history"]) == 4
+    assert [segment["message_count"] for segment in supabase.segments] == [6, 5]
+
+
+def test_conversations_within_the_window_are_left_alone(monkeypatch):
+    history = messages(4)
+    supabase = FakeSupabase(list(history))
+    compactor = make_compactor(monkeypatch, supabase)
+
+    assert asyncio.run(compactor.compact_once()) == 0
+    assert supabase.row["history"] == history
+    assert supabase.row["archived_count"] == 0
+    assert supabase.segments == []
+
+
+def test_a_turn_that_lands_during_the_summary_makes_the_pass_skip_the_conversation(monkeypatch):
+    history = messages(10)
+    supabase = FakeSupabase(list(history))
+    compactor = make_compactor(monkeypatch, supabase, summarize=True)
+
+    async def summary_during_a_turn(summary, archived):
+        supabase.row["history"] = supabase.row["history"] + messages(2)
+        supabase.row["version"] += 1
+        return "The customer asked about pricing."
+
+    monkeypatch.setattr(compactor, "_summarize", summary_during_a_turn)
+    assert asyncio.run(compactor.compact_once()) == 0
+    assert len(supabase.row["history"]) == 12
+    assert supabase.row["archived_count"] == 0
+    assert supabase.row["summary"] is None
+    assert supabase.segments == []
@@ -0,0 +1,87 @@
+# tests/test_concurrency.py
+import asyncio
+
+import pytest
+
+from api.concurrency import AdaptiveConcurrencyLimiter, ConcurrencyLimitExceeded, is_overload_error
+
+
+def make_limiter(**overrides) -> AdaptiveConcurrencyLimiter:
+    options = dict(initial_limit=4, min_limit=1, max_limit=8, target_latency=10.0, max_queue=10, queue_timeout=1.0)
+    options.update(overrides)
+    return AdaptiveConcurrencyLimiter(**options)
+
+
+def test_slow_or_overloaded_turns_shrink_the_limit_once_per_window():
+    limiter = make_limiter()
+    limiter.in_flight = 3
+    limiter.release(latency=30.0)
+    assert limiter.limit == pytest.approx(3.2)
+    # Further slow turns in the same target-latency window are part of the same slow period.
+    limiter.release(latency=1.0, overloaded=True)
+    limiter.release(latency=30.0)
+    assert limiter.limit == pytest.approx(3.2)
+
+
+def test_the_limit_never_shrinks_below_the_minimum():
+    limiter = make_limiter(initial_limit=1, target_latency=0.0)
+    for _ in range(5):
+        limiter.in_flight = 1
+        limiter.release(latency=1.0, overloaded=True)
+    assert limiter.limit == 1
+
+
+def test_fast_turns_grow_the_limit_by_about_one_per_window_up_to_the_maximum():
+    limiter = make_limiter()
+    for _ in range(4):
+        limiter.in_flight = 1
+        limiter.release(latency=1.0)
+    assert 4.9 < limiter.limit < 5.0
+    for _ in range(100):
+        limiter.in_flight = 1
+        limiter.release(latency=1.0)
+    assert limiter.limit == 8
+
+
+def test_waiters_are_granted_round_robin_across_keys():
+    async def scenario() -> list[str]:
+        limiter = make_limiter(initial_limit=1, queue_timeout=5.0)
+        await limiter.acquire("busy")
+        order = []
+
+        async def turn(key: str):
+            await limiter.acquire(key)
+            order.append(key)
+            limiter.release()
+
+        tasks = [asyncio.create_task(turn(key)) for key in ("busy", "busy", "busy", "quiet")]
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["busy", "quiet", "busy", "busy"]
+
+
+def test_a_full_queue_or_a_queue_timeout_is_rejected():
+    async def scenario():
+        limiter = make_limiter(initial_limit=1, max_queue=1, queue_timeout=0.01)
+        await limiter.acquire("a")
+        waiting = asyncio.create_task(limiter.acquire("b"))
+        await asyncio.sleep(0)
+        with pytest.raises(ConcurrencyLimitExceeded) as full:
+            await limiter.acquire("c")
+        with pytest.raises(ConcurrencyLimitExceeded) as timed_out:
+            await waiting
+        return full.value.reason, timed_out.value.reason, limiter.queued, limiter.in_flight
+
+    assert asyncio.run(scenario()) == ("queue_full", "queue_timeout", 0, 1)
+
+
+def test_overload_errors_are_recognized():
+    class ResourceExhausted(Exception):
+        pass
+
+    assert is_overload_error(asyncio.TimeoutError())
+    assert is_overload_error(ResourceExhausted())
+    assert not is_overload_error(ValueError("bad input"))
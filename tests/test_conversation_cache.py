@@ -0,0 +1,55 @@
+# tests/test_conversation_cache.py
+from api.conversation_cache import ConversationStateCache
+
+
+def make_cache() -> ConversationStateCache:
+    return ConversationStateCache(max_entries=10, ttl_seconds=300, history_window=50)
+
+
+def test_invalidate_keeps_entry_for_an_older_or_equal_version():
+    cache = make_cache()
+    cache.put("c1", "active", [], version=3)
+    cache.invalidate("c1", version=3)
+    cache.invalidate("c1", version=2)
+    assert cache.get("c1") is not None
+
+
+def test_invalidate_drops_entry_for_a_newer_version():
+    cache = make_cache()
+    cache.put("c1", "active", [], version=3)
+    cache.invalidate("c1", version=4)
+    assert cache.get("c1") is None
+
+
+def test_invalidate_drops_entry_when_status_changes_without_a_version_bump():
+    cache = make_cache()
+    cache.put("c1", "active", [], version=3)
+    cache.invalidate("c1", version=3, status="handover")
+    assert cache.get("c1") is None
+
+
+def test_invalidate_drops_entry_when_token_usage_changes_without_a_version_bump():
+    cache = make_cache()
+    cache.put("c1", "active", [], version=3, total_tokens=100)
+    cache.invalidate("c1", version=3, status="active", total_tokens=100)
+    assert cache.get("c1") is not None
+    cache.invalidate("c1", version=3, status="active", total_tokens=250)
+    assert cache.get("c1") is None
+
+
+def test_invalidate_without_version_always_drops():
+    cache = make_cache()
+    cache.put("c1", "active", [], version=3)
+    cache.invalidate("c1")
+    assert cache.get("c1") is None
+
+
+def test_append_messages_drops_entry_after_a_foreign_write():
+    cache = make_cache()
+    cache.put("c1", "active", [{"type": "human"}], version=3)
+    cache.append_messages("c1", [{"type": "ai"}], version=5)
+    assert cache.get("c1") is None
+
+    cache.put("c1", "active", [{"type": "human"}], version=3)
+    cache.append_messages("c1", [{"type": "ai"}], version=4)
+    assert [message["type"] for message in cache.get("c1").messages] == ["human", "ai"]
@@ -0,0 +1,38 @@
+# tests/test_deadline.py
+import pytest
+
+from tools.deadline import DeadlineExceeded, bounded_timeout, deadline_scope, parse_tool_timeouts, runs_to_completion, tool_timeout
+
+
+def test_side_effect_tools_run_to_completion_by_default():
+    overrides = parse_tool_timeouts("", side_effect_tools=["book_zappies_onboarding_call", "request_human_handover"])
+    assert runs_to_completion("book_zappies_onboarding_call", overrides)
+    assert runs_to_completion("request_human_handover", overrides)
+    assert not runs_to_completion("Knowledge_Graph_Search", overrides)
+
+
+def test_tool_timeouts_can_bound_or_exempt_a_tool():
+    overrides = parse_tool_timeouts(
+        '{"request_human_handover": 30, "send_invoice": 0, "notify_team": null}',
+        side_effect_tools=["request_human_handover", "cancel_appointment"]
+    )
+    assert not runs_to_completion("request_human_handover", overrides)
+    assert tool_timeout("request_human_handover", overrides) == 30
+    assert runs_to_completion("send_invoice", overrides)
+    assert runs_to_completion("notify_team", overrides)
+    assert runs_to_completion("cancel_appointment", overrides)
+
+
+def test_tools_without_an_override_use_the_default_timeout(monkeypatch):
+    monkeypatch.setattr("tools.deadline.settings.TOOL_TIMEOUT_SECONDS", 20)
+    assert tool_timeout("check_availability", parse_tool_timeouts('{"Knowledge_Graph_Search": 25}')) == 20
+
+
+def test_bounded_timeout_is_capped_by_the_deadline():
+    assert bounded_timeout(5) == 5
+    with deadline_scope(2):
+        assert bounded_timeout(5) <= 2
+        assert bounded_timeout(None) <= 2
+    with deadline_scope(-1):
+        with pytest.raises(DeadlineExceeded):
+            bounded_timeout(5)
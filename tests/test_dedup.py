@@ -0,0 +1,65 @@
+# tests/test_dedup.py
+from langchain_core.documents import Document
+
+from ingestion.dedup import jaccard, link_duplicate_chunks, shingles
+
+POLICY = (
+    "Children under the age of twelve must be accompanied by an adult at all times while using "
+    "the play park. Grip socks are compulsory for every child and can be bought at reception."
+)
+
+
+def dedup(chunks: list[Document]):
+    return link_duplicate_chunks(chunks, threshold=0.85, num_perm=64, bands=16, shingle_size=5)
+
+
+def test_jaccard_of_identical_and_disjoint_texts():
+    assert jaccard(shingles(POLICY, 5), shingles(POLICY, 5)) == 1.0
+    assert jaccard(shingles(POLICY, 5), shingles("completely different words about party food menus today", 5)) == 0.0
+
+
+def test_near_duplicates_across_files_are_kept_once_and_linked():
+    chunks = [
+        Document(page_content=POLICY, metadata={"source": "data/rules.md"}),
+        Document(page_content=POLICY.replace("reception.", "reception!"), metadata={"source": "data/faq.md"}),
+        Document(page_content="Party packages include pizza, juice and two hours of play.", metadata={"source": "data/faq.md"}),
+    ]
+    result = dedup(chunks)
+
+    assert result.duplicates == 1
+    assert [chunk.metadata["source"] for chunk in result.canonical_chunks] == ["data/rules.md", "data/faq.md"]
+    assert result.canonical_chunks[0].metadata["duplicate_sources"] == ["data/faq.md"]
+    assert result.linked_files == {"data/rules.md": {"data/faq.md"}, "data/faq.md": {"data/rules.md"}}
+
+
+def test_duplicates_within_one_file_are_dropped_without_links():
+    chunks = [Document(page_content=POLICY, metadata={"source": "data/rules.md"}) for _ in range(3)]
+    result = dedup(chunks)
+    assert result.duplicates == 2
+    assert len(result.canonical_chunks) == 1
+    assert result.linked_files == {}
+    assert "duplicate_sources" not in result.canonical_chunks[0].metadata
+
+
+def test_a_lightly_extended_copy_is_dropped_and_distinct_text_kept():
+    chunks = [
+        Document(page_content=POLICY, metadata={"source": "a.md"}),
+        Document(page_content=f"{POLICY} This applies on weekends too.", metadata={"source": "a.md"}),
+        Document(page_content="Opening hours are nine to five on weekdays.", metadata={"source": "b.md"}),
+    ]
+    kept = [chunk.page_content for chunk in dedup(chunks).canonical_chunks]
+    assert kept == [POLICY, "Opening hours are nine to five on weekdays."]
+
+
+def test_chunks_repeating_a_stored_chunk_are_dropped_and_linked_to_its_file():
+    stored = [Document(page_content=POLICY, metadata={"source": "data/rules.md"})]
+    chunks = [
+        Document(page_content=POLICY.replace("reception.", "reception!"), metadata={"source": "data/faq.md"}),
+        Document(page_content="Party packages include pizza, juice and two hours of play.", metadata={"source": "data/faq.md"}),
+    ]
+    result = link_duplicate_chunks(chunks, threshold=0.85, num_perm=64, bands=16, shingle_size=5, stored_chunks=stored)
+
+    assert result.duplicates == 1
+    assert [chunk.page_content for chunk in result.canonical_chunks] == [chunks[1].page_content]
+    assert result.linked_files == {"data/rules.md": {"data/faq.md"}, "data/faq.md": {"data/rules.md"}}
+    assert stored[0].metadata == {"source": "data/rules.md"}
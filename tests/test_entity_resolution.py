@@ -0,0 +1,48 @@
+# tests/test_entity_resolution.py
+from ingestion.entity_resolution import Entity, cluster_label
+
+
+class SameVectorEmbeddings:
+    """Embeds every name identically, so any pair that reaches the embedding check is a match."""
+
+    def __init__(self):
+        self.embedded: list[str] = []
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.embedded.extend(texts)
+        return [[1.0, 0.0] for _ in texts]
+
+
+def entities(*names: str) -> list[Entity]:
+    return [Entity(f"n{i}", name, "Fee") for i, name in enumerate(names)]
+
+
+def clustered_names(clusters: list[list[Entity]]) -> list[list[str]]:
+    return sorted(sorted(entity.name for entity in cluster) for cluster in clusters)
+
+
+def test_near_identical_names_are_clustered():
+    clusters = cluster_label(entities("IPIC Play", "IPIC Plays", "Birthday Party"), None, 0.9, 0.92)
+    assert clustered_names(clusters) == [["IPIC Play", "IPIC Plays"]]
+
+
+def test_names_normalizing_to_the_same_string_are_clustered():
+    clusters = cluster_label(entities("Play-Park", "play park"), None, 0.99, 0.99)
+    assert clustered_names(clusters) == [["Play-Park", "play park"]]
+
+
+def test_names_that_differ_in_a_number_are_never_clustered_by_string_similarity():
+    names = entities("R250 per child", "R260 per child", "Party Package 1", "Party Package 2")
+    assert cluster_label(names, None, 0.5, 0.92) == []
+
+
+def test_names_that_differ_in_a_number_are_never_clustered_by_embeddings():
+    embeddings = SameVectorEmbeddings()
+    names = entities("R250 per child", "R260 per child", "Party Package 1", "Party Package 2")
+    assert cluster_label(names, embeddings, 0.99, 0.5) == []
+    assert embeddings.embedded == []
+
+
+def test_names_with_the_same_numbers_can_still_be_clustered():
+    clusters = cluster_label(entities("Party Package 1", "Party Packages 1", "Party Package 2"), None, 0.9, 0.92)
+    assert clustered_names(clusters) == [["Party Package 1", "Party Packages 1"]]
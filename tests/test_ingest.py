@@ -0,0 +1,77 @@
+# tests/test_ingest.py
+from config.settings import settings
+from ingestion.ingest import add_linked_dependents, run_ingestion
+
+CURRENT_FILES = {"data/a.md": "1", "data/b.md": "2", "data/c.md": "3", "data/d.md": "4"}
+
+
+def test_unchanged_files_linked_to_a_changed_file_are_reprocessed():
+    files_to_update = {"data/a.md"}
+    linked = {"data/a.md": ["data/b.md"], "data/b.md": ["data/a.md"]}
+    add_linked_dependents(files_to_update, {"data/a.md"}, linked, CURRENT_FILES, set())
+    assert files_to_update == {"data/a.md", "data/b.md"}
+
+
+def test_links_are_followed_transitively():
+    files_to_update = set()
+    linked = {"data/x.md": ["data/a.md"], "data/a.md": ["data/b.md"], "data/b.md": ["data/c.md"]}
+    add_linked_dependents(files_to_update, {"data/x.md"}, linked, CURRENT_FILES, set())
+    assert files_to_update == {"data/a.md", "data/b.md", "data/c.md"}
+
+
+def test_deleted_and_newly_added_files_are_not_marked_for_update():
+    files_to_update = set()
+    linked = {"data/gone.md": ["data/a.md", "data/b.md", "data/removed.md"]}
+    add_linked_dependents(files_to_update, {"data/gone.md"}, linked, CURRENT_FILES, files_to_add={"data/b.md"})
+    assert files_to_update == {"data/a.md"}
+
+
+class Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    def __init__(self, data):
+        self.data = data
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        return Response(self.data)
+
+
+class FakeSupabase:
+    """Knows one previously ingested file that has since been deleted, and records RPC calls."""
+
+    def __init__(self):
+        self.rpcs: list[str] = []
+
+    def table(self, name):
+        return FakeQuery([{"file_path": "data/gone.md", "checksum": "old", "linked_files": []}])
+
+    def rpc(self, name, params):
+        self.rpcs.append(name)
+        return FakeQuery(None)
+
+
+class FakeGraph:
+    def query(self, cypher, params=None):
+        return [{"entity": "Party", "relationship": "HAS_FEE", "target": "R250"}]
+
+
+def run_with_fact_lookup(monkeypatch, tmp_path, enabled: bool) -> FakeSupabase:
+    monkeypatch.setattr(settings, "FACT_LOOKUP_ENABLED", enabled)
+    monkeypatch.setattr(settings, "ENTITY_RESOLUTION_ENABLED", False)
+    supabase = FakeSupabase()
+    run_ingestion(FakeGraph(), supabase, llm_transformer=None, embeddings=None, source_path=str(tmp_path))
+    return supabase
+
+
+def test_fact_table_is_not_rebuilt_when_fact_lookup_is_off(monkeypatch, tmp_path):
+    assert run_with_fact_lookup(monkeypatch, tmp_path, enabled=False).rpcs == []
+
+
+def test_fact_table_is_rebuilt_when_fact_lookup_is_on(monkeypatch, tmp_path):
+    assert run_with_fact_lookup(monkeypatch, tmp_path, enabled=True).rpcs == ["replace_graph_facts"]
@@ -0,0 +1,145 @@
+# tests/test_locks.py
+import asyncio
+
+import pytest
+
+from api.locks import ConversationLockTimeout, InProcessLockBackend, PostgresAdvisoryLockBackend
+
+
+class FakeConnection:
+    def __init__(self, locks: set[str]):
+        self.locks = locks
+        self.statements: list[str] = []
+
+    async def execute(self, statement: str, key: str, timeout: float | None = None) -> None:
+        self.statements.append(statement.split("(")[0].split()[-1])
+        if "pg_advisory_lock" in statement:
+            async def wait_for_lock():
+                while key in self.locks:
+                    await asyncio.sleep(0.001)
+            await asyncio.wait_for(wait_for_lock(), timeout)
+            self.locks.add(key)
+        else:
+            self.locks.discard(key)
+
+
+class FakePool:
+    """An asyncpg-like pool of `size` connections sharing one set of advisory locks."""
+
+    def __init__(self, size: int, locks: set[str] | None = None):
+        self.locks = locks if locks is not None else set()
+        self.free = [FakeConnection(self.locks) for _ in range(size)]
+        self.released: list[FakeConnection] = []
+
+    async def acquire(self, timeout: float | None = None) -> FakeConnection:
+        async def wait_for_connection():
+            while not self.free:
+                await asyncio.sleep(0.001)
+            return self.free.pop()
+        return await asyncio.wait_for(wait_for_connection(), timeout)
+
+    async def release(self, connection: FakeConnection) -> None:
+        self.released.append(connection)
+        self.free.append(connection)
+
+
+def postgres_backend(pool: FakePool, acquire_timeout: float = 1.0) -> PostgresAdvisoryLockBackend:
+    backend = PostgresAdvisoryLockBackend("postgresql://unused", pool_size=len(pool.free), acquire_timeout=acquire_timeout)
+    backend._pool = pool
+    return backend
+
+
+def test_in_process_lock_serializes_a_conversation_and_forgets_it_afterwards():
+    async def scenario():
+        locks = InProcessLockBackend()
+        events = []
+
+        async def turn(name: str):
+            async with locks.hold("c1"):
+                events.append(f"{name} start")
+                await asyncio.sleep(0.001)
+                events.append(f"{name} end")
+
+        await asyncio.gather(turn("first"), turn("second"))
+        return events, len(locks)
+
+    events, remaining_entries = asyncio.run(scenario())
+    assert events == ["first start", "first end", "second start", "second end"]
+    assert remaining_entries == 0
+
+
+def test_in_process_lock_is_released_on_error_and_cancellation():
+    async def scenario():
+        locks = InProcessLockBackend()
+        with pytest.raises(RuntimeError):
+            async with locks.hold("c1"):
+                raise RuntimeError("agent failed")
+
+        async def hang():
+            async with locks.hold("c1"):
+                await asyncio.sleep(10)
+
+        task = asyncio.create_task(hang())
+        await asyncio.sleep(0.001)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        async with locks.hold("c1"):
+            pass
+        return len(locks)
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_advisory_lock_is_released_on_error():
+    pool = FakePool(size=1)
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            async with postgres_backend(pool).hold("c1"):
+                raise RuntimeError("agent failed")
+
+    asyncio.run(scenario())
+    assert pool.locks == set()
+    assert pool.released[0].statements == ["pg_advisory_lock", "pg_advisory_unlock"]
+
+
+def test_advisory_lock_is_released_on_cancellation():
+    pool = FakePool(size=1)
+
+    async def scenario():
+        async def hang():
+            async with postgres_backend(pool).hold("c1"):
+                await asyncio.sleep(10)
+
+        task = asyncio.create_task(hang())
+        await asyncio.sleep(0.01)
+        assert pool.locks == {"c1"}
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert pool.locks == set()
+    assert len(pool.free) == 1
+
+
+def test_lock_held_elsewhere_times_out_and_returns_the_connection():
+    pool = FakePool(size=1, locks={"c1"})
+
+    async def scenario():
+        with pytest.raises(ConversationLockTimeout):
+            async with postgres_backend(pool, acquire_timeout=0.01).hold("c1"):
+                pass
+
+    asyncio.run(scenario())
+    assert len(pool.free) == 1
+
+
+def test_waiting_for_a_pool_connection_times_out():
+    pool = FakePool(size=0)
+
+    async def scenario():
+        with pytest.raises(ConversationLockTimeout):
+            async with postgres_backend(pool, acquire_timeout=0.01).hold("c1"):
+                pass
+
+    asyncio.run(scenario())
@@ -0,0 +1,99 @@
+# tests/test_rate_limit.py
+import asyncio
+
+import pytest
+
+from api.rate_limit import (
+    ApiClient,
+    CostExceedsBurst,
+    InMemoryRateLimiter,
+    Quota,
+    RateLimiter,
+    RateLimitExceeded,
+    TokenBucket,
+    key_id,
+)
+
+
+def test_token_bucket_allows_the_burst_then_reports_the_wait():
+    bucket = TokenBucket(rate=1.0, capacity=3, now=0.0)
+    assert [bucket.take(0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take(0.0) == pytest.approx(1.0)
+
+
+def test_token_bucket_refills_at_its_rate_up_to_capacity():
+    bucket = TokenBucket(rate=2.0, capacity=4, now=0.0)
+    assert bucket.take(0.0, cost=4) == 0.0
+    assert bucket.take(1.0, cost=2) == 0.0
+    assert bucket.take(100.0, cost=4) == 0.0
+    assert bucket.take(100.0) == pytest.approx(0.5)
+
+
+def test_token_bucket_charges_the_full_cost():
+    bucket = TokenBucket(rate=1.0, capacity=10, now=0.0)
+    assert bucket.take(0.0, cost=8) == 0.0
+    assert bucket.take(0.0, cost=5) == pytest.approx(3.0)
+
+
+def make_limiter(conversation_quota: Quota = Quota(60, 2)) -> RateLimiter:
+    return RateLimiter(InMemoryRateLimiter(max_buckets=100), conversation_quota, enabled=True)
+
+
+def client(name: str, quota: Quota, key: str | None = None) -> ApiClient:
+    return ApiClient(name, quota, key_id(key or f"key-for-{name}"))
+
+
+def test_batch_costing_more_than_the_burst_is_rejected_without_charging():
+    limiter = make_limiter()
+    acme = client("acme", Quota(per_minute=60, burst=5))
+
+    with pytest.raises(CostExceedsBurst):
+        asyncio.run(limiter.check(acme, cost=6))
+    # Nothing was taken, so a batch that fits still passes.
+    asyncio.run(limiter.check(acme, cost=5))
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(limiter.check(acme, cost=1))
+
+
+def test_conversation_buckets_are_separate_per_client_and_conversation():
+    limiter = make_limiter(Quota(per_minute=60, burst=1))
+    acme, globex = client("acme", Quota(0, 0)), client("globex", Quota(0, 0))
+
+    asyncio.run(limiter.check(acme, "c1"))
+    asyncio.run(limiter.check(acme, "c2"))
+    asyncio.run(limiter.check(globex, "c1"))
+    with pytest.raises(RateLimitExceeded) as rejected:
+        asyncio.run(limiter.check(acme, "c1"))
+    assert rejected.value.scope == "conversation"
+
+
+def test_a_request_rejected_for_its_conversation_does_not_use_the_key_quota():
+    limiter = make_limiter(Quota(per_minute=60, burst=1))
+    acme = client("acme", Quota(per_minute=60, burst=2))
+
+    asyncio.run(limiter.check(acme, "c1"))
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(limiter.check(acme, "c1"))
+    # The rejected request took nothing from the key's bucket, so one token is still left.
+    asyncio.run(limiter.check(acme, "c2"))
+    with pytest.raises(RateLimitExceeded) as rejected:
+        asyncio.run(limiter.check(acme, "c3"))
+    assert rejected.value.scope == "api_key"
+
+
+def test_keys_sharing_a_name_have_separate_buckets():
+    limiter = make_limiter()
+    first = client("acme", Quota(per_minute=60, burst=1), key="key-1")
+    second = client("acme", Quota(per_minute=60, burst=1), key="key-2")
+
+    asyncio.run(limiter.check(first))
+    asyncio.run(limiter.check(second))
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(limiter.check(first))
+
+
+def test_unlimited_quota_and_disabled_limiter_never_reject():
+    limiter = make_limiter()
+    asyncio.run(limiter.check(client("internal", Quota(per_minute=0, burst=0)), cost=1000))
+    limiter.enabled = False
+    asyncio.run(limiter.check(client("acme", Quota(per_minute=60, burst=1)), "c1", cost=1000))
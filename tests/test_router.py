@@ -0,0 +1,73 @@
+# tests/test_router.py
+import asyncio
+
+import pytest
+
+from agent import router as router_module
+from agent.router import IntentRouter
+
+
+def make_router(monkeypatch, query_vector: list[float], threshold: float = 0.8, margin: float = 0.1) -> IntentRouter:
+    async def fake_aembed_query(query: str) -> list[float]:
+        return query_vector
+
+    monkeypatch.setattr(router_module, "aembed_query", fake_aembed_query)
+    router = IntentRouter("agent/intents.json", threshold=threshold, margin=margin)
+    router._exemplar_vectors = [
+        ("knowledge", [1.0, 0.0, 0.0]),
+        ("knowledge", [0.8, 0.6, 0.0]),
+        ("goodbye", [0.0, 1.0, 0.0]),
+        ("agent", [0.0, 0.0, 1.0]),
+    ]
+    return router
+
+
+def route(router: IntentRouter, query: str, history: list[dict] | None = None):
+    return asyncio.run(router.aroute(query, history or []))
+
+
+def test_a_confident_match_routes_to_the_best_intent(monkeypatch):
+    decision = route(make_router(monkeypatch, [1.0, 0.0, 0.0]), "What does the system cost?")
+    assert (decision.intent, decision.method) == ("knowledge", "embedding")
+    assert decision.score == pytest.approx(1.0)
+
+
+def test_a_score_below_the_threshold_falls_back_to_the_agent(monkeypatch):
+    # The best match is agent at ~0.71, under the 0.8 threshold.
+    decision = route(make_router(monkeypatch, [0.5, 0.5, 0.7071]), "Tell me something about the product")
+    assert (decision.intent, decision.method) == ("agent", "low_confidence")
+
+
+def test_a_close_runner_up_falls_back_to_the_agent(monkeypatch):
+    # Knowledge scores 0.96 and goodbye 0.8: above the threshold, but within a 0.2 margin.
+    query_vector = [0.6, 0.8, 0.0]
+    decision = route(make_router(monkeypatch, query_vector, margin=0.2), "Is that everything then")
+    assert (decision.intent, decision.method) == ("agent", "low_confidence")
+
+    decision = route(make_router(monkeypatch, query_vector, margin=0.1), "Is that everything then")
+    assert (decision.intent, decision.method) == ("knowledge", "embedding")
+
+
+def test_booking_wording_always_goes_to_the_agent(monkeypatch):
+    router = make_router(monkeypatch, [1.0, 0.0, 0.0])
+    for query in ("Can I book a call?", "hi, please email me", "me@example.com", "?!"):
+        decision = route(router, query)
+        assert (decision.intent, decision.method) == ("agent", "rule")
+
+
+def test_replies_to_the_bot_mid_workflow_go_to_the_agent(monkeypatch):
+    router = make_router(monkeypatch, [1.0, 0.0, 0.0])
+    asked = [{"type": "human", "data": {"content": "hi"}}, {"type": "ai", "data": {"content": "What's your business?"}}]
+    assert route(router, "thanks", asked).method == "mid_flow"
+
+    tool_call = [{"type": "ai", "data": {"content": "", "tool_calls": [{"name": "check_availability"}]}}]
+    assert route(router, "Tuesday works", tool_call).method == "mid_flow"
+
+
+def test_small_talk_is_matched_by_rule_without_embedding(monkeypatch):
+    router = make_router(monkeypatch, [1.0, 0.0, 0.0])
+    router._exemplar_vectors = None  # Embedding would fail: no exemplars and no shared resources.
+    answered = [{"type": "ai", "data": {"content": "Glad I could help."}}]
+    assert route(router, "Hello there!", answered).intent == "greeting"
+    assert route(router, "Thank you so much", answered).intent == "thanks"
+    assert route(router, "Have a great day.", answered).intent == "goodbye"
@@ -0,0 +1,23 @@
+# tests/test_runtime_config.py
+from agent import runtime_config
+
+
+def test_knowledge_base_version_is_re_read_from_dotenv(monkeypatch):
+    # load_dotenv() put the startup value into os.environ; the edited .env must still win.
+    monkeypatch.setattr(runtime_config, "ENVIRONMENT_KEYS", frozenset())
+    monkeypatch.setenv("KNOWLEDGE_BASE_VERSION", "1")
+    monkeypatch.setattr(runtime_config, "dotenv_values", lambda: {"KNOWLEDGE_BASE_VERSION": "2"})
+    assert runtime_config._current_knowledge_base_version() == "2"
+
+
+def test_real_environment_variable_wins_over_dotenv(monkeypatch):
+    monkeypatch.setattr(runtime_config, "ENVIRONMENT_KEYS", frozenset({"KNOWLEDGE_BASE_VERSION"}))
+    monkeypatch.setenv("KNOWLEDGE_BASE_VERSION", "7")
+    monkeypatch.setattr(runtime_config, "dotenv_values", lambda: {"KNOWLEDGE_BASE_VERSION": "2"})
+    assert runtime_config._current_knowledge_base_version() == "7"
+
+
+def test_tool_timeouts_are_re_read_from_dotenv(monkeypatch):
+    monkeypatch.setattr(runtime_config, "ENVIRONMENT_KEYS", frozenset())
+    monkeypatch.setattr(runtime_config, "dotenv_values", lambda: {"TOOL_TIMEOUTS": '{"check_availability": 5}'})
+    assert runtime_config._current_env("TOOL_TIMEOUTS", "") == '{"check_availability": 5}'
@@ -0,0 +1,150 @@
+# tests/test_vector_index.py
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from agent import vector_index
+from agent.vector_index import REPRESENTATIONS, VectorIndex, binarize, quantize_int8
+
+DIMENSIONS = 64
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    rng = np.random.default_rng(7)
+    vectors = rng.normal(size=(500, DIMENSIONS)).astype(np.float32)
+    queries = rng.normal(size=(20, DIMENSIONS)).astype(np.float32)
+    return vectors, queries
+
+
+def build(representation: str, vectors, page_size: int = 128) -> VectorIndex:
+    index = VectorIndex(representation, rescore_factor=10)
+    for start in range(0, len(vectors), page_size):
+        page = vectors[start:start + page_size]
+        index.add(page, [{"id": start + i, "content": f"doc {start + i}", "embedding": "[...]"} for i in range(len(page))])
+    return index
+
+
+def exact_top_k(vectors, query, k: int) -> list[int]:
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.argsort(-(normalized @ (query / np.linalg.norm(query))), kind="stable")[:k].tolist()
+
+
+def test_float_search_is_exact_cosine(corpus):
+    vectors, queries = corpus
+    index = build("float", vectors)
+    for query in queries:
+        indexes, scores = index.search_indexes(query, 5)
+        assert indexes.tolist() == exact_top_k(vectors, query, 5)
+        assert list(scores) == sorted(scores, reverse=True)
+
+
+@pytest.mark.parametrize("representation, min_recall", [("int8", 0.95), ("binary", 0.8)])
+def test_quantized_search_recall(corpus, representation, min_recall):
+    vectors, queries = corpus
+    index = build(representation, vectors)
+    found = sum(
+        len(set(index.search_indexes(query, 10)[0].tolist()) & set(exact_top_k(vectors, query, 10)))
+        for query in queries
+    )
+    assert found / (10 * len(queries)) >= min_recall
+
+
+@pytest.mark.parametrize("representation", REPRESENTATIONS)
+def test_to_float_round_trips_the_normalized_vectors(corpus, representation):
+    vectors, _ = corpus
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    restored = build(representation, vectors).to_float()
+    assert restored.shape == vectors.shape
+    assert np.abs(restored - normalized).max() < 0.02
+
+
+def test_search_returns_match_documents_shaped_rows(corpus):
+    vectors, queries = corpus
+    rows = build("int8", vectors).search(queries[0], 3)
+    assert len(rows) == 3
+    assert set(rows[0]) == {"id", "content", "embedding", "similarity"}
+    assert len(rows[0]["embedding"]) == DIMENSIONS
+    assert rows[0]["similarity"] >= rows[1]["similarity"] >= rows[2]["similarity"]
+
+
+def test_memory_shrinks_with_quantization(corpus):
+    vectors, _ = corpus
+    sizes = {representation: build(representation, vectors).nbytes for representation in REPRESENTATIONS}
+    assert sizes["float"] == vectors.nbytes
+    assert sizes["int8"] < sizes["binary"] < sizes["float"]
+
+
+def test_empty_index_and_zero_k_return_nothing(corpus):
+    vectors, queries = corpus
+    assert VectorIndex("binary").search(queries[0], 5) == []
+    assert build("float", vectors).search(queries[0], 0) == []
+
+
+def test_encoders_handle_zero_vectors():
+    codes, scales = quantize_int8(np.zeros((1, 8), dtype=np.float32))
+    assert codes.tolist() == [[0] * 8] and scales.tolist() == [1.0]
+    assert binarize(np.array([[1, -1, 0, 2, -3, 4, 5, -6]], dtype=np.float32)).tolist() == [[0b10010110]]
+
+
+def test_unknown_representation_is_rejected():
+    with pytest.raises(ValueError):
+        VectorIndex("float16")
+
+
+class Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class ShuffledTable:
+    """Like Postgres without an ORDER BY: every range request sees the rows in a different order."""
+
+    def __init__(self, rows: list[dict]):
+        self.rows = rows
+        self.ordered_by = None
+        self.requests = 0
+
+    def select(self, columns):
+        self.ordered_by = None
+        return self
+
+    def order(self, column):
+        self.ordered_by = column
+        return self
+
+    def range(self, start, end):
+        self.requests += 1
+        if self.ordered_by:
+            rows = sorted(self.rows, key=lambda row: row[self.ordered_by])
+        else:
+            rows = [self.rows[i] for i in np.random.default_rng(self.requests).permutation(len(self.rows))]
+        self.page = rows[start:end + 1]
+        return self
+
+    def execute(self):
+        return Response(self.page)
+
+
+class FakeSupabase:
+    def __init__(self, table: ShuffledTable):
+        self._table = table
+
+    def table(self, name):
+        return self._table
+
+
+def test_load_reads_every_row_exactly_once_across_pages(monkeypatch):
+    monkeypatch.setattr(vector_index, "PAGE_SIZE", 10)
+    rng = np.random.default_rng(3)
+    rows = [
+        {"id": f"{i:04d}", "content": f"doc {i}", "metadata": {}, "embedding": json.dumps(rng.normal(size=8).tolist())}
+        for i in range(45)
+    ]
+    table = ShuffledTable(rows)
+    index = VectorIndex.load(FakeSupabase(table), "float", rescore_factor=10)
+
+    assert table.requests == 5
+    assert sorted(row["id"] for row in index.rows) == [row["id"] for row in rows]
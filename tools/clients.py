@@ -0,0 +1,56 @@
+# tools/clients.py
+import asyncio
+import logging
+
+import httpx
+from supabase import AsyncClient, acreate_client
+from supabase.client import Client, create_client
+
+from config.settings import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Process-wide clients, created lazily on first use and shared by every tool call.
+_supabase: Client | None = None
+_async_supabase: AsyncClient | None = None
+_async_supabase_lock = asyncio.Lock()
+_http_client: httpx.AsyncClient | None = None
+
+
+def get_supabase() -> Client:
+    """Returns the shared synchronous Supabase client."""
+    global _supabase
+    if _supabase is None:
+        _supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
+    return _supabase
+
+
+async def get_async_supabase() -> AsyncClient:
+    """Returns the shared asynchronous Supabase client."""
+    global _async_supabase
+    if _async_supabase is None:
+        async with _async_supabase_lock:
+            if _async_supabase is None:
+                _async_supabase = await acreate_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
+    return _async_supabase
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Returns the shared async HTTP client used for Google Calendar calls."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=settings.HTTP_CLIENT_TIMEOUT,
+            limits=httpx.Limits(max_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS)
+        )
+    return _http_client
+
+
+async def aclose_clients() -> None:
+    """Closes the shared async clients. Call on application shutdown."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+        logger.info("Shared HTTP client closed.")
@@ -0,0 +1,56 @@
+# tools/conversation_archive.py
+import base64
+import gzip
+import json
+
+from config.settings import settings
+
+
+def pack_messages(messages: list[dict]) -> str:
+    """Serializes message dicts as gzip-compressed JSON, base64-encoded for a text column."""
+    raw = json.dumps(messages, separators=(",", ":")).encode("utf-8")
+    return base64.b64encode(gzip.compress(raw)).decode("ascii")
+
+
+def unpack_messages(payload: str) -> list[dict]:
+    return json.loads(gzip.decompress(base64.b64decode(payload)).decode("utf-8"))
+
+
+def _segments_query(supabase, conversation_id: str):
+    return supabase.table(settings.DB_CONVERSATION_ARCHIVE_TABLE).select(
+        "segment, payload"
+    ).eq("conversation_id", conversation_id).order("segment")
+
+
+def fetch_archived_messages(supabase, conversation_id: str) -> list[dict]:
+    """Returns every archived message of a conversation, oldest first."""
+    response = _segments_query(supabase, conversation_id).execute()
+    return [message for row in response.data or [] for message in unpack_messages(row["payload"])]
+
+
+async def afetch_archived_messages(supabase, conversation_id: str) -> list[dict]:
+    response = await _segments_query(supabase, conversation_id).execute()
+    return [message for row in response.data or [] for message in unpack_messages(row["payload"])]
+
+
+def fetch_full_history(supabase, conversation_id: str) -> list[dict]:
+    """Archived segments followed by the messages still on the hot conversation_history row."""
+    response = supabase.table(settings.DB_CONVERSATION_HISTORY_TABLE).select(
+        "history, archived_count"
+    ).eq("conversation_id", conversation_id).execute()
+    if not response.data:
+        return []
+    row = response.data[0]
+    archived = fetch_archived_messages(supabase, conversation_id) if row.get("archived_count") else []
+    return archived + (row.get("history") or [])
+
+
+async def afetch_full_history(supabase, conversation_id: str) -> list[dict]:
+    response = await supabase.table(settings.DB_CONVERSATION_HISTORY_TABLE).select(
+        "history, archived_count"
+    ).eq("conversation_id", conversation_id).execute()
+    if not response.data:
+        return []
+    row = response.data[0]
+    archived = await afetch_archived_messages(supabase, conversation_id) if row.get("archived_count") else []
+    return archived + (row.get("history") or [])
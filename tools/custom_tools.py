@@ -1,10 +1,10 @@
 # tools/custom_tools.py
 from config.settings import settings
-from supabase.client import Client, create_client
 import logging
 import json
 from langchain.tools import StructuredTool
 from langchain_core.tools import Tool
+from langchain_core.messages import messages_from_dict
 from pydantic import ValidationError
 from .action_schemas import (
     BookOnboardingCallArgs,
@@ -18,27 +18,77 @@ from .google_calendar import (
     create_calendar_event,
     find_event_by_details,
     update_calendar_event,
-    delete_calendar_event
+    delete_calendar_event,
+    aget_available_slots,
+    afind_event_by_details,
+    aupdate_calendar_event,
+    adelete_calendar_event
 )
-from .email_sender import send_confirmation_email
+from .email_sender import (
+    send_confirmation_email,
+    send_handover_email,
+    asend_confirmation_email,
+    asend_handover_email
+)
+from .clients import get_supabase, get_async_supabase
+from .conversation_archive import afetch_full_history, fetch_full_history
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def check_availability(date: str) -> str:
-    # This function remains the same
-    logger.info(f"--- ACTION: Checking availability for {date} ---")
+BUDGET_TOO_LOW_MESSAGE = (
+    "Thank you for sharing that. Based on the budget you provided, it seems like our 'Project Pipeline AI' "
+    "might not be the right fit for your needs at this moment. Our solution is designed for businesses with a "
+    "higher budget for this kind of automation. I appreciate your time and honesty!"
+)
+HANDOVER_SUCCESS_MESSAGE = "Okay, I've notified a member of our team. They will review our conversation and get back to you here as soon as possible."
+HANDOVER_ERROR_MESSAGE = "Sorry, I encountered an error while trying to reach a human. Please try again."
+
+# --- Input parsing shared by the sync and async tool implementations ---
+
+def _parse_date(date: str) -> str:
     try:
         data = json.loads(date)
-        date_to_check = data.get('date', date)
-    except (json.JSONDecodeError, TypeError):
-        date_to_check = date
-    available_slots = get_available_slots(date_to_check)
+        return data.get('date', date)
+    except (json.JSONDecodeError, TypeError, AttributeError):
+        return date
+
+def _format_availability(date_to_check: str, available_slots: list[str]) -> str:
     logger.info(f"Available slots: {available_slots}")
     if not available_slots:
         return f"I'm sorry, but there are no available slots on {date_to_check}. Please try another date."
     return f"Here are the available slots for {date_to_check}: {', '.join(available_slots)}"
 
+def _build_meeting_record(args: BookOnboardingCallArgs) -> dict:
+    # Insert the meeting details into Supabase without a calendar event ID
+    return {
+        # "google_calendar_event_id" is now omitted
+        "full_name": args.full_name,
+        "email": args.email,
+        "company_name": args.company_name,
+        "start_time": args.start_time,
+        "goal": args.goal,
+        "monthly_budget": args.monthly_budget,
+        "status": "pending_confirmation"
+    }
+
+def _booking_success_message(full_name: str) -> str:
+    return (f"Excellent, {full_name}! I've provisionally booked your onboarding call. "
+            "I've just sent you an email to confirm your spot. Please click the link in the email to finalize everything. ✨")
+
+# --- Tool implementations ---
+
+def check_availability(date: str) -> str:
+    # This function remains the same
+    logger.info(f"--- ACTION: Checking availability for {date} ---")
+    date_to_check = _parse_date(date)
+    return _format_availability(date_to_check, get_available_slots(date_to_check))
+
+async def acheck_availability(date: str) -> str:
+    logger.info(f"--- ACTION: Checking availability for {date} ---")
+    date_to_check = _parse_date(date)
+    return _format_availability(date_to_check, await aget_available_slots(date_to_check))
+
 def book_zappies_onboarding_call_from_json(json_string: str) -> str:
     logger.info(f"--- ACTION: Booking Zappies AI Onboarding Call ---")
     try:
@@ -48,43 +98,12 @@ def book_zappies_onboarding_call_from_json(json_string: str) -> str:
         return f"I'm sorry, there was a problem with the booking details. Error: {e}"
 
     if validated_args.monthly_budget < 8000:
-        return (
-            "Thank you for sharing that. Based on the budget you provided, it seems like our 'Project Pipeline AI' "
-            "might not be the right fit for your needs at this moment. Our solution is designed for businesses with a "
-            "higher budget for this kind of automation. I appreciate your time and honesty!"
-        )
+        return BUDGET_TOO_LOW_MESSAGE
 
-    # Deconstruct the validated arguments
-    full_name = validated_args.full_name
-    email = validated_args.email
-    company_name = validated_args.company_name
-    start_time = validated_args.start_time
-    goal = validated_args.goal
-    monthly_budget = validated_args.monthly_budget
-
-    summary = f"Onboard Call with {company_name} | Zappies AI"
-    description = (
-        f"Onboarding call with {full_name} from {company_name} to discuss the 'Project Pipeline AI'.\n\n"
-        f"Stated Goal: {goal}\n"
-        f"Stated Budget: R{monthly_budget}/month"
-    )
-    
-    try:
-        
-        supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
-        
-        # Insert the meeting details into Supabase without a calendar event ID
-        response = supabase.table("meetings").insert({
-            # "google_calendar_event_id" is now omitted
-            "full_name": full_name,
-            "email": email,
-            "company_name": company_name,
-            "start_time": start_time,
-            "goal": goal,
-            "monthly_budget": monthly_budget,
-            "status": "pending_confirmation"
-        }).execute()
-        
+    conversation_id = validated_args.conversation_id
+    try:
+        supabase = get_supabase()
+        response = supabase.table("meetings").insert(_build_meeting_record(validated_args)).execute()
         meeting_id = response.data[0]['id']
 
         try:
@@ -97,19 +116,54 @@ def book_zappies_onboarding_call_from_json(json_string: str) -> str:
             logger.error(f"Error updating conversation_history for {conversation_id}: {e}", exc_info=True)
 
         send_confirmation_email(
-            recipient_email=email,
-            full_name=full_name,
-            start_time=start_time,
+            recipient_email=validated_args.email,
+            full_name=validated_args.full_name,
+            start_time=validated_args.start_time,
             meeting_id=meeting_id
         )
 
-        return (f"Excellent, {full_name}! I've provisionally booked your onboarding call. "
-                "I've just sent you an email to confirm your spot. Please click the link in the email to finalize everything. ✨")
+        return _booking_success_message(validated_args.full_name)
     except (ValueError, Exception) as e:
         logger.error(f"Booking/validation error: {e}", exc_info=True)
         return f"I'm sorry, I cannot book that appointment. {e}"
 
-# tools/custom_tools.py
+async def abook_zappies_onboarding_call_from_json(json_string: str) -> str:
+    logger.info(f"--- ACTION: Booking Zappies AI Onboarding Call ---")
+    try:
+        data = json.loads(json_string)
+        validated_args = BookOnboardingCallArgs(**data)
+    except (json.JSONDecodeError, ValidationError) as e:
+        return f"I'm sorry, there was a problem with the booking details. Error: {e}"
+
+    if validated_args.monthly_budget < 8000:
+        return BUDGET_TOO_LOW_MESSAGE
+
+    conversation_id = validated_args.conversation_id
+    try:
+        supabase = await get_async_supabase()
+        response = await supabase.table("meetings").insert(_build_meeting_record(validated_args)).execute()
+        meeting_id = response.data[0]['id']
+
+        try:
+            await supabase.table("conversation_history").update(
+                {"meeting_booked": True}
+            ).eq("conversation_id", conversation_id).execute()
+            logger.info(f"Successfully marked conversation {conversation_id} as 'meeting_booked = true'.")
+        except Exception as e:
+            # Log this error, but don't stop the user-facing process
+            logger.error(f"Error updating conversation_history for {conversation_id}: {e}", exc_info=True)
+
+        await asend_confirmation_email(
+            recipient_email=validated_args.email,
+            full_name=validated_args.full_name,
+            start_time=validated_args.start_time,
+            meeting_id=meeting_id
+        )
+
+        return _booking_success_message(validated_args.full_name)
+    except (ValueError, Exception) as e:
+        logger.error(f"Booking/validation error: {e}", exc_info=True)
+        return f"I'm sorry, I cannot book that appointment. {e}"
 
 def request_human_handover(json_string: str) -> str:
     """Handles the human handover process."""
@@ -121,16 +175,15 @@ def request_human_handover(json_string: str) -> str:
         return f"Sorry, there was an internal error processing the handover request. Error: {e}"
 
     try:
-        supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
+        supabase = get_supabase()
 
         # --- THIS IS THE FIX ---
-        # 1. Fetch the conversation history without using .single()
-        response = supabase.table("conversation_history").select("history").eq("conversation_id", conversation_id).execute()
-        
+        # 1. Fetch the conversation history (including any archived segments) without using .single()
+        history = fetch_full_history(supabase, conversation_id)
+
         history_messages = []
-        if response.data and response.data[0].get('history'):
-            from langchain_core.messages import messages_from_dict
-            history_messages = messages_from_dict(response.data[0]['history'])
+        if history:
+            history_messages = messages_from_dict(history)
         else:
             logger.warning(f"No previous history found for conversation {conversation_id}. Handover will proceed with an empty history.")
 
@@ -142,12 +195,44 @@ def request_human_handover(json_string: str) -> str:
             "conversation_id": conversation_id,
             "status": "handover"
         }).execute()
-        
-        return "Okay, I've notified a member of our team. They will review our conversation and get back to you here as soon as possible."
+
+        return HANDOVER_SUCCESS_MESSAGE
+
+    except Exception as e:
+        logger.error(f"Error during handover for convo {conversation_id}: {e}", exc_info=True)
+        return HANDOVER_ERROR_MESSAGE
+
+async def arequest_human_handover(json_string: str) -> str:
+    """Async version of request_human_handover."""
+    logger.info(f"--- ACTION: Requesting Human Handover ---")
+    try:
+        data = json.loads(json_string)
+        conversation_id = data["conversation_id"]
+    except (json.JSONDecodeError, KeyError) as e:
+        return f"Sorry, there was an internal error processing the handover request. Error: {e}"
+
+    try:
+        supabase = await get_async_supabase()
+        history = await afetch_full_history(supabase, conversation_id)
+
+        history_messages = []
+        if history:
+            history_messages = messages_from_dict(history)
+        else:
+            logger.warning(f"No previous history found for conversation {conversation_id}. Handover will proceed with an empty history.")
+
+        await asend_handover_email(conversation_id, history_messages)
+
+        await supabase.table("conversation_history").upsert({
+            "conversation_id": conversation_id,
+            "status": "handover"
+        }).execute()
+
+        return HANDOVER_SUCCESS_MESSAGE
 
     except Exception as e:
         logger.error(f"Error during handover for convo {conversation_id}: {e}", exc_info=True)
-        return "Sorry, I encountered an error while trying to reach a human. Please try again."
+        return HANDOVER_ERROR_MESSAGE
 
 def cancel_appointment_from_json(json_string: str) -> str:
     """Cancels an appointment from a JSON string."""
@@ -160,7 +245,7 @@ def cancel_appointment_from_json(json_string: str) -> str:
 
     email = validated_args.email
     original_start_time = validated_args.original_start_time
-    
+
     event_id = find_event_by_details(email, original_start_time)
     if not event_id:
         return f"I couldn't find an appointment for {email} at that time. Please check the details."
@@ -171,6 +256,26 @@ def cancel_appointment_from_json(json_string: str) -> str:
         logger.error(f"Error canceling event: {e}", exc_info=True)
         return f"Sorry, there was an error canceling your appointment: {str(e)}"
 
+async def acancel_appointment_from_json(json_string: str) -> str:
+    """Async version of cancel_appointment_from_json."""
+    logger.info(f"--- ACTION: Canceling appointment from JSON ---")
+    try:
+        data = json.loads(json_string)
+        validated_args = CancelAppointmentArgs(**data)
+    except (json.JSONDecodeError, ValidationError) as e:
+        return f"Sorry, the details provided for cancellation were not valid. Error: {e}"
+
+    email = validated_args.email
+    event_id = await afind_event_by_details(email, validated_args.original_start_time)
+    if not event_id:
+        return f"I couldn't find an appointment for {email} at that time. Please check the details."
+    try:
+        await adelete_calendar_event(event_id)
+        return "Your appointment has been successfully canceled."
+    except Exception as e:
+        logger.error(f"Error canceling event: {e}", exc_info=True)
+        return f"Sorry, there was an error canceling your appointment: {str(e)}"
+
 def reschedule_appointment_from_json(json_string: str) -> str:
     """Reschedules an appointment from a JSON string."""
     logger.info(f"--- ACTION: Rescheduling appointment from JSON ---")
@@ -194,18 +299,47 @@ def reschedule_appointment_from_json(json_string: str) -> str:
         logger.error(f"Error rescheduling event: {e}", exc_info=True)
         return f"Sorry, there was an error rescheduling your appointment: {str(e)}"
 
+async def areschedule_appointment_from_json(json_string: str) -> str:
+    """Async version of reschedule_appointment_from_json."""
+    logger.info(f"--- ACTION: Rescheduling appointment from JSON ---")
+    try:
+        data = json.loads(json_string)
+        validated_args = RescheduleAppointmentArgs(**data)
+    except (json.JSONDecodeError, ValidationError) as e:
+        return f"Sorry, the details provided for rescheduling were not valid. Error: {e}"
+
+    email = validated_args.email
+    new_start_time = validated_args.new_start_time
+
+    event_id = await afind_event_by_details(email, validated_args.original_start_time)
+    if not event_id:
+        return f"I couldn't find an appointment for {email} at the original time. Please check the details."
+    try:
+        await aupdate_calendar_event(event_id, new_start_time)
+        return f"Your appointment has been successfully rescheduled to {new_start_time}."
+    except Exception as e:
+        logger.error(f"Error rescheduling event: {e}", exc_info=True)
+        return f"Sorry, there was an error rescheduling your appointment: {str(e)}"
+
+# Marks tools that book, cancel, e-mail or change a conversation's status. The agent never cuts
+# these off midway (see tools/deadline.py); set it on any new tool with side effects.
+SIDE_EFFECTS = {"side_effects": True}
+
 def get_custom_tools() -> list:
     """Returns a list of all custom tools available to the agent."""
     tools = [
         StructuredTool(
             name="check_availability",
             func=check_availability,
+            coroutine=acheck_availability,
             args_schema=CheckAvailabilityArgs,
             description="Use to check for available 1-hour time slots on a specific date (YYYY-MM-DD)."
         ),
         Tool(
             name="book_zappies_onboarding_call",
             func=book_zappies_onboarding_call_from_json,
+            coroutine=abook_zappies_onboarding_call_from_json,
+            metadata=SIDE_EFFECTS,
             description=(
                 "Use to book a NEW onboarding call after you have collected all required information. The input must be a single, "
                 "valid JSON string with keys: 'full_name', 'email', 'company_name', 'start_time', 'goal', and 'monthly_budget'."
@@ -214,6 +348,8 @@ def get_custom_tools() -> list:
         Tool(
             name="cancel_appointment",
             func=cancel_appointment_from_json,
+            coroutine=acancel_appointment_from_json,
+            metadata=SIDE_EFFECTS,
             description=(
                 "Use to cancel an existing appointment. The input must be a single, valid JSON string with keys: "
                 "'email' and 'original_start_time'."
@@ -222,6 +358,8 @@ def get_custom_tools() -> list:
         Tool(
             name="reschedule_appointment",
             func=reschedule_appointment_from_json,
+            coroutine=areschedule_appointment_from_json,
+            metadata=SIDE_EFFECTS,
             description=(
                 "Use to reschedule an existing appointment. The input must be a single, valid JSON string with keys: "
                 "'email', 'original_start_time', and 'new_start_time'."
@@ -230,6 +368,8 @@ def get_custom_tools() -> list:
         Tool(
             name="request_human_handover",
             func=request_human_handover,
+            coroutine=arequest_human_handover,
+            metadata=SIDE_EFFECTS,
             description=(
                 "Use this tool when the user explicitly asks to speak to a human, a person, or a team member. "
                 "The input MUST be a single, valid JSON string with the key: 'conversation_id'."
@@ -0,0 +1,74 @@
+# tools/deadline.py
+"""
+Per-request deadlines. The server opens a deadline scope for each chat turn; anything awaited
+inside it (queue waits, tool calls, Calendar requests) can ask how much time is left and bound
+its own timeout by it. The deadline lives in a contextvar, so it follows the turn into tasks and
+`asyncio.to_thread` calls without being passed around.
+"""
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from config.settings import settings
+
+_deadline: ContextVar[float | None] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when work is about to start after the request's deadline has already passed."""
+
+
+@contextmanager
+def deadline_scope(seconds: float | None):
+    """Sets a deadline `seconds` from now for the enclosed block. Never extends an outer deadline."""
+    if not seconds:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float | None:
+    """Seconds left before the current deadline (0 once it has passed), or None without a deadline."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def bounded_timeout(timeout: float | None) -> float | None:
+    """`timeout` capped by the time left on the current deadline; raises if none is left."""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("The request deadline has passed.")
+    return left if timeout is None else min(timeout, left)
+
+
+def parse_tool_timeouts(value: str, side_effect_tools=()) -> dict[str, float]:
+    """
+    Per-tool timeout overrides from a TOOL_TIMEOUTS JSON string. Tools with side effects default
+    to 0: cut off midway, one can leave its work half done (a meeting inserted but never
+    confirmed) while the agent is told it timed out and tries again. An entry bounds one anyway.
+    """
+    overrides = {name: 0.0 for name in side_effect_tools}
+    overrides.update((name, float(seconds or 0)) for name, seconds in json.loads(value or "{}").items())
+    return overrides
+
+
+def runs_to_completion(tool_name: str, overrides: dict[str, float]) -> bool:
+    """True for tools that must never be cancelled midway: an override of 0 (or null)."""
+    return overrides.get(tool_name) == 0
+
+
+def tool_timeout(tool_name: str, overrides: dict[str, float]) -> float | None:
+    """The timeout for one call of a tool: its override or TOOL_TIMEOUT_SECONDS, within the deadline."""
+    timeout = overrides.get(tool_name, settings.TOOL_TIMEOUT_SECONDS) or None
+    return bounded_timeout(timeout)
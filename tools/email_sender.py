@@ -1,6 +1,8 @@
 # tools/email_sender.py
 import smtplib
 import logging
+import html
+import aiosmtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from config.settings import settings
@@ -8,15 +10,11 @@ from config.settings import settings
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def send_confirmation_email(recipient_email: str, full_name: str, start_time: str, meeting_id: str):
-    """Sends a meeting confirmation email using SMTP."""
-    sender_email = settings.SENDER_EMAIL
-    sender_password = settings.SENDER_APP_PASSWORD
-    
-    if not sender_email or not sender_password:
-        logger.error("Sender email or password not configured. Cannot send email.")
-        return False
+SMTP_HOST = 'smtp.gmail.com'
+SMTP_PORT = 465
 
+def _build_confirmation_message(sender_email: str, recipient_email: str, full_name: str, start_time: str, meeting_id: str) -> MIMEMultipart:
+    """Builds the meeting confirmation email."""
     confirmation_url = f"{settings.API_BASE_URL}/confirm-meeting/{meeting_id}"
     
     # Create the email
@@ -318,10 +316,22 @@ def send_confirmation_email(recipient_email: str, full_name: str, start_time: st
     """
     
     msg.attach(MIMEText(html_body, 'html'))
+    return msg
+
+def send_confirmation_email(recipient_email: str, full_name: str, start_time: str, meeting_id: str):
+    """Sends a meeting confirmation email using SMTP."""
+    sender_email = settings.SENDER_EMAIL
+    sender_password = settings.SENDER_APP_PASSWORD
+    
+    if not sender_email or not sender_password:
+        logger.error("Sender email or password not configured. Cannot send email.")
+        return False
+
+    msg = _build_confirmation_message(sender_email, recipient_email, full_name, start_time, meeting_id)
     
     try:
         # Connect to Gmail's SMTP server and send the email
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:
+        with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT) as server:
             server.login(sender_email, sender_password)
             server.send_message(msg)
         logger.info(f"Confirmation email sent successfully to {recipient_email}")
@@ -329,23 +339,36 @@ def send_confirmation_email(recipient_email: str, full_name: str, start_time: st
     except Exception as e:
         logger.error(f"Failed to send confirmation email: {e}", exc_info=True)
         return False
-    
-def send_handover_email(conversation_id: str, history: list):
-    """Sends a human handover notification with the chat history."""
+
+async def asend_confirmation_email(recipient_email: str, full_name: str, start_time: str, meeting_id: str):
+    """Async version of send_confirmation_email."""
     sender_email = settings.SENDER_EMAIL
     sender_password = settings.SENDER_APP_PASSWORD
-    recipient_email = settings.HANDOVER_EMAIL
 
-    if not all([sender_email, sender_password, recipient_email]):
-        logger.error("Email configuration is incomplete. Cannot send handover email.")
+    if not sender_email or not sender_password:
+        logger.error("Sender email or password not configured. Cannot send email.")
+        return False
+
+    msg = _build_confirmation_message(sender_email, recipient_email, full_name, start_time, meeting_id)
+
+    try:
+        await aiosmtplib.send(
+            msg, hostname=SMTP_HOST, port=SMTP_PORT, use_tls=True,
+            username=sender_email, password=sender_password
+        )
+        logger.info(f"Confirmation email sent successfully to {recipient_email}")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to send confirmation email: {e}", exc_info=True)
         return False
 
+def _build_handover_message(sender_email: str, recipient_email: str, conversation_id: str, history: list) -> MIMEMultipart:
+    """Builds the human handover notification email."""
     # Format the chat history into a readable HTML string
     history_html = ""
     for message in history:
         speaker = "User" if message.type == 'human' else "AI"
         # Sanitize message content for HTML
-        import html
         content = html.escape(message.content)
         history_html += f'<p style="margin: 5px 0;"><strong>{speaker}:</strong> {content}</p>'
 
@@ -370,13 +393,49 @@ def send_handover_email(conversation_id: str, history: list):
     """
     
     msg.attach(MIMEText(html_body, 'html'))
+    return msg
+
+def send_handover_email(conversation_id: str, history: list):
+    """Sends a human handover notification with the chat history."""
+    sender_email = settings.SENDER_EMAIL
+    sender_password = settings.SENDER_APP_PASSWORD
+    recipient_email = settings.HANDOVER_EMAIL
+
+    if not all([sender_email, sender_password, recipient_email]):
+        logger.error("Email configuration is incomplete. Cannot send handover email.")
+        return False
+
+    msg = _build_handover_message(sender_email, recipient_email, conversation_id, history)
     
     try:
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:
+        with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT) as server:
             server.login(sender_email, sender_password)
             server.send_message(msg)
         logger.info(f"Handover notification sent successfully for conversation {conversation_id}")
         return True
+    except Exception as e:
+        logger.error(f"Failed to send handover email: {e}", exc_info=True)
+        return False
+
+async def asend_handover_email(conversation_id: str, history: list):
+    """Async version of send_handover_email."""
+    sender_email = settings.SENDER_EMAIL
+    sender_password = settings.SENDER_APP_PASSWORD
+    recipient_email = settings.HANDOVER_EMAIL
+
+    if not all([sender_email, sender_password, recipient_email]):
+        logger.error("Email configuration is incomplete. Cannot send handover email.")
+        return False
+
+    msg = _build_handover_message(sender_email, recipient_email, conversation_id, history)
+
+    try:
+        await aiosmtplib.send(
+            msg, hostname=SMTP_HOST, port=SMTP_PORT, use_tls=True,
+            username=sender_email, password=sender_password
+        )
+        logger.info(f"Handover notification sent successfully for conversation {conversation_id}")
+        return True
     except Exception as e:
         logger.error(f"Failed to send handover email: {e}", exc_info=True)
         return False
\ No newline at end of file
@@ -1,33 +1,42 @@
 # tools/google_calendar.py
+import asyncio
 import datetime
+from urllib.parse import quote
 from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient import errors
+from google.auth.transport.requests import Request as GoogleAuthRequest
+import httpx
 from config.settings import settings
 import pytz
 from dateutil.parser import parse
+from .clients import get_http_client
+from .deadline import bounded_timeout
 
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 SERVICE_ACCOUNT_FILE = settings.SERVICE_ACCOUNT_FILE
 CALENDAR_ID = settings.GOOGLE_CALENDAR_ID
+CALENDAR_API_BASE_URL = "https://www.googleapis.com/calendar/v3"
+
+_credentials = None
+_token_refresh_lock = asyncio.Lock()
 
 def get_calendar_service():
     """Returns an authenticated Google Calendar service object."""
+    # googleapiclient is slow to import and only the sync tools need it.
+    from googleapiclient.discovery import build
     creds = service_account.Credentials.from_service_account_file(
         SERVICE_ACCOUNT_FILE, scopes=SCOPES)
     service = build('calendar', 'v3', credentials=creds)
     return service
 
-def get_available_slots(date: str) -> list[str]:
-    service = get_calendar_service()
+# --- Shared helpers (used by both the sync and async implementations) ---
+
+def _day_bounds(date: str) -> tuple[datetime.datetime, datetime.datetime]:
     sast_tz = pytz.timezone("Africa/Johannesburg")
     day_start = sast_tz.localize(datetime.datetime.fromisoformat(date))
-    day_end = day_start + datetime.timedelta(days=1)
-    events_result = service.events().list(
-        calendarId=CALENDAR_ID, timeMin=day_start.isoformat(),
-        timeMax=day_end.isoformat(), singleEvents=True, orderBy='startTime'
-    ).execute()
-    events = events_result.get('items', [])
+    return day_start, day_start + datetime.timedelta(days=1)
+
+def _compute_available_slots(day_start: datetime.datetime, events: list[dict]) -> list[str]:
+    sast_tz = pytz.timezone("Africa/Johannesburg")
     working_hours_start = day_start.replace(hour=9, minute=0, second=0, microsecond=0)
     working_hours_end = day_start.replace(hour=17, minute=0, second=0, microsecond=0)
     available_slots = []
@@ -46,57 +55,22 @@ def get_available_slots(date: str) -> list[str]:
         current_time += datetime.timedelta(minutes=60)
     return available_slots
 
-
-# --- THIS FUNCTION IS UPDATED ---
-def find_event_by_details(email: str, original_start_time: str) -> str | None:
-    """Finds a Google Calendar event ID using a reliable private property search."""
-    service = get_calendar_service()
+def _localize(time_string: str) -> datetime.datetime:
     sast_tz = pytz.timezone("Africa/Johannesburg")
-    start_time = parse(original_start_time)
-    if start_time.tzinfo is None:
-        start_time = sast_tz.localize(start_time)
-        
-    events_result = service.events().list(
-        calendarId=CALENDAR_ID,
-        timeMin=start_time.isoformat(),
-        timeMax=(start_time + datetime.timedelta(minutes=1)).isoformat(),
-        # Use the more reliable private property search instead of 'q'
-        privateExtendedProperty=f"lead_email={email}",
-        singleEvents=True
-    ).execute()
-    events = events_result.get('items', [])
-    return events[0]['id'] if events else None
+    parsed = parse(time_string)
+    if parsed.tzinfo is None:
+        parsed = sast_tz.localize(parsed)
+    return parsed
 
-# ... (update_calendar_event and delete_calendar_event remain the same) ...
-def update_calendar_event(event_id: str, new_start_time: str) -> dict:
-    service = get_calendar_service()
-    sast_tz = pytz.timezone("Africa/Johannesburg")
-    start = parse(new_start_time)
-    if start.tzinfo is None:
-        start = sast_tz.localize(start)
+def _apply_new_start_time(event: dict, new_start_time: str) -> dict:
+    start = _localize(new_start_time)
     end = start + datetime.timedelta(minutes=60)
-    event = service.events().get(calendarId=CALENDAR_ID, eventId=event_id).execute()
     event['start']['dateTime'] = start.isoformat()
     event['end']['dateTime'] = end.isoformat()
-    updated_event = service.events().update(
-        calendarId=CALENDAR_ID, eventId=event_id, body=event
-    ).execute()
-    return updated_event
+    return event
 
-def delete_calendar_event(event_id: str) -> None:
-    service = get_calendar_service()
-    try:
-        service.events().delete(calendarId=CALENDAR_ID, eventId=event_id).execute()
-    except errors.HttpError as e:
-        if e.resp.status == 410:
-            print(f"Event {event_id} was already gone.")
-        else:
-            raise
-
-# --- THIS FUNCTION IS UPDATED ---
-def create_calendar_event(start_time: str, summary: str, description: str, attendees: list[str]) -> dict:
-    """Creates a new event with an explicit timezone."""
-    service = get_calendar_service()
+def _build_event_body(start_time: str, summary: str, description: str, attendees: list[str]) -> dict:
+    """Validates the requested start time and builds the Calendar event resource."""
     sast_tz = pytz.timezone("Africa/Johannesburg")
 
     # --- THIS IS THE FIX ---
@@ -116,7 +90,7 @@ def create_calendar_event(start_time: str, summary: str, description: str, atten
         raise ValueError("Cannot book an appointment in the past.")
     if start.date() == now_sast.date():
         raise ValueError("Cannot book a same-day appointment. Please book for the next business day or later.")
-    
+
     start -= datetime.timedelta(minutes=120)
     end = start + datetime.timedelta(minutes=60)
 
@@ -125,8 +99,8 @@ def create_calendar_event(start_time: str, summary: str, description: str, atten
     if lead_email != 'N/A':
         full_description += f"\n\n---\nLead Contact: {lead_email}"
 
-    event = {
-        'summary': summary, 
+    return {
+        'summary': summary,
         'description': full_description,
         'start': {'dateTime': start.isoformat(), 'timeZone': 'Africa/Johannesburg'},
         'end': {'dateTime': end.isoformat(), 'timeZone': 'Africa/Johannesburg'},
@@ -137,5 +111,137 @@ def create_calendar_event(start_time: str, summary: str, description: str, atten
             }
         }
     }
+
+# --- Synchronous implementation (googleapiclient) ---
+
+def get_available_slots(date: str) -> list[str]:
+    service = get_calendar_service()
+    day_start, day_end = _day_bounds(date)
+    events_result = service.events().list(
+        calendarId=CALENDAR_ID, timeMin=day_start.isoformat(),
+        timeMax=day_end.isoformat(), singleEvents=True, orderBy='startTime'
+    ).execute()
+    return _compute_available_slots(day_start, events_result.get('items', []))
+
+
+# --- THIS FUNCTION IS UPDATED ---
+def find_event_by_details(email: str, original_start_time: str) -> str | None:
+    """Finds a Google Calendar event ID using a reliable private property search."""
+    service = get_calendar_service()
+    start_time = _localize(original_start_time)
+
+    events_result = service.events().list(
+        calendarId=CALENDAR_ID,
+        timeMin=start_time.isoformat(),
+        timeMax=(start_time + datetime.timedelta(minutes=1)).isoformat(),
+        # Use the more reliable private property search instead of 'q'
+        privateExtendedProperty=f"lead_email={email}",
+        singleEvents=True
+    ).execute()
+    events = events_result.get('items', [])
+    return events[0]['id'] if events else None
+
+# ... (update_calendar_event and delete_calendar_event remain the same) ...
+def update_calendar_event(event_id: str, new_start_time: str) -> dict:
+    service = get_calendar_service()
+    event = service.events().get(calendarId=CALENDAR_ID, eventId=event_id).execute()
+    event = _apply_new_start_time(event, new_start_time)
+    updated_event = service.events().update(
+        calendarId=CALENDAR_ID, eventId=event_id, body=event
+    ).execute()
+    return updated_event
+
+def delete_calendar_event(event_id: str) -> None:
+    from googleapiclient import errors
+    service = get_calendar_service()
+    try:
+        service.events().delete(calendarId=CALENDAR_ID, eventId=event_id).execute()
+    except errors.HttpError as e:
+        if e.resp.status == 410:
+            print(f"Event {event_id} was already gone.")
+        else:
+            raise
+
+# --- THIS FUNCTION IS UPDATED ---
+def create_calendar_event(start_time: str, summary: str, description: str, attendees: list[str]) -> dict:
+    """Creates a new event with an explicit timezone."""
+    service = get_calendar_service()
+    event = _build_event_body(start_time, summary, description, attendees)
     created_event = service.events().insert(calendarId=CALENDAR_ID, body=event).execute()
-    return created_event
\ No newline at end of file
+    return created_event
+
+# --- Asynchronous implementation (Calendar REST API over the shared httpx client) ---
+
+def _get_credentials():
+    global _credentials
+    if _credentials is None:
+        _credentials = service_account.Credentials.from_service_account_file(
+            SERVICE_ACCOUNT_FILE, scopes=SCOPES)
+    return _credentials
+
+async def _get_auth_headers() -> dict:
+    """Returns a bearer token header, refreshing the service account token when it has expired."""
+    creds = _get_credentials()
+    if not creds.valid:
+        async with _token_refresh_lock:
+            if not creds.valid:
+                # Token refresh happens roughly once an hour, so a short thread hop is acceptable here.
+                await asyncio.to_thread(creds.refresh, GoogleAuthRequest())
+    return {"Authorization": f"Bearer {creds.token}"}
+
+async def _calendar_request(method: str, path: str = "", params: dict | None = None, json: dict | None = None) -> dict:
+    url = f"{CALENDAR_API_BASE_URL}/calendars/{quote(CALENDAR_ID, safe='')}/events{path}"
+    headers = await _get_auth_headers()
+    # Bounded by the chat turn's deadline, so a slow Calendar call can't outlive the request.
+    response = await get_http_client().request(
+        method, url, params=params, json=json, headers=headers,
+        timeout=bounded_timeout(settings.HTTP_CLIENT_TIMEOUT)
+    )
+    response.raise_for_status()
+    return response.json() if response.content else {}
+
+async def aget_available_slots(date: str) -> list[str]:
+    day_start, day_end = _day_bounds(date)
+    events_result = await _calendar_request("GET", params={
+        "timeMin": day_start.isoformat(), "timeMax": day_end.isoformat(),
+        "singleEvents": "true", "orderBy": "startTime"
+    })
+    return _compute_available_slots(day_start, events_result.get('items', []))
+
+async def afind_event_by_details(email: str, original_start_time: str) -> str | None:
+    """Async version of find_event_by_details."""
+    start_time = _localize(original_start_time)
+    events_result = await _calendar_request("GET", params={
+        "timeMin": start_time.isoformat(),
+        "timeMax": (start_time + datetime.timedelta(minutes=1)).isoformat(),
+        "privateExtendedProperty": f"lead_email={email}",
+        "singleEvents": "true"
+    })
+    events = events_result.get('items', [])
+    return events[0]['id'] if events else None
+
+async def aupdate_calendar_event(event_id: str, new_start_time: str) -> dict:
+    event = await _calendar_request("GET", f"/{event_id}")
+    event = _apply_new_start_time(event, new_start_time)
+    return await _calendar_request("PUT", f"/{event_id}", json=event)
+
+async def adelete_calendar_event(event_id: str) -> None:
+    try:
+        await _calendar_request("DELETE", f"/{event_id}")
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 410:
+            print(f"Event {event_id} was already gone.")
+        else:
+            raise
+
+async def acreate_calendar_event(start_time: str, summary: str, description: str, attendees: list[str], event_id: str | None = None) -> dict:
+    """
+    Async version of create_calendar_event.
+
+    When `event_id` is given it is used as the Calendar event ID, which makes the insert
+    idempotent: a second insert with the same ID fails with 409 instead of creating a duplicate.
+    """
+    event = _build_event_body(start_time, summary, description, attendees)
+    if event_id:
+        event['id'] = event_id
+    return await _calendar_request("POST", json=event)
@@ -0,0 +1,34 @@
+# utils/helpers.py
+"""Small helpers shared by the agent, the API and ingestion."""
+import json
+import math
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1)
+def load_encoding():
+    """
+    The tokenizer for context budgets and chunk sizes. tiktoken downloads it on first use, so the
+    server loads it during warm-up and ingestion before processing any file.
+    """
+    import tiktoken
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str) -> int:
+    return len(load_encoding().encode(text))
+
+
+def parse_embedding(value) -> list[float] | None:
+    # PostgREST returns pgvector columns as their text form, e.g. "[0.1,0.2,...]".
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return json.loads(value)
+    return list(value)
+
+
+def cosine(a: list[float], b: list[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0